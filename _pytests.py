@@ -1,6 +1,25 @@
+import json
+import os
+import numpy as np
 import pandas as pd
 import pytest
 from data_processor import DataProcessor
+from binners import BinEdges
+from checks import ExpectedValues, check_expected_values
+from metrics import TransformMetrics
+from plan import STEPS
+from logger import create_logger, flush_logs, set_quiet
+from read_write import (
+    ArtifactStore,
+    _encode_artifact,
+    fit_state_path,
+    lookup_cache,
+    read_fitted_data,
+    write_fitted_data,
+)
+from sinks import NpySink, ParquetSink
+from sketches import QuantileSketch
+from transformers import GroupStatistics, Transformers
 
 
 @pytest.mark.parametrize(
@@ -16,3 +35,793 @@ def test_fit_and_transforms(config_path, data_path):
     results = data_processor.transform()
     assert type(results) is pd.DataFrame
     assert results.isnull().values.any()
+
+
+def test_transform_stream_matches_transform(tmp_path):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    streamed = pd.concat(
+        data_processor.transform_stream(
+            data_path="data/data_1000_test.csv", chunksize=128
+        )
+    )
+    pd.testing.assert_frame_equal(streamed, expected)
+
+    output_path = tmp_path / "results.csv"
+    rows = data_processor.transform_to_csv(
+        data_path="data/data_1000_test.csv", output_path=output_path, chunksize=128
+    )
+    assert rows == len(expected)
+    assert len(pd.read_csv(output_path, index_col=0)) == len(expected)
+
+
+def test_transform_stream_requires_transform_only():
+    data_processor = DataProcessor(config_path="configs/config_train.json")
+    with pytest.raises(ValueError):
+        next(data_processor.transform_stream(data_path="data/data_1000_train.csv"))
+
+
+@pytest.mark.parametrize("n_workers", [1, 2])
+def test_transform_files_reports_every_file(tmp_path, n_workers):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    data_df = pd.read_csv("data/data_1000_test.csv", index_col=0)
+    data_paths = [str(tmp_path / "part-{}.csv".format(i)) for i in range(3)]
+    data_df.to_csv(data_paths[0])
+    data_df.to_csv(data_paths[1])
+    data_df.drop(columns="Feature_2").to_csv(data_paths[2])
+
+    results = sorted(
+        data_processor.transform_files(
+            data_paths=data_paths,
+            output_dir=tmp_path / "results",
+            n_workers=n_workers,
+            chunksize=300,
+        )
+    )
+    assert [r.ok for r in results] == [True, True, False]
+    assert "Feature_2" in results[2].error
+    assert not os.path.exists(results[2].output_path)
+    for result in results[:2]:
+        assert result.rows == len(expected)
+        transformed = pd.read_csv(result.output_path, index_col=0)
+        np.testing.assert_allclose(
+            transformed["Feature_4"].values, expected["Feature_4"].values
+        )
+
+
+def _config_in(tmp_path, config_path):
+    with open(config_path) as f:
+        config = json.load(f)
+    for methods in config.values():
+        for step in methods.values():
+            if type(step) is dict and "path" in step:
+                step["path"] = str(tmp_path / os.path.basename(step["path"]))
+    tmp_config_path = tmp_path / os.path.basename(config_path)
+    with open(tmp_config_path, "w") as f:
+        json.dump(config, f)
+    return config, str(tmp_config_path)
+
+
+def test_fit_stream_matches_fit(tmp_path):
+    config, config_path = _config_in(tmp_path, "configs/config_train.json")
+    DataProcessor(config_path=config_path).fit_stream(
+        data_path="data/data_1000_train.csv", chunksize=100
+    )
+    for methods in config.values():
+        for step in methods.values():
+            if type(step) is not dict or "path" not in step:
+                continue
+            lookup_path = os.path.join("lookups", os.path.basename(step["path"]))
+            if step.get("method") == "z_transform":
+                expected = pd.read_csv(lookup_path, index_col=0)
+                pd.testing.assert_frame_equal(
+                    pd.read_csv(step["path"], index_col=0), expected
+                )
+            else:
+                with open(lookup_path) as f, open(step["path"]) as g:
+                    expected, fitted = json.load(f), json.load(g)
+                pd.testing.assert_series_equal(
+                    pd.json_normalize(fitted).iloc[0],
+                    pd.json_normalize(expected).iloc[0],
+                )
+
+
+def _first_fitted_lookups(config) -> dict:
+    # Lookups of steps fitted on raw data, not on another fitted step's output.
+    lookups = {}
+    for methods in config.values():
+        for step in STEPS:
+            if type(methods[step]) is dict and methods[step].get("fit", 0) == 1:
+                lookups[methods[step]["path"]] = methods[step].get("method")
+                break
+    return lookups
+
+
+def _read_lookup(path, method):
+    if method == "z_transform":
+        return pd.read_csv(path, index_col=0)
+    with open(path) as f:
+        return pd.json_normalize(json.load(f)).iloc[0]
+
+
+@pytest.mark.parametrize("decay", [1.0, 0.0])
+def test_refit_merges_saved_statistics(tmp_path, decay):
+    data_df = pd.read_csv("data/data_1000_train.csv", index_col=0)
+    batches = [tmp_path / "batch_1.csv", tmp_path / "batch_2.csv"]
+    data_df.iloc[:500].to_csv(batches[0])
+    data_df.iloc[500:].to_csv(batches[1])
+    expected_path = "data/data_1000_train.csv" if decay == 1 else batches[1]
+
+    config, config_path = _config_in(tmp_path, "configs/config_train.json")
+    data_processor = DataProcessor(config_path=config_path)
+    data_processor.fit_stream(data_path=expected_path, chunksize=100)
+    lookups = _first_fitted_lookups(config)
+    expected = {path: _read_lookup(path, m) for path, m in lookups.items()}
+
+    data_processor.fit_stream(data_path=batches[0], chunksize=100)
+    data_processor.refit(data_path=batches[1], chunksize=100, decay=decay)
+    for path, method in lookups.items():
+        if method == "z_transform":
+            pd.testing.assert_frame_equal(_read_lookup(path, method), expected[path])
+        else:
+            pd.testing.assert_series_equal(_read_lookup(path, method), expected[path])
+
+
+@pytest.mark.parametrize("decay", [0.5, 0.0])
+def test_refit_uniform_edges_keep_range_unless_decay_is_zero(tmp_path, decay):
+    data_df = pd.read_csv("data/data_1000_train.csv", index_col=0)
+    data_df.loc[data_df.index[:500], "Feature_4"] += 100
+    batches = [tmp_path / "batch_1.csv", tmp_path / "batch_2.csv"]
+    data_df.iloc[:500].to_csv(batches[0])
+    data_df.iloc[500:].to_csv(batches[1])
+    all_path = tmp_path / "all.csv"
+    data_df.to_csv(all_path)
+
+    config, _ = _config_in(tmp_path, "configs/config_train.json")
+    path = str(tmp_path / "Feature_4_binning.json")
+    config = {
+        "Feature_4": dict(
+            config["Feature_4"],
+            expected_values={"min": 0, "max": 200},
+            imputation=0,
+            outlier_removal=0,
+            transformation=0,
+            binning={"type": "uniform", "n_bins": 4, "fit": 1, "path": path},
+        )
+    }
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "config.json")
+    )
+    data_processor.fit_stream(data_path=batches[1] if decay == 0 else all_path)
+    expected = read_fitted_data(path, feature_name="Feature_4", file_type="json")
+
+    data_processor.fit_stream(data_path=batches[0])
+    data_processor.refit(data_path=batches[1], decay=decay)
+    assert read_fitted_data(path, feature_name="Feature_4", file_type="json") == (
+        expected
+    )
+
+
+def test_fit_stream_second_pass_counts_rows_once(tmp_path, monkeypatch):
+    # Feature_4's median sketch needs a second pass, Feature_2's mode counter
+    # in the same imputation step must not be updated by it.
+    monkeypatch.setattr(QuantileSketch.__init__, "__defaults__", (5, 1000))
+    config, _ = _config_in(tmp_path, "configs/config_train.json")
+    config = {
+        "Feature_2": config["Feature_2"],
+        "Feature_4": dict(config["Feature_4"], outlier_removal=0, transformation=0),
+    }
+    DataProcessor(
+        config_path=_write_config(config, tmp_path / "config.json")
+    ).fit_stream(data_path="data/data_1000_train.csv", chunksize=100)
+    state_path = fit_state_path(config["Feature_2"]["imputation"])
+    state = read_fitted_data(state_path, feature_name="Feature_2", file_type="json")
+    counts = pd.read_csv("data/data_1000_train.csv")["Feature_2"].value_counts()
+    assert dict(zip(state["values"], state["counts"])) == counts.to_dict()
+
+
+def test_refit_with_decay_zero_matches_fresh_histogram_fit(tmp_path, monkeypatch):
+    # Sketches past max_distinct: the old range must not survive decay 0.
+    monkeypatch.setattr(QuantileSketch.__init__, "__defaults__", (5, 1000))
+    data_df = pd.read_csv("data/data_1000_train.csv", index_col=0)
+    data_df.loc[data_df.index[:500], "Feature_4"] += 100
+    batches = [tmp_path / "batch_1.csv", tmp_path / "batch_2.csv"]
+    data_df.iloc[:500].to_csv(batches[0])
+    data_df.iloc[500:].to_csv(batches[1])
+
+    config, _ = _config_in(tmp_path, "configs/config_train.json")
+    outlier_removal = config["Feature_4"]["outlier_removal"]
+    config = {
+        "Feature_4": dict(
+            config["Feature_4"],
+            expected_values={"min": 0, "max": 200},
+            imputation=0,
+            transformation=0,
+        )
+    }
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "config.json")
+    )
+    data_processor.fit_stream(data_path=batches[1])
+    expected = _read_lookup(outlier_removal["path"], "percentile")
+
+    data_processor.fit_stream(data_path=batches[0])
+    data_processor.refit(data_path=batches[1], decay=0.0)
+    pd.testing.assert_series_equal(
+        _read_lookup(outlier_removal["path"], "percentile"), expected
+    )
+
+
+def test_quantile_sketch_merge_past_max_distinct():
+    values = np.random.default_rng(0).normal(size=10000)
+    merged = QuantileSketch(max_distinct=100, n_bins=1000)
+    for chunk in np.array_split(values, 10):
+        sketch = QuantileSketch(max_distinct=100, n_bins=1000)
+        sketch.update(chunk)
+        sketch.update_histogram(chunk)
+        merged.merge(QuantileSketch.from_dict(json.loads(json.dumps(sketch.to_dict()))))
+    for q in [0.05, 0.5, 0.95]:
+        assert (
+            abs(merged.quantile(q) - np.quantile(values, q))
+            <= 2 * (values.max() - values.min()) / merged.n_bins
+        )
+
+
+def test_quantile_sketch_error_bound():
+    values = np.random.default_rng(0).normal(size=10000)
+    sketch = QuantileSketch(max_distinct=100, n_bins=1000)
+    for chunk in np.array_split(values, 10):
+        sketch.update(chunk)
+    assert sketch.needs_second_pass
+    for chunk in np.array_split(values, 10):
+        sketch.update_histogram(chunk)
+    for q in [0.05, 0.5, 0.95]:
+        assert (
+            abs(sketch.quantile(q) - np.quantile(values, q))
+            <= (values.max() - values.min()) / sketch.n_bins
+        )
+
+
+def test_compiled_plan_does_not_read_lookups(monkeypatch):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+
+    plan = data_processor.compile()
+
+    def fail(*args, **kwargs):
+        raise AssertionError("Lookup read after compile")
+
+    for module in ["imputers", "outlier_removers", "transformers", "binners"]:
+        monkeypatch.setattr("{}.read_fitted_data".format(module), fail)
+    monkeypatch.setattr("plan.read_fitted_data", fail)
+    pd.testing.assert_frame_equal(
+        plan.transform(data_df=data_processor.data_df), expected
+    )
+    pd.testing.assert_frame_equal(
+        plan.transform(data_df=data_processor.data_df.iloc[:10]), expected.iloc[:10]
+    )
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_parallel_transform_matches_serial(backend):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    results = data_processor.transform(n_jobs=3, backend=backend)
+    pd.testing.assert_frame_equal(results, expected)
+
+
+def test_fused_transform_matches_steps():
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    fused = DataProcessor(config_path="configs/config_test.json", fused=True)
+    fused.read_data(data=data_processor.data_df)
+    assert [f.name for f in fused.compile().features if f.kernel is not None] == [
+        "Feature_2",
+        "Feature_4",
+    ]
+    pd.testing.assert_frame_equal(fused.transform(), expected)
+
+    data_df = data_processor.data_df.copy()
+    data_df.iloc[0, data_df.columns.get_loc("Feature_4")] = 10.5
+    fused.read_data(data=data_df)
+    with pytest.raises(ValueError, match="Feature_4 contains 1 unexpected values"):
+        fused.transform()
+
+
+@pytest.mark.parametrize("backend", ["thread", "process"])
+def test_transform_metrics_cover_every_stage(backend):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    records = []
+    metrics = TransformMetrics(callbacks=[records.append])
+    data_processor.transform(n_jobs=2, backend=backend, metrics=metrics)
+    totals = metrics.to_dict()
+    assert sorted(totals) == sorted(data_processor.config)
+    for name, methods in data_processor.config.items():
+        stages = ["read"] + [step for step in STEPS if methods[step] != 0]
+        assert list(totals[name]) == stages
+        assert all(
+            totals[name][stage]["rows"] == len(data_processor.data_df)
+            for stage in stages
+        )
+    assert len(records) == len(metrics.records)
+    assert 'data_processor_stage_seconds_total{feature="Feature_1",stage="read"}' in (
+        metrics.to_prometheus()
+    )
+    # Expected values file and fitted lookup, compiled into the plan.
+    assert totals["Feature_5"]["read"]["cache_hits"] == 1
+    assert totals["Feature_5"]["transformation"]["cache_hits"] == 1
+    assert totals["Feature_1"]["imputation"]["cache_hits"] == 0
+    assert "allocated_bytes" not in totals["Feature_1"]["read"]
+
+    metrics = TransformMetrics(trace_memory=True)
+    data_processor.transform(metrics=metrics)
+    assert metrics.to_dict()["Feature_4"]["read"]["allocated_bytes"] > 0
+
+
+def test_transform_records_match_transform():
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    records = data_processor.transform_records(
+        data_processor.data_df.to_dict("records")
+    )
+    results = pd.DataFrame(records, index=data_processor.data_df.index)
+    pd.testing.assert_frame_equal(results.astype(object), expected.astype(object))
+
+    row = dict(data_processor.data_df.iloc[0], Feature_2=101.0)
+    with pytest.raises(ValueError, match="Feature_2 contains 1 unexpected values"):
+        data_processor.transform_row(row)
+
+
+def test_read_data_from_memory_and_parquet(tmp_path):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    data_df = data_processor.data_df
+
+    data_processor.read_data(data=data_df)
+    assert data_processor.data_df is data_df
+    pd.testing.assert_frame_equal(data_processor.transform(), expected)
+
+    pytest.importorskip("pyarrow")
+    parquet_path = str(tmp_path / "data.parquet")
+    data_df.assign(Unused=1).to_parquet(parquet_path)
+    data_processor.read_data(data_path=parquet_path)
+    assert list(data_processor.data_df.columns) == data_processor.input_columns()
+    pd.testing.assert_frame_equal(data_processor.transform(), expected)
+
+
+def test_read_data_categorizes_from_recipe(tmp_path):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    assert data_processor.data_df["Feature_1"].cat.categories.tolist() == [
+        "A",
+        "B",
+        "C",
+        "D",
+    ]
+    assert data_processor.data_df["Feature_2"].dtype == "float64"
+
+    data_path = str(tmp_path / "data.csv")
+    data_df = pd.read_csv("data/data_1000_test.csv", index_col=0)
+    data_df.loc[1, "Feature_1"] = "E"
+    data_df.assign(Unused="x").to_csv(data_path)
+    data_processor.read_data(data_path=data_path)
+    assert "Unused" not in data_processor.data_df
+    with pytest.raises(ValueError, match="Feature_1 contains 1 unexpected values"):
+        data_processor.transform()
+
+
+def test_read_numeric_coded_categorical_from_csv(tmp_path):
+    config = {
+        "F": {
+            "type": "categorical",
+            "expected_values": [1, 2, 3],
+            "expected_missing": "nan",
+            "imputation": {"type": "replace", "method": 2},
+            "flag_imputed": 1,
+            "outlier_removal": 0,
+            "transformation": 0,
+            "binning": 0,
+        }
+    }
+    data_path = str(tmp_path / "data.csv")
+    pd.DataFrame({"F": [1, 2, np.nan, 3, 2]}).to_csv(data_path)
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "config.json")
+    )
+    data_processor.read_data(data_path=data_path)
+    results = data_processor.transform()
+    assert results["F"].tolist() == [1, 2, 2, 3, 2]
+    assert results["F_IMPUTATION_FLAG"].tolist() == [0, 0, 1, 0, 0]
+    pd.testing.assert_frame_equal(
+        pd.concat(data_processor.transform_stream(data_path=data_path, chunksize=2)),
+        results,
+    )
+
+
+def test_categorical_codes_match_object_values():
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    data_processor.read_data(data=pd.read_csv("data/data_1000_test.csv", index_col=0))
+    pd.testing.assert_frame_equal(data_processor.transform(), expected)
+
+    with open("lookups/Feature_3_binning.json") as f:
+        label_encoding = json.load(f)
+    pd.testing.assert_series_equal(
+        expected["Feature_3"],
+        data_processor.data_df["Feature_3"]
+        .fillna("medium")
+        .map(label_encoding)
+        .astype("float64"),
+    )
+
+
+def test_transform_to_sinks_matches_transform(tmp_path):
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+
+    npy_path = str(tmp_path / "results.npy")
+    rows = data_processor.transform_to(sink=NpySink(data_path=npy_path), chunksize=128)
+    assert rows == len(expected)
+    model_input = np.load(npy_path, mmap_mode="r")
+    assert model_input.shape == expected.shape and model_input.dtype == "float32"
+    expected_codes = expected.assign(
+        Feature_1=expected["Feature_1"].cat.codes.replace(-1, np.nan)
+    ).astype("float32")
+    np.testing.assert_array_equal(model_input, expected_codes.values)
+
+    pytest.importorskip("pyarrow")
+    parquet_path = str(tmp_path / "results.parquet")
+    data_processor.transform_to(
+        sink=ParquetSink(data_path=parquet_path),
+        data_path="data/data_1000_test.csv",
+        chunksize=128,
+    )
+    pd.testing.assert_frame_equal(pd.read_parquet(parquet_path), expected)
+
+
+def test_transform_fills_output_schema_by_position():
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    schema = data_processor.plan.output_schema()
+    assert list(expected.columns) == schema.names()
+    assert list(expected.dtypes) == [dtype for _, dtype in schema.columns]
+    np.testing.assert_array_equal(
+        expected["Feature_4_IMPUTATION_FLAG"].values,
+        data_processor.data_df["Feature_4"].isna().values,
+    )
+
+    # Duplicated, unordered labels are never joined on.
+    data_processor.read_data(
+        data=data_processor.data_df.set_index(np.zeros(len(expected), dtype=int))
+    )
+    results = data_processor.transform()
+    pd.testing.assert_frame_equal(
+        results.reset_index(drop=True), expected.reset_index(drop=True)
+    )
+
+
+def test_range_categorical_output_stays_numeric(tmp_path):
+    config = {
+        "F": {
+            "type": "categorical",
+            "expected_values": {"min": 1, "max": 3},
+            "expected_missing": "nan",
+            "imputation": {"type": "replace", "method": 2},
+            "flag_imputed": 0,
+            "outlier_removal": 0,
+            "transformation": 0,
+            "binning": 0,
+        }
+    }
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "config.json")
+    )
+    data_processor.read_data(data=pd.DataFrame({"F": [1, 2, np.nan, 3]}))
+    results = data_processor.transform()
+    # Dtypes as the steps themselves give them, before the output schema.
+    steps = pd.concat(
+        [
+            f.transform(data_df=data_processor.data_df)
+            for f in data_processor.plan.features
+        ],
+        axis=1,
+    )
+    pd.testing.assert_series_equal(results.dtypes, steps.dtypes)
+    assert results["F"].dtype == "float64"
+    assert results["F"].tolist() == [1.0, 2.0, 2.0, 3.0]
+
+
+def test_transform_leaves_input_untouched():
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    data_df = data_processor.data_df.copy()
+    # Pandas options are process wide; transform must not toggle them under
+    # other threads.
+    copy_on_write = []
+    metrics = TransformMetrics(
+        callbacks=[
+            lambda record: copy_on_write.append(pd.get_option("mode.copy_on_write"))
+        ]
+    )
+    data_processor.transform(n_jobs=2, backend="thread", metrics=metrics)
+    pd.testing.assert_frame_equal(data_processor.data_df, data_df)
+    assert copy_on_write and not any(copy_on_write)
+
+
+def test_expected_values_report_unexpected_counts():
+    expected_range = ExpectedValues.from_config({"min": 18, "max": 100})
+    unexpected = expected_range.unexpected(
+        pd.Series([17.0, 18.0, 18.5, 100.0, 101.0, 101.0, np.nan])
+    )
+    assert unexpected.to_dict() == {101.0: 2, 17.0: 1, 18.5: 1}
+
+    expected_set = ExpectedValues.from_config(["A", "B"])
+    unexpected = expected_set.unexpected(pd.Series(["A", "B", "C", "C", np.nan]))
+    assert unexpected.to_dict() == {"C": 2}
+    unexpected = expected_set.unexpected(
+        pd.Series(["A", "C", "C", "D", np.nan], dtype="category")
+    )
+    assert unexpected.to_dict() == {"C": 2, "D": 1}
+    with pytest.raises(ValueError, match="1 unexpected values"):
+        check_expected_values(
+            field_values=pd.Series(["A", "C"]),
+            expected_values=expected_set,
+            field_name="Feature",
+            operation="TEST",
+        )
+    unexpected = check_expected_values(
+        field_values=pd.Series(["A", "C", "C", "D"]),
+        expected_values=expected_set,
+        field_name="Feature",
+        operation="TEST",
+        raise_flag=False,
+    )
+    assert unexpected.to_dict() == {"C": 2, "D": 1}
+
+
+def test_create_logger_is_idempotent(caplog):
+    log = create_logger("Imputer")
+    handlers = list(log.handlers)
+    for _ in range(10):
+        assert create_logger("Imputer") is log
+    assert log.handlers == handlers
+
+    set_quiet(True)
+    try:
+        log.info("hidden")
+        log.error("shown")
+    finally:
+        set_quiet(False)
+    assert [r.getMessage() for r in caplog.records] == ["shown"]
+
+    # Formatted by the listener, from the record queued as is.
+    log.warning("queued %s record", "unformatted")
+    flush_logs()
+    with open("logs/Imputer.log") as f:
+        assert f.readlines()[-1].rstrip().endswith("- queued unformatted record")
+
+
+def test_artifact_store_round_trip(tmp_path, monkeypatch):
+    artifact_path = str(tmp_path / "artifacts.bin")
+    data_processor = DataProcessor(config_path="configs/config_test.json")
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    expected = data_processor.transform()
+    data_processor.export_artifacts(artifact_path=artifact_path, version="test")
+
+    monkeypatch.setattr(
+        "plan.read_fitted_data", lambda *args, **kwargs: pytest.fail("lookup read")
+    )
+    data_processor = DataProcessor(
+        config_path="configs/config_test.json", artifact_path=artifact_path
+    )
+    data_processor.read_data(data_path="data/data_1000_test.csv")
+    pd.testing.assert_frame_equal(data_processor.transform(), expected)
+
+    with open(artifact_path, "r+b") as f:
+        f.seek(-1, os.SEEK_END)
+        f.write(b"\xff")
+    with pytest.raises(ValueError, match="checksum"):
+        ArtifactStore.load(data_path=artifact_path)
+
+
+def test_artifact_store_keeps_encoding_means_binary(tmp_path):
+    lookup = {"field_mean_transformer": {"AK": 0.25, "AL": 0.5}, "prior": 0.4}
+    arrays = []
+    entry = _encode_artifact(data=lookup, arrays=arrays)
+    assert entry["entries"]["field_mean_transformer"]["kind"] == "mapping"
+    assert len(arrays) == 2
+
+    artifact_path = str(tmp_path / "artifacts.bin")
+    store = ArtifactStore()
+    store.put(feature_name="Feature_5", step="transformation", data=lookup)
+    store.save(data_path=artifact_path)
+    loaded = ArtifactStore.load(data_path=artifact_path)
+    assert loaded.get(feature_name="Feature_5", step="transformation") == lookup
+
+
+def test_artifact_store_keeps_mixed_value_types(tmp_path):
+    artifact_path = str(tmp_path / "artifacts.bin")
+    lookups = {"strings": {"a": 1, "b": "x"}, "numbers": {"a": 1, "b": 2.5}}
+    store = ArtifactStore()
+    for step, lookup in lookups.items():
+        store.put(feature_name="F", step=step, data=lookup)
+    store.save(data_path=artifact_path)
+    loaded = ArtifactStore.load(data_path=artifact_path)
+    for step, lookup in lookups.items():
+        decoded = loaded.get(feature_name="F", step=step)
+        assert decoded == lookup
+        assert [type(v) for v in decoded.values()] == [type(v) for v in lookup.values()]
+
+
+def test_lookup_cache_hits_and_invalidates(tmp_path):
+    data_path = str(tmp_path / "lookup.json")
+    write_fitted_data({"median": 1.0}, data_path, feature_name="F", file_type="json")
+    cache_info = lookup_cache.info()
+    for _ in range(3):
+        data = read_fitted_data(data_path, feature_name="F", file_type="json")
+    assert data == {"median": 1.0}
+    assert lookup_cache.info()["misses"] == cache_info["misses"] + 1
+    assert lookup_cache.info()["hits"] == cache_info["hits"] + 2
+
+    write_fitted_data({"median": 22.0}, data_path, feature_name="F", file_type="json")
+    assert read_fitted_data(data_path, feature_name="F", file_type="json") == {
+        "median": 22.0
+    }
+
+
+def test_bin_edges_match_pd_cut():
+    edges = [0, 18, 25, 45, 65, 100]
+    values = pd.Series(
+        np.concatenate(
+            [
+                np.random.default_rng(0).uniform(-10, 110, 200000),
+                np.asarray(edges, dtype="float64"),
+                [np.nan, -np.inf, np.inf],
+            ]
+        )
+    )
+    binned = BinEdges.from_list(edges).cut(values)
+    assert binned.cat.codes.dtype == np.int8
+    pd.testing.assert_series_equal(
+        binned, pd.cut(values, bins=edges, labels=list(range(len(edges) - 1)))
+    )
+    with pytest.raises(ValueError, match="must increase monotonically"):
+        BinEdges.from_list([0, 18, 18, 45])
+
+
+def _write_config(config, path):
+    with open(path, "w") as f:
+        json.dump(config, f)
+    return str(path)
+
+
+@pytest.mark.parametrize("binning_type", ["quantile", "uniform", "kmeans"])
+def test_fitted_bin_edges(tmp_path, binning_type):
+    config, _ = _config_in(tmp_path, "configs/config_train.json")
+    binning = {"type": binning_type, "n_bins": 4, "fit": 1}
+    config["Feature_2"]["binning"] = dict(binning, path=str(tmp_path / "stream.json"))
+    DataProcessor(
+        config_path=_write_config(config, tmp_path / "stream_config.json")
+    ).fit_stream(data_path="data/data_1000_train.csv", chunksize=100)
+    config["Feature_2"]["binning"] = dict(binning, path=str(tmp_path / "fit.json"))
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "fit_config.json")
+    )
+    data_processor.read_data(data_path="data/data_1000_train.csv")
+    fitted = data_processor.transform()["Feature_2"]
+    edges = read_fitted_data(
+        str(tmp_path / "fit.json"), feature_name="Feature_2", file_type="json"
+    )
+    assert edges == read_fitted_data(
+        str(tmp_path / "stream.json"), feature_name="Feature_2", file_type="json"
+    )
+    assert 2 <= len(edges["edges"]) <= 5
+    assert set(fitted.dropna()) == set(range(len(edges["edges"]) - 1))
+
+    for methods in config.values():
+        for step in methods.values():
+            if type(step) is dict and "fit" in step:
+                step["fit"] = 0
+    data_processor = DataProcessor(
+        config_path=_write_config(config, tmp_path / "test_config.json")
+    )
+    data_processor.read_data(data_path="data/data_1000_train.csv")
+    results = data_processor.transform()
+    pd.testing.assert_series_equal(results["Feature_2"], fitted)
+    records = data_processor.transform_records(
+        data_processor.data_df.to_dict("records")
+    )
+    np.testing.assert_array_equal(
+        [record["Feature_2"] for record in records], fitted.values
+    )
+
+
+@pytest.mark.parametrize("smoothing, min_count", [(0, 1), (10, 50)])
+def test_field_mean_encodes_each_row_by_its_group(tmp_path, smoothing, min_count):
+    rng = np.random.default_rng(0)
+    groups = pd.Series(rng.choice(["c", "a", "b", "d"], 1000, p=[0.5, 0.3, 0.18, 0.02]))
+    data = pd.DataFrame(
+        {"F": groups, "groupby": groups, "target_field": rng.normal(size=1000)}
+    )
+    data.loc[::7, "groupby"] = np.nan
+    method = {
+        "method": "mean",
+        "target_field": "target_field",
+        "groupby": "F",
+        "fit": 1,
+        "smoothing": smoothing,
+        "min_count": min_count,
+        "path": str(tmp_path / "F_transformation.json"),
+    }
+    transformer = Transformers(method=method, data=data)
+    transformer.run()
+
+    stats = data.groupby("groupby")["target_field"].agg(["sum", "count"])
+    prior = stats["sum"].sum() / stats["count"].sum()
+    means = (stats["sum"] + smoothing * prior) / (stats["count"] + smoothing)
+    means[stats["count"] < min_count] = prior
+    # Missing and unknown groups take the prior once one is fitted.
+    default = prior if min_count > 1 else np.nan
+    np.testing.assert_allclose(
+        transformer.results["F"].values, data["groupby"].map(means).fillna(default)
+    )
+
+    transformer = Transformers(
+        method=dict(method, fit=0), data=pd.DataFrame({"F": ["a", "e"]})
+    )
+    transformer.run()
+    np.testing.assert_allclose(transformer.results["F"].values, [means["a"], default])
+
+
+@pytest.mark.parametrize("n_jobs", [1, 3])
+def test_field_mean_out_of_fold(tmp_path, n_jobs):
+    rng = np.random.default_rng(0)
+    groups = pd.Series(rng.choice(["a", "b", "c"], 1000)).astype("category")
+    data = pd.DataFrame(
+        {"F": groups, "groupby": groups, "target_field": rng.normal(size=1000)}
+    )
+    method = {
+        "method": "mean",
+        "target_field": "target_field",
+        "groupby": "F",
+        "fit": 1,
+        "folds": 5,
+        "seed": 3,
+        "n_jobs": n_jobs,
+        "path": str(tmp_path / "F_transformation.json"),
+    }
+    transformer = Transformers(method=method, data=data)
+    transformer.run()
+
+    folds = np.random.default_rng(3).integers(0, 5, 1000, dtype="int16")
+    expected = np.empty(1000)
+    for fold in range(5):
+        means = data[folds != fold].groupby("groupby")["target_field"].mean()
+        expected[folds == fold] = data["groupby"][folds == fold].map(means)
+    np.testing.assert_allclose(transformer.results["F"].values, expected)
+    lookup = read_fitted_data(method["path"], feature_name="F", file_type="json")
+    assert lookup["field_mean_transformer"] == pytest.approx(
+        data.groupby("groupby")["target_field"].mean().to_dict()
+    )
+
+
+def test_group_statistics_take_unknown_groups_as_nan():
+    statistics = GroupStatistics.from_frame(
+        pd.DataFrame({"groupby": ["AK", "AL"], "mean": [1.0, 2.0], "std": [1.0, 4.0]})
+    )
+    codes = statistics.codes(pd.Series(["AL", "XX", np.nan, "AK"]))
+    np.testing.assert_array_equal(
+        statistics.take("mean", codes), [2.0, np.nan, np.nan, 1.0]
+    )
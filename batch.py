@@ -0,0 +1,71 @@
+import argparse
+import sys
+import time
+from data_processor import OUTPUT_FORMATS, DataProcessor
+from logger import set_quiet
+
+"""
+Transform many input files with one recipe, compiled once and shared by
+forked workers, reporting every file's status and the overall throughput.
+
+Run from the repository root:
+    python -m batch --config configs/config_test.json --output-dir results --workers 8 data/part-*.csv
+"""
+
+
+def main(argv: list = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("data_paths", nargs="+", help="Input CSV files")
+    parser.add_argument("--config", required=True, help="Recipe json")
+    parser.add_argument("--output-dir", required=True)
+    parser.add_argument("--format", default="csv", choices=list(OUTPUT_FORMATS))
+    parser.add_argument("--workers", type=int, default=1, help="-1 for all cores")
+    parser.add_argument("--chunksize", type=int, default=100000)
+    parser.add_argument("--artifacts", default=None, help="ArtifactStore file")
+    parser.add_argument("--quiet", action="store_true", help="Log warnings only")
+    args = parser.parse_args(argv)
+    if args.quiet:
+        set_quiet()
+
+    start = time.perf_counter()
+    data_processor = DataProcessor(
+        config_path=args.config, artifact_path=args.artifacts
+    )
+    n_failed, rows = 0, 0
+    for result in data_processor.transform_files(
+        data_paths=args.data_paths,
+        output_dir=args.output_dir,
+        output_format=args.format,
+        n_workers=args.workers,
+        chunksize=args.chunksize,
+    ):
+        if result.ok:
+            rows += result.rows
+            print(
+                "ok     {} -> {} {} rows {:.2f}s {:.0f} rows/s".format(
+                    result.data_path,
+                    result.output_path,
+                    result.rows,
+                    result.seconds,
+                    result.rows_per_second,
+                )
+            )
+        else:
+            n_failed += 1
+            print("FAILED {} {}".format(result.data_path, result.error))
+    seconds = time.perf_counter() - start
+    print(
+        "{} files, {} failed, {} rows in {:.2f}s ({:.0f} rows/s, {:.1f} files/s)".format(
+            len(args.data_paths),
+            n_failed,
+            rows,
+            seconds,
+            rows / seconds,
+            len(args.data_paths) / seconds,
+        )
+    )
+    return 1 if n_failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
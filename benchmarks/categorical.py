@@ -0,0 +1,81 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from categorical import categorize, expected_categories, take
+from checks import ExpectedValues
+
+"""
+Stages of a high cardinality categorical feature on object strings against
+the same stages on integer codes, plus the one-off cost of factorizing the
+strings into codes.
+
+Run from the repository root:
+    python -m benchmarks.categorical --rows 1000000 --categories 100 10000 100000
+"""
+
+
+def best_of(fn, repeat: int) -> float:
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, default=1000000)
+    parser.add_argument("--categories", type=int, nargs="+", default=[100, 10000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    print(
+        "{:>12} {:<14} {:>10} {:>10} {:>9}".format(
+            "categories", "stage", "object s", "codes s", "speedup"
+        )
+    )
+    for n_categories in args.categories:
+        values = np.array(
+            ["V{:07d}".format(i) for i in range(n_categories)], dtype=object
+        )
+        expected_values = ExpectedValues.from_config(list(values))
+        mapping = {value: float(i) for i, value in enumerate(values)}
+        strings = pd.Series(values[rng.integers(0, n_categories, args.rows)])
+        strings[rng.random(args.rows) < 0.01] = np.nan
+        categories = expected_categories(expected_values=expected_values)
+
+        start = time.perf_counter()
+        codes = categorize(values=strings, categories=categories)
+        print(
+            "{:>12} {:<14} {:>10} {:>10.3f}".format(
+                n_categories, "factorize", "", time.perf_counter() - start
+            )
+        )
+        stages = [
+            ("validate", lambda v: expected_values.unexpected(v), None),
+            ("impute", lambda v: v.fillna(values[0]), None),
+            (
+                "lookup",
+                lambda v: v.map(mapping).values,
+                lambda v: take(values=v, mapping=mapping),
+            ),
+        ]
+        for stage, object_fn, codes_fn in stages:
+            object_seconds = best_of(lambda: object_fn(strings), args.repeat)
+            codes_seconds = best_of(lambda: (codes_fn or object_fn)(codes), args.repeat)
+            print(
+                "{:>12} {:<14} {:>10.3f} {:>10.3f} {:>8.1f}x".format(
+                    n_categories,
+                    stage,
+                    object_seconds,
+                    codes_seconds,
+                    object_seconds / codes_seconds,
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
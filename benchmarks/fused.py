@@ -0,0 +1,84 @@
+import argparse
+import json
+import time
+import tracemalloc
+import numpy as np
+from benchmarks.synthetic import generate_data
+from logger import set_quiet
+from plan import compile_config
+
+"""
+Numeric features of a transform-only recipe run step by step against the
+same features run as one fused in place kernel: wall time and traced peak
+memory per feature.
+
+Run from the repository root:
+    python -m benchmarks.fused --rows 1000000 10000000
+"""
+
+
+def best_of(fn, repeat: int) -> float:
+    best = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def peak_mb(fn) -> float:
+    tracemalloc.start()
+    fn()
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return peak / 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="configs/config_test.json")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    set_quiet()
+
+    with open(args.config) as f:
+        config = json.load(f)
+    staged = compile_config(config=config)
+    fused = compile_config(config=config, fused=True)
+    print(
+        "{:<12} {:>10} {:>9} {:>9} {:>8} {:>9} {:>9}".format(
+            "feature", "rows", "steps s", "fused s", "speedup", "steps MB", "fused MB"
+        )
+    )
+    for n_rows in args.rows:
+        data_df = generate_data(config=config, n_rows=n_rows)
+        # Categorical features are read as categoricals, as by read_data.
+        for name, methods in config.items():
+            if methods["type"] == "categorical":
+                data_df[name] = data_df[name].astype("category")
+        for staged_feature, fused_feature in zip(staged.features, fused.features):
+            if fused_feature.kernel is None:
+                continue
+            timings = [
+                (
+                    best_of(lambda: f.transform(data_df=data_df), args.repeat),
+                    peak_mb(lambda: f.transform(data_df=data_df)),
+                )
+                for f in [staged_feature, fused_feature]
+            ]
+            print(
+                "{:<12} {:>10} {:>9.4f} {:>9.4f} {:>7.1f}x {:>9.1f} {:>9.1f}".format(
+                    fused_feature.name,
+                    n_rows,
+                    timings[0][0],
+                    timings[1][0],
+                    timings[0][0] / timings[1][0],
+                    timings[0][1],
+                    timings[1][1],
+                )
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,50 @@
+import argparse
+import json
+import time
+import tracemalloc
+import pandas as pd
+from plan import ExecutionPlan, compile_config
+
+"""
+Peak memory allocated while transforming each feature of a recipe.
+
+Run from the repository root:
+    python -m benchmarks.memory_per_feature --rows 1000000
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="configs/config_test.json")
+    parser.add_argument("--data", default="data/data_1000_test.csv")
+    parser.add_argument("--rows", type=int, default=1000000)
+    args = parser.parse_args()
+
+    with open(args.config) as f:
+        plan = compile_config(config=json.load(f))
+    data_df = pd.read_csv(args.data, index_col=0)
+    data_df = data_df.sample(n=args.rows, replace=True, random_state=0)
+    data_df.index = pd.RangeIndex(len(data_df))
+
+    print(
+        "{:<12} {:>12} {:>14} {:>10}".format(
+            "feature", "input MB", "peak MB", "seconds"
+        )
+    )
+    for feature in plan.features:
+        input_mb = data_df[feature.name].memory_usage(deep=False) / 1e6
+        tracemalloc.start()
+        start = time.perf_counter()
+        ExecutionPlan(features=(feature,)).transform(data_df=data_df)
+        seconds = time.perf_counter() - start
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        print(
+            "{:<12} {:>12.1f} {:>14.1f} {:>10.3f}".format(
+                feature.name, input_mb, peak / 1e6, seconds
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
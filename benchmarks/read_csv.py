@@ -0,0 +1,79 @@
+import argparse
+import os
+import tempfile
+import time
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_data
+from data_processor import DataProcessor
+from logger import set_quiet
+
+"""
+Reading a CSV with dtypes inferred for every column against the recipe driven
+read of DataProcessor.read_data: projected to the recipe's columns, numeric
+features as float64 and categorical features as ``category``.
+
+Run from the repository root:
+    python -m benchmarks.read_csv --rows 1000000 --extra-columns 20
+"""
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="configs/config_test.json")
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--extra-columns", type=int, default=10)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    set_quiet()
+    data_processor = DataProcessor(config_path=args.config)
+    engines = [None]
+    try:
+        import pyarrow  # noqa: F401
+
+        engines.append("pyarrow")
+    except ImportError:
+        pass
+
+    print("{:>12} {:<22} {:>10} {:>12}".format("rows", "read", "seconds", "memory MB"))
+    for rows in args.rows:
+        data_df = generate_data(config=data_processor.config, n_rows=rows)
+        rng = np.random.default_rng(0)
+        for column_idx in range(args.extra_columns):
+            data_df["Extra_{}".format(column_idx)] = rng.normal(size=rows)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            data_path = os.path.join(tmp_dir, "data.csv")
+            data_df.to_csv(data_path)
+            del data_df
+
+            reads = [("inferred", lambda: pd.read_csv(data_path, index_col=0))]
+            for engine in engines:
+                reads.append(
+                    (
+                        "recipe ({})".format(engine or "c"),
+                        lambda e=engine: data_processor.read_data(
+                            data_path=data_path, engine=e
+                        )
+                        or data_processor.data_df,
+                    )
+                )
+            for name, read in reads:
+                best = np.inf
+                for _ in range(args.repeat):
+                    start = time.perf_counter()
+                    results = read()
+                    best = min(best, time.perf_counter() - start)
+                print(
+                    "{:>12} {:<22} {:>10.3f} {:>12.1f}".format(
+                        rows,
+                        name,
+                        best,
+                        results.memory_usage(deep=True).sum() / 1e6,
+                    )
+                )
+                del results
+
+
+if __name__ == "__main__":
+    main()
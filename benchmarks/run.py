@@ -0,0 +1,224 @@
+import argparse
+import json
+import platform
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timezone
+import numpy as np
+import pandas as pd
+from benchmarks.synthetic import generate_data, scale_config
+from checks import check_expected_values, check_nans, check_numeric
+from enums import DataProc
+from logger import set_quiet
+from plan import STEPS, compile_config
+
+"""
+Benchmark harness timing fit and transform of a recipe, of every stage and of
+the checks, across row and feature counts, on synthetic data generated from
+the recipe. Results are written as JSON and can be compared to a baseline
+run to catch regressions.
+
+Run from the repository root:
+    python -m benchmarks.run --rows 10000 1000000 --copies 1 10 --output bench.json
+    python -m benchmarks.run --rows 10000 --baseline bench.json --tolerance 0.25
+"""
+
+STAGES = {
+    DataProc.IMPUTATION.value: "Imputer",
+    DataProc.OUTLIER_REMOVAL.value: "OutlierRemover",
+    DataProc.TRANSFORMATION.value: "Transformers",
+    DataProc.BINNING.value: "Binners",
+}
+
+
+def measure(fn, repeat: int, memory: bool) -> dict:
+    """
+    Best wall time of repeat calls of fn and, if memory, its peak traced
+    allocation in a separate call (tracing slows the timed calls down).
+    """
+    seconds = np.inf
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        seconds = min(seconds, time.perf_counter() - start)
+    measurement = {"seconds": seconds}
+    if memory:
+        tracemalloc.start()
+        fn()
+        measurement["peak_mb"] = tracemalloc.get_traced_memory()[1] / 1e6
+        tracemalloc.stop()
+    return measurement
+
+
+def transform_only(config: dict) -> dict:
+    transform_config = json.loads(json.dumps(config))
+    for methods in transform_config.values():
+        for step in STEPS:
+            if type(methods[step]) is dict and DataProc.FIT.value in methods[step]:
+                methods[step][DataProc.FIT.value] = 0
+    return transform_config
+
+
+def benchmark_cases(
+    config: dict, data_df: pd.DataFrame, mode: str, stage_features: list
+):
+    """
+    Yield (case name, callable) of the full recipe, and of each stage and the
+    checks of stage_features, in fit or transform mode.
+    """
+    plan = compile_config(config=config)
+    yield "pipeline/{}".format(mode), lambda: plan.transform(data_df=data_df)
+
+    feature_plans = [f for f in plan.features if f.name in stage_features]
+    for feature_plan in feature_plans:
+        feature_data = feature_plan.read(data_df=data_df)
+        for step in STEPS:
+            if feature_plan.methods[step] == 0:
+                continue
+            step_input = feature_data
+            yield "{}/{}/{}".format(
+                STAGES[step], feature_plan.name, mode
+            ), lambda p=feature_plan, s=step, i=step_input: p.run_step(
+                step=s, feature_data=i, data_df=data_df
+            )
+            feature_data = feature_plan.run_step(
+                step=step, feature_data=feature_data, data_df=data_df
+            )
+
+    if mode == "transform":
+        for feature_plan in feature_plans:
+            column = data_df[feature_plan.name]
+            yield "check_expected_values/{}".format(
+                feature_plan.name
+            ), lambda c=column, p=feature_plan: check_expected_values(
+                field_values=c,
+                expected_values=p.expected_values,
+                field_name=p.name,
+                operation="BENCHMARK",
+            )
+        numeric = data_df.select_dtypes("number").iloc[:, 0]
+        yield "check_nans", lambda: check_nans(
+            data=numeric,
+            field_name=numeric.name,
+            operation="BENCHMARK",
+            raise_flag=False,
+        )
+        yield "check_numeric", lambda: check_numeric(
+            data=numeric, field_name=numeric.name, operation="BENCHMARK"
+        )
+
+
+def run(config: dict, rows: list, copies: list, repeat: int, memory: bool) -> list:
+    results = []
+    for n_copies in copies:
+        for n_rows in rows:
+            with tempfile.TemporaryDirectory() as lookup_dir:
+                fit_config = scale_config(
+                    config=config, n_copies=n_copies, lookup_dir=lookup_dir
+                )
+                data_df = generate_data(config=fit_config, n_rows=n_rows)
+                # The fit pipeline runs first and writes the lookups the
+                # transform cases read.
+                for mode, mode_config in [
+                    ("fit", fit_config),
+                    ("transform", transform_only(fit_config)),
+                ]:
+                    for case, fn in benchmark_cases(
+                        config=mode_config,
+                        data_df=data_df,
+                        mode=mode,
+                        stage_features=list(config.keys()),
+                    ):
+                        measurement = measure(fn, repeat=repeat, memory=memory)
+                        measurement.update(
+                            case=case, rows=n_rows, features=len(fit_config)
+                        )
+                        results.append(measurement)
+                        print(
+                            "{:<45} {:>10} {:>8} {:>10.4f}s".format(
+                                case, n_rows, len(fit_config), measurement["seconds"]
+                            ),
+                            file=sys.stderr,
+                        )
+    return results
+
+
+def compare(results: list, baseline: list, tolerance: float) -> list:
+    """
+    Cases slower than (1 + tolerance) times their baseline time.
+    """
+    baseline = {(b["case"], b["rows"], b["features"]): b for b in baseline}
+    regressions = []
+    for result in results:
+        reference = baseline.get((result["case"], result["rows"], result["features"]))
+        if reference is None:
+            continue
+        ratio = result["seconds"] / reference["seconds"]
+        if ratio > 1 + tolerance:
+            regressions.append(
+                dict(result, baseline_seconds=reference["seconds"], ratio=ratio)
+            )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--config", default="configs/config_train.json")
+    parser.add_argument("--rows", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--copies", type=int, nargs="+", default=[1])
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--memory", action="store_true")
+    parser.add_argument("--output", default=None)
+    parser.add_argument("--baseline", default=None)
+    parser.add_argument("--tolerance", type=float, default=0.25)
+    args = parser.parse_args()
+
+    set_quiet()
+    with open(args.config) as f:
+        config = json.load(f)
+    report = {
+        "meta": {
+            "created": datetime.now(timezone.utc).isoformat(),
+            "config": args.config,
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "pandas": pd.__version__,
+            "machine": platform.machine(),
+        },
+        "results": run(
+            config=config,
+            rows=args.rows,
+            copies=args.copies,
+            repeat=args.repeat,
+            memory=args.memory,
+        ),
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+
+    if args.baseline:
+        with open(args.baseline) as f:
+            regressions = compare(
+                results=report["results"],
+                baseline=json.load(f)["results"],
+                tolerance=args.tolerance,
+            )
+        for regression in regressions:
+            print(
+                "REGRESSION {case} rows={rows} features={features}: "
+                "{seconds:.4f}s vs {baseline_seconds:.4f}s ({ratio:.2f}x)".format(
+                    **regression
+                ),
+                file=sys.stderr,
+            )
+        if regressions:
+            sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
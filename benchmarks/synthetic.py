@@ -0,0 +1,72 @@
+import os
+import numpy as np
+import pandas as pd
+from copy import deepcopy
+from checks import ExpectedValues
+from enums import DataProc
+
+"""
+Synthetic data generated from a json recipe, scaled in rows and features.
+"""
+
+
+def scale_config(config: dict, n_copies: int, lookup_dir: str) -> dict:
+    """
+    Recipe with every feature repeated n_copies times (copies suffixed _<i>)
+    and every fitted lookup path moved into lookup_dir, so benchmarks never
+    overwrite the repository lookups.
+    """
+    scaled = {}
+    for copy_idx in range(n_copies):
+        for name, methods in config.items():
+            copy_name = name if copy_idx == 0 else "{}_{}".format(name, copy_idx)
+            methods = deepcopy(methods)
+            for step in methods.values():
+                if type(step) is dict and DataProc.PATH.value in step:
+                    step[DataProc.PATH.value] = os.path.join(
+                        lookup_dir,
+                        "{}_{}".format(
+                            copy_idx, os.path.basename(step[DataProc.PATH.value])
+                        ),
+                    )
+                if type(step) is dict and step.get(DataProc.GROUPBY.value, 0) != 0:
+                    if step[DataProc.GROUPBY.value] == name:
+                        step[DataProc.GROUPBY.value] = copy_name
+            scaled[copy_name] = methods
+    return scaled
+
+
+def generate_data(
+    config: dict, n_rows: int, missing_rate: float = 0.005, seed: int = 0
+) -> pd.DataFrame:
+    """
+    Random data matching the types and expected values of every feature of a
+    recipe, with missing_rate of each column set to NaN, plus any target
+    field the recipe refers to.
+    """
+    rng = np.random.default_rng(seed)
+    data_df = pd.DataFrame(index=pd.RangeIndex(1, n_rows + 1))
+    for name, methods in config.items():
+        expected_values = ExpectedValues.from_config(
+            methods[DataProc.EXPECTED_VALUES.value]
+        )
+        if expected_values.is_range:
+            values = rng.integers(
+                expected_values.min, expected_values.max + 1, n_rows
+            ).astype("float64")
+        else:
+            values = np.asarray(expected_values.tolist(), dtype=object)[
+                rng.integers(0, len(expected_values.index), n_rows)
+            ]
+        values[rng.random(n_rows) < missing_rate] = np.nan
+        data_df[name] = values
+
+    for methods in config.values():
+        transformation = methods[DataProc.TRANSFORMATION.value]
+        if type(transformation) is dict and transformation[
+            DataProc.TARGET_FIELD.value
+        ] not in [0, *data_df.columns]:
+            data_df[transformation[DataProc.TARGET_FIELD.value]] = rng.integers(
+                0, 100, n_rows
+            ).astype("float64")
+    return data_df
@@ -0,0 +1,80 @@
+import argparse
+import time
+import numpy as np
+import pandas as pd
+from enums import DataProc
+from transformers import GroupStatistics
+
+"""
+Z-transform of a feature by group: the former merge-based lookup against the
+indexed GroupStatistics take.
+
+Run from the repository root:
+    python -m benchmarks.z_transform --rows 1000000 100000000 --groups 51
+"""
+
+
+def merge_transform(data: pd.DataFrame, table: pd.DataFrame) -> pd.Series:
+    merged = pd.merge(data, table, on=DataProc.GROUPBY.value, how="left")
+    merged.index = data.index
+    return (merged["value"] - merged["mean"]) / merged["std"]
+
+
+def indexed_transform(data: pd.DataFrame, statistics: GroupStatistics) -> pd.Series:
+    codes = statistics.codes(data[DataProc.GROUPBY.value])
+    return pd.Series(
+        (data["value"].values - statistics.take("mean", codes))
+        / statistics.take("std", codes),
+        index=data.index,
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--rows", type=int, nargs="+", default=[1000000])
+    parser.add_argument("--groups", type=int, default=51)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(0)
+    groups = np.array(["G{}".format(i) for i in range(args.groups)], dtype=object)
+    table = pd.DataFrame(
+        {
+            DataProc.GROUPBY.value: groups,
+            "mean": rng.normal(size=args.groups),
+            "std": rng.uniform(1, 2, size=args.groups),
+        }
+    )
+    statistics = GroupStatistics.from_frame(table)
+
+    print(
+        "{:>12} {:>12} {:>12} {:>9}".format("rows", "merge s", "indexed s", "speedup")
+    )
+    for rows in args.rows:
+        data = pd.DataFrame(
+            {
+                "value": rng.normal(size=rows),
+                DataProc.GROUPBY.value: groups[rng.integers(0, args.groups, rows)],
+            }
+        )
+        timings = []
+        for transform, lookup in [
+            (merge_transform, table),
+            (indexed_transform, statistics),
+        ]:
+            best = np.inf
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                results = transform(data, lookup)
+                best = min(best, time.perf_counter() - start)
+            timings.append(best)
+            del results
+        print(
+            "{:>12} {:>12.3f} {:>12.3f} {:>8.1f}x".format(
+                rows, timings[0], timings[1], timings[0] / timings[1]
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -1,9 +1,112 @@
 import pandas as pd
+from typing import NamedTuple
 from enums import DataProc
 from logger import create_logger
+from checks import ExpectedValues
+from categorical import take
+from output import codes_dtype
 from read_write import read_fitted_data, write_fitted_data
+from sketches import MinMax, QuantileSketch
 import numpy as np
 
+log = create_logger("Binner")
+
+# Rows binned at a time, so the positions of each block stay in cache and only
+# the compact codes are allocated in full.
+BLOCK_SIZE = 1 << 16
+# Up to this many edges, one comparison pass per edge over a cached block is
+# faster than the binary search of np.searchsorted.
+MAX_COMPARED_EDGES = 64
+# Binning types whose edges are fitted on data.
+FITTED_EDGE_TYPES = [
+    DataProc.QUANTILE.value,
+    DataProc.UNIFORM.value,
+    DataProc.KMEANS.value,
+]
+
+
+class BinEdges(NamedTuple):
+    """
+    Right closed bin edges of list binning, compiled once: label i is given to
+    values in (edges[i], edges[i + 1]], as by ``pd.cut(values, bins=edges,
+    labels=range(len(edges) - 1))``.
+
+    Examples
+    ----------
+    >>> bin_edges = BinEdges.from_list([0, 18, 25, 45, 65, 100])
+    >>> bin_edges.cut(pd.Series([0.0, 18.0, 18.5, 101.0, np.nan])).tolist()
+    [nan, 0, 1, nan, nan]
+    """
+
+    edges: np.ndarray
+    dtype: pd.CategoricalDtype
+
+    @classmethod
+    def from_list(cls, edges: list) -> "BinEdges":
+        edges = np.asarray(edges, dtype="float64")
+        if len(edges) < 2 or np.isnan(edges).any() or (np.diff(edges) <= 0).any():
+            log.error("Bin edges %s must increase monotonically", edges.tolist())
+            raise ValueError(
+                "Bin edges {} must increase monotonically".format(edges.tolist())
+            )
+        return cls(
+            edges=edges,
+            dtype=pd.CategoricalDtype(
+                categories=pd.Index(list(range(len(edges) - 1)), dtype="int64"),
+                ordered=True,
+            ),
+        )
+
+    @classmethod
+    def from_fitted(cls, data: dict or "BinEdges") -> "BinEdges":
+        """
+        Edges of a fitted lookup ``{"edges": [min, ..., max]}``. The outer
+        edges are opened to -inf and inf, so values beyond the range the edges
+        were fitted on fall in the first and last bins.
+        """
+        if isinstance(data, BinEdges):
+            return data
+        edges = data[DataProc.EDGES.value]
+        return cls.from_list([-np.inf] + list(edges[1:-1]) + [np.inf])
+
+    def codes(self, values) -> np.ndarray:
+        """
+        Bin of every value as the smallest integer codes, -1 for NaN and for
+        values outside (edges[0], edges[-1]].
+        """
+        values = np.asarray(values, dtype="float64")
+        n_bins = len(self.edges) - 1
+        codes = np.empty(len(values), dtype=codes_dtype(n_bins))
+        for start in range(0, len(values), BLOCK_SIZE):
+            block = values[start : start + BLOCK_SIZE]
+            if len(self.edges) <= MAX_COMPARED_EDGES:
+                # Edges below each value, i.e. its searchsorted(side="left")
+                # position; NaN is below none.
+                positions = np.zeros(len(block), dtype=codes.dtype)
+                for edge in self.edges:
+                    positions += block > edge
+            else:
+                positions = np.searchsorted(self.edges, block, side="left")
+                positions[np.isnan(block)] = 0
+            positions[positions > n_bins] = 0
+            codes[start : start + BLOCK_SIZE] = positions - 1
+        return codes
+
+    def labels(self, values) -> np.ndarray:
+        """
+        Bin of every value as float64, NaN for NaN.
+        """
+        labels = self.codes(values).astype("float64")
+        labels[labels < 0] = np.nan
+        return labels
+
+    def cut(self, values: pd.Series) -> pd.Series:
+        return pd.Series(
+            pd.Categorical.from_codes(self.codes(values), dtype=self.dtype),
+            index=values.index,
+            name=values.name,
+        )
+
 
 class Binners(object):
     """
@@ -15,12 +118,18 @@ class Binners(object):
          Binner methods and attributes.
      data: pd.DataFrame
          Data to be transformed
-    expected_values: List
+    expected_values: ExpectedValues or List
         Expected values in data or None
+    fitted_values: dict or BinEdges
+        Fitted lookup loaded up front, read from method path when None, or the
+        compiled edges of list binning
 
      Notes
      ----------
      Expected values required when method[type] == label_encoding, else None.
+     Quantile, uniform (equal width) and kmeans binning fit ``n_bins`` edges on
+     the data, written to method path as ``{"edges": [...]}``, and label
+     values by bin as float64.
 
      Examples
      ----------
@@ -30,8 +139,15 @@ class Binners(object):
      >>> my_binner.run()
     """
 
-    def __init__(self, method: dict, data: pd.DataFrame, expected_values: list = None):
+    def __init__(
+        self,
+        method: dict,
+        data: pd.DataFrame,
+        expected_values: ExpectedValues or list = None,
+        fitted_values: dict = None,
+    ):
         self.method = method
+        self.fitted_values = fitted_values
         self.data = data
         self.feature_name = data.columns[0]
         self.label_encoders = {}
@@ -40,7 +156,7 @@ class Binners(object):
         self.log = create_logger(name="Binner")
 
     def run(self):
-        self.log.info("Running binning for feature {}...".format(self.feature_name))
+        self.log.info("Running binning for feature %s...", self.feature_name)
         if type(self.method) is list:
             self.lst_binner()
         if type(self.method) is dict:
@@ -50,66 +166,181 @@ class Binners(object):
                     self.lbl_encoder_fit()
                     write_fitted_data(
                         data=self.map,
-                        data_path=DataProc.PATH.value,
+                        data_path=self.method[DataProc.PATH.value],
                         feature_name=self.feature_name,
                         file_type="json",
                     )
                 if self.method[DataProc.FIT.value] == 0:
-                    self.map = read_fitted_data(
-                        data_path=DataProc.PATH.value,
+                    self.map = self.fitted_values
+                    if self.map is None:
+                        self.map = read_fitted_data(
+                            data_path=self.method[DataProc.PATH.value],
+                            feature_name=self.feature_name,
+                            file_type="json",
+                        )
+                    self.lbl_encoder_transform()
+            if self.method[DataProc.TYPE.value] in FITTED_EDGE_TYPES:
+                if self.method[DataProc.FIT.value] == 1:
+                    self.edges = {}
+                    self.edges_fit()
+                    write_fitted_data(
+                        data=self.edges,
+                        data_path=self.method[DataProc.PATH.value],
                         feature_name=self.feature_name,
                         file_type="json",
                     )
-                    self.lbl_encoder_transform()
-        self.log.info("Binning for feature {} complete...".format(self.feature_name))
+                if self.method[DataProc.FIT.value] == 0:
+                    self.edges = self.fitted_values
+                    if self.edges is None:
+                        self.edges = read_fitted_data(
+                            data_path=self.method[DataProc.PATH.value],
+                            feature_name=self.feature_name,
+                            file_type="json",
+                        )
+                    self.edges_transform()
+        self.log.info("Binning for feature %s complete...", self.feature_name)
+
+    def edges_fit(self):
+        self.log.info(
+            "Running %s binning fit transform for feature %s...",
+            self.method[DataProc.TYPE.value],
+            self.feature_name,
+        )
+        values = self.data[self.feature_name]
+        sketch = edges_sketch(method=self.method)
+        sketch.update(values)
+        if isinstance(sketch, QuantileSketch) and sketch.needs_second_pass:
+            sketch.update_histogram(values)
+        self.edges[DataProc.EDGES.value] = fit_edges(method=self.method, sketch=sketch)
+        self.edges_transform()
+
+    def edges_transform(self):
+        self.log.info(
+            "Running %s binning transform for feature %s...",
+            self.method[DataProc.TYPE.value],
+            self.feature_name,
+        )
+        values = self.data[self.feature_name]
+        self.results = pd.DataFrame(
+            {self.feature_name: BinEdges.from_fitted(self.edges).labels(values)},
+            index=values.index,
+        )
 
     def lst_binner(self):
         self.log.info(
-            "Running range binner fit transform for feature {}...".format(
-                self.feature_name
-            )
+            "Running range binner fit transform for feature %s...", self.feature_name
         )
-        bin_lbl = list(range(len(self.method) - 1))
-        self.data[self.feature_name] = pd.cut(
-            self.data[self.feature_name], bins=self.method, labels=bin_lbl
+        bin_edges = self.fitted_values
+        if bin_edges is None:
+            bin_edges = BinEdges.from_list(self.method)
+        self.results = bin_edges.cut(self.data[self.feature_name]).to_frame(
+            name=self.feature_name
         )
 
     def lbl_encoder_fit(self):
         self.log.info(
-            "Running label encoder fit transform for feature {}...".format(
-                self.feature_name
-            )
+            "Running label encoder fit transform for feature %s...", self.feature_name
         )
+        expected_values = ExpectedValues.from_config(self.expected_values).tolist()
         if self.method[DataProc.ASCENDING.value] == 0:
-            for feat_cnt, feature_value in enumerate(reversed(self.expected_values)):
+            for feat_cnt, feature_value in enumerate(reversed(expected_values)):
                 self.map[feature_value] = feat_cnt
         else:
-            for feat_cnt, feature_value in enumerate(self.expected_values):
+            for feat_cnt, feature_value in enumerate(expected_values):
                 self.map[feature_value] = feat_cnt
 
-        self.results[self.feature_name] = self.data[self.feature_name].map(self.map)
+        self.results = self.encode()
         self.log.info(
-            "Label encoder fit transform for feature {} complete...".format(
-                self.feature_name
-            )
+            "Label encoder fit transform for feature %s complete...", self.feature_name
         )
 
+    def encode(self) -> pd.DataFrame:
+        values = self.data[self.feature_name]
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            return pd.DataFrame(
+                {self.feature_name: take(values=values, mapping=self.map)},
+                index=values.index,
+            )
+        return values.map(self.map).to_frame(name=self.feature_name)
+
     def lbl_encoder_transform(self):
         self.log.info(
-            "Running label encoder transform for feature {}...".format(
-                self.feature_name
-            )
+            "Running label encoder transform for feature %s...", self.feature_name
         )
-        self.results[self.feature_name] = self.data[self.feature_name].map(self.map)
+        self.results = self.encode()
         self.log.info(
-            "Label encoder transform for feature {} complete...".format(
-                self.feature_name
+            "Label encoder transform for feature %s complete...", self.feature_name
+        )
+
+
+def edges_sketch(method: dict):
+    """
+    Sketch the edges of a fitted binning are computed from: the range for
+    uniform binning, else a QuantileSketch.
+    """
+    if method[DataProc.TYPE.value] == DataProc.UNIFORM.value:
+        return MinMax()
+    return QuantileSketch()
+
+
+def fit_edges(method: dict, sketch) -> list:
+    """
+    ``n_bins`` + 1 increasing edges from the smallest to the largest value
+    seen: at equally spaced quantiles, equally spaced, or midway between the
+    centres of a 1-D k-means. Edges repeated by ties are dropped, giving fewer
+    bins.
+    """
+    n_bins = method[DataProc.N_BINS.value]
+    if method[DataProc.TYPE.value] == DataProc.UNIFORM.value:
+        edges = np.linspace(sketch.min, sketch.max, n_bins + 1)
+    elif method[DataProc.TYPE.value] == DataProc.QUANTILE.value:
+        edges = [sketch.quantile(q) for q in np.linspace(0, 1, n_bins + 1)]
+    else:
+        values, weights = sketch.weighted_values()
+        edges = np.concatenate(
+            [
+                [sketch.min],
+                _kmeans_boundaries(values=values, weights=weights, n_bins=n_bins),
+                [sketch.max],
+            ]
+        )
+    if not np.isfinite(edges).all():
+        log.error(
+            "%s binning requires at least one non-NaN value",
+            method[DataProc.TYPE.value],
+        )
+        raise ValueError(
+            "{} binning requires at least one non-NaN value".format(
+                method[DataProc.TYPE.value]
             )
         )
+    return np.unique(edges).tolist()
 
 
-#
-# data = pd.DataFrame(np.random.randint(1,100, 1000), columns=['My_feature'])
-# methods = [0, 18, 25, 45, 65, 100]
-# my_binner = Binners(method=methods, data=data)
-# my_binner.run()
+def _kmeans_boundaries(
+    values: np.ndarray, weights: np.ndarray, n_bins: int, max_iter: int = 100
+) -> np.ndarray:
+    # Lloyd's algorithm on sorted weighted values, centres started at the
+    # weighted quantiles. In 1-D every cluster is an interval, bounded by the
+    # midpoints between consecutive centres.
+    if len(values) == 0:
+        return np.array([])
+    cum_weights = np.cumsum(weights)
+    centres = np.unique(
+        values[
+            np.searchsorted(
+                cum_weights, (np.arange(n_bins) + 0.5) / n_bins * cum_weights[-1]
+            )
+        ]
+    )
+    for _ in range(max_iter):
+        boundaries = (centres[1:] + centres[:-1]) / 2
+        clusters = np.searchsorted(boundaries, values, side="left")
+        cluster_weights = np.bincount(clusters, weights=weights, minlength=len(centres))
+        sums = np.bincount(clusters, weights=weights * values, minlength=len(centres))
+        keep = cluster_weights > 0
+        updated = sums[keep] / cluster_weights[keep]
+        if len(updated) == len(centres) and np.allclose(updated, centres):
+            break
+        centres = updated
+    return (centres[1:] + centres[:-1]) / 2
@@ -0,0 +1,54 @@
+import numpy as np
+import pandas as pd
+from checks import ExpectedValues
+
+"""
+Categorical features as integer codes against their expected values, so
+validation, imputation and lookups index arrays of codes instead of hashing
+every row's value.
+"""
+
+
+def expected_categories(expected_values: ExpectedValues) -> pd.Index:
+    """
+    Sorted expected values, so groupbys on the codes order groups as on the
+    raw values.
+    """
+    categories = expected_values.index
+    try:
+        return categories.sort_values()
+    except TypeError:
+        return categories
+
+
+def categorize(values: pd.Series, categories: pd.Index) -> pd.Series:
+    """
+    values as a categorical whose categories are ``categories`` followed by
+    any other value seen, so unexpected values are kept rather than turned
+    into NaN. Object values are hashed once, by a single factorize.
+    """
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        if values.cat.categories[: len(categories)].equals(categories):
+            return values
+        return values.cat.set_categories(
+            categories.append(values.cat.categories.difference(categories))
+        )
+    codes, uniques = pd.factorize(values)
+    uniques = pd.Index(uniques)
+    categories = categories.append(uniques.difference(categories))
+    codes = np.where(codes >= 0, categories.get_indexer(uniques)[codes], -1)
+    return pd.Series(
+        pd.Categorical.from_codes(codes, categories=categories),
+        index=values.index,
+        name=values.name,
+    )
+
+
+def take(values: pd.Series, mapping: dict) -> np.ndarray:
+    """
+    mapping of every value as float64, NaN where missing or unmapped. Maps
+    each category once and indexes the result with the codes.
+    """
+    mapped = values.cat.categories.map(lambda c: mapping.get(c, np.nan))
+    lookup = np.append(np.asarray(mapped, dtype="float64"), np.nan)
+    return lookup[values.cat.codes.values]
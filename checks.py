@@ -2,6 +2,7 @@ import os
 import pandas as pd
 import numpy as np
 from logger import create_logger
+from read_write import read_expected_values
 
 log = create_logger("Check_json_log")
 
@@ -14,7 +15,13 @@ def config_checker(config: dict):
     FEATURE_TYPES = ["categorical", "discrete", "continuous"]
     EXPECTED_MISSING = ["nan"]
     IMPUTATION_KEYS = ["type", "method"]
-    BINNING_KEYS = ["type", "ascending"]
+    BINNING_TYPES = ["label_encoding", "quantile", "uniform", "kmeans"]
+    BINNING_KEYS = {
+        "label_encoding": ["type", "ascending"],
+        "quantile": ["type", "n_bins"],
+        "uniform": ["type", "n_bins"],
+        "kmeans": ["type", "n_bins"],
+    }
     EXPECTED_VALUES_KEYS = ["min", "max"]
     OUTLIER_REMOVAL_KEYS = ["method", "min", "max"]
     TRANSFORMATION_KEYS = ["method", "groupby", "target_field"]
@@ -22,9 +29,10 @@ def config_checker(config: dict):
     for feature_name, feature_values in config.items():
         if feature_values["type"] not in FEATURE_TYPES:
             log.error(
-                "{} has invalid feature type {} (Options: {})".format(
-                    feature_name, feature_values["type"], FEATURE_TYPES
-                )
+                "%s has invalid feature type %s (Options: %s)",
+                feature_name,
+                feature_values["type"],
+                FEATURE_TYPES,
             )
             raise ValueError(
                 "{} has invalid feature type {} (Options: {})".format(
@@ -33,9 +41,10 @@ def config_checker(config: dict):
             )
         if feature_values["expected_missing"] not in EXPECTED_MISSING:
             log.error(
-                "{} has invalid expected missing values {} (Options: {})".format(
-                    feature_name, feature_values["type"], EXPECTED_MISSING
-                )
+                "%s has invalid expected missing values %s (Options: %s)",
+                feature_name,
+                feature_values["type"],
+                EXPECTED_MISSING,
             )
             raise ValueError(
                 "{} has invalid expected missing values {} (Options: {})".format(
@@ -46,9 +55,10 @@ def config_checker(config: dict):
             for k in IMPUTATION_KEYS:
                 if k not in feature_values["imputation"]:
                     log.error(
-                        "{} key is missing in imputation setting for feature {}. Expects {}".format(
-                            k, feature_name, IMPUTATION_KEYS
-                        )
+                        "%s key is missing in imputation setting for feature %s. Expects %s",
+                        k,
+                        feature_name,
+                        IMPUTATION_KEYS,
                     )
                     raise ValueError(
                         "{} key is missing in imputation setting for feature {}. Expects {}".format(
@@ -58,9 +68,7 @@ def config_checker(config: dict):
         elif type(feature_values["imputation"]) is int:
             if feature_values["imputation"] != 0:
                 log.error(
-                    "{} is not a valid imputation option".format(
-                        str(feature_values["imputation"])
-                    )
+                    "%s is not a valid imputation option", feature_values["imputation"]
                 )
                 raise ValueError(
                     "{} is not a valid imputation option".format(
@@ -70,9 +78,9 @@ def config_checker(config: dict):
 
         if feature_values["flag_imputed"] not in [0, 1]:
             log.error(
-                "Flag imputed setting is invalid for {} Options: {}.".format(
-                    feature_name, "[0, 1]"
-                )
+                "Flag imputed setting is invalid for %s Options: %s.",
+                feature_name,
+                "[0, 1]",
             )
             raise ValueError(
                 "Flag imputed setting is invalid for {} Options: {}.".format(
@@ -84,9 +92,10 @@ def config_checker(config: dict):
             for k in EXPECTED_VALUES_KEYS:
                 if k not in feature_values["expected_values"]:
                     log.error(
-                        "{} key is missing in expected values for feature {}. Expects {}".format(
-                            k, feature_name, EXPECTED_VALUES_KEYS
-                        )
+                        "%s key is missing in expected values for feature %s. Expects %s",
+                        k,
+                        feature_name,
+                        EXPECTED_VALUES_KEYS,
                     )
                     raise ValueError(
                         "{} key is missing in expected values for feature {}. Expects {}".format(
@@ -95,9 +104,9 @@ def config_checker(config: dict):
                     )
                 elif type(feature_values["expected_values"][k]) is not int:
                     log.error(
-                        "Expected value key {} is not an integer for feature {}".format(
-                            k, feature_name
-                        )
+                        "Expected value key %s is not an integer for feature %s",
+                        k,
+                        feature_name,
                     )
                     raise ValueError(
                         "Expected value key {} is not an integer for feature {}".format(
@@ -108,9 +117,9 @@ def config_checker(config: dict):
         if type(feature_values["expected_values"]) is str:
             if not os.path.isfile(feature_values["expected_values"]):
                 log.error(
-                    "{} is not a valid file path for expected values for feature {}".format(
-                        feature_values["expected_values"], feature_name
-                    )
+                    "%s is not a valid file path for expected values for feature %s",
+                    feature_values["expected_values"],
+                    feature_name,
                 )
                 raise FileNotFoundError(
                     "{} is not a valid file path for expected values for feature {}".format(
@@ -121,9 +130,9 @@ def config_checker(config: dict):
         if type(feature_values["expected_values"]) is list:
             if len(feature_values["expected_values"]) < 2:
                 log.error(
-                    "{} error: Requires at least 2 expected values, found {}".format(
-                        feature_name, str(len(feature_values["expected_values"]))
-                    )
+                    "%s error: Requires at least 2 expected values, found %s",
+                    feature_name,
+                    len(feature_values["expected_values"]),
                 )
                 raise ValueError(
                     "{} error: Requires at least 2 expected values, found {}".format(
@@ -135,9 +144,10 @@ def config_checker(config: dict):
             for k in OUTLIER_REMOVAL_KEYS:
                 if k not in feature_values["outlier_removal"]:
                     log.error(
-                        "{} key is missing in outlier removal for feature {}. Expects {}".format(
-                            k, feature_name, OUTLIER_REMOVAL_KEYS
-                        )
+                        "%s key is missing in outlier removal for feature %s. Expects %s",
+                        k,
+                        feature_name,
+                        OUTLIER_REMOVAL_KEYS,
                     )
                     raise ValueError(
                         "{} key is missing in outlier removal for feature {}. Expects {}".format(
@@ -147,9 +157,9 @@ def config_checker(config: dict):
         elif type(feature_values["outlier_removal"]) is int:
             if feature_values["outlier_removal"] != 0:
                 log.error(
-                    "{} is not a valid outlier removal option for feature {}".format(
-                        str(feature_values["outlier_removal"]), feature_name
-                    )
+                    "%s is not a valid outlier removal option for feature %s",
+                    feature_values["outlier_removal"],
+                    feature_name,
                 )
                 raise ValueError(
                     "{} is not a valid outlier removal option for feature {}".format(
@@ -161,21 +171,58 @@ def config_checker(config: dict):
             for k in TRANSFORMATION_KEYS:
                 if k not in feature_values["transformation"]:
                     log.error(
-                        "{} key is missing in transformation for feature {}. Expects {}".format(
-                            k, feature_name, TRANSFORMATION_KEYS
-                        )
+                        "%s key is missing in transformation for feature %s. Expects %s",
+                        k,
+                        feature_name,
+                        TRANSFORMATION_KEYS,
                     )
                     raise ValueError(
                         "{} key is missing in transformation for feature {}. Expects {}".format(
                             k, feature_name, TRANSFORMATION_KEYS
                         )
                     )
+            smoothing = feature_values["transformation"].get("smoothing", 0)
+            min_count = feature_values["transformation"].get("min_count", 1)
+            if not isinstance(smoothing, (int, float)) or smoothing < 0:
+                log.error(
+                    "%s is not a valid smoothing for feature %s",
+                    smoothing,
+                    feature_name,
+                )
+                raise ValueError(
+                    "{} is not a valid smoothing for feature {}".format(
+                        smoothing, feature_name
+                    )
+                )
+            if type(min_count) is not int or min_count < 1:
+                log.error(
+                    "%s is not a valid min_count for feature %s",
+                    min_count,
+                    feature_name,
+                )
+                raise ValueError(
+                    "{} is not a valid min_count for feature {}".format(
+                        min_count, feature_name
+                    )
+                )
+            folds = feature_values["transformation"].get("folds", 0)
+            if type(folds) is not int or not 0 <= folds <= np.iinfo("int16").max:
+                log.error(
+                    "%s is not a valid number of folds for feature %s",
+                    folds,
+                    feature_name,
+                )
+                raise ValueError(
+                    "{} is not a valid number of folds for feature {}".format(
+                        folds, feature_name
+                    )
+                )
         elif type(feature_values["transformation"]) is int:
             if feature_values["transformation"] != 0:
                 log.error(
-                    "{} is not a valid transformation option for feature {}".format(
-                        str(feature_values["transformation"]), feature_name
-                    )
+                    "%s is not a valid transformation option for feature %s",
+                    feature_values["transformation"],
+                    feature_name,
                 )
                 raise ValueError(
                     "{} is not a valid transformation option for feature {}".format(
@@ -184,24 +231,50 @@ def config_checker(config: dict):
                 )
 
         if type(feature_values["binning"]) is dict:
-            for k in BINNING_KEYS:
+            binning_type = feature_values["binning"].get("type")
+            if binning_type not in BINNING_TYPES:
+                log.error(
+                    "%s has invalid binning type %s (Options: %s)",
+                    feature_name,
+                    binning_type,
+                    BINNING_TYPES,
+                )
+                raise ValueError(
+                    "{} has invalid binning type {} (Options: {})".format(
+                        feature_name, binning_type, BINNING_TYPES
+                    )
+                )
+            for k in BINNING_KEYS[binning_type]:
                 if k not in feature_values["binning"]:
                     log.error(
-                        "{} key is missing in binning for feature {}. Expects {}".format(
-                            k, feature_name, BINNING_KEYS
-                        )
+                        "%s key is missing in binning for feature %s. Expects %s",
+                        k,
+                        feature_name,
+                        BINNING_KEYS[binning_type],
                     )
                     raise ValueError(
                         "{} key is missing in binning for feature {}. Expects {}".format(
-                            k, feature_name, BINNING_KEYS
+                            k, feature_name, BINNING_KEYS[binning_type]
                         )
                     )
+            n_bins = feature_values["binning"].get("n_bins", 1)
+            if type(n_bins) is not int or n_bins < 1:
+                log.error(
+                    "%s is not a valid number of bins for feature %s",
+                    n_bins,
+                    feature_name,
+                )
+                raise ValueError(
+                    "{} is not a valid number of bins for feature {}".format(
+                        n_bins, feature_name
+                    )
+                )
         elif type(feature_values["binning"]) is int:
             if feature_values["binning"] != 0:
                 log.error(
-                    "{} is not a valid binning option for feature {}".format(
-                        str(feature_values["binning"]), feature_name
-                    )
+                    "%s is not a valid binning option for feature %s",
+                    feature_values["binning"],
+                    feature_name,
                 )
                 raise ValueError(
                     "{} is not a valid binning option for feature {}".format(
@@ -211,9 +284,9 @@ def config_checker(config: dict):
         elif type(feature_values["binning"]) is list:
             if len(feature_values["binning"]) < 3:
                 log.error(
-                    "{} error: Binning by list requires at least 3 data points, found {}".format(
-                        feature_name, str(len(feature_values["binning"]))
-                    )
+                    "%s error: Binning by list requires at least 3 data points, found %s",
+                    feature_name,
+                    len(feature_values["binning"]),
                 )
                 raise ValueError(
                     "{} error: Binning by list requires at least 3 data points, found {}".format(
@@ -225,7 +298,7 @@ def config_checker(config: dict):
 def check_fields_exist(found_fields: list, expected_fields: list):
     for field in expected_fields:
         if field not in found_fields:
-            log.error("{} field could not be found in data input fields".format(field))
+            log.error("%s field could not be found in data input fields", field)
             raise KeyError(
                 "{} field could not be found in data input fields".format(field)
             )
@@ -233,28 +306,132 @@ def check_fields_exist(found_fields: list, expected_fields: list):
     log.info("Field name check for complete...")
 
 
+class ExpectedValues(object):
+    """
+    Expected values of a feature, indexed once so data can be validated
+    against them with vectorized lookups.
+
+    Parameters
+    ----------
+    values: list
+        Expected values, or None for a range
+    min: int
+        Smallest expected integer of a range
+    max: int
+        Largest expected integer of a range
+
+    Notes
+    ----------
+    A ``{min, max}`` range is checked arithmetically (integers between min
+    and max) without materializing its values. NaN is always accepted.
+
+    Examples
+    ----------
+    >>> expected_values = ExpectedValues.from_config({"min": 18, "max": 100})
+    >>> expected_values.unexpected(pd.Series([17.0, 18.0, 18.5, np.nan]))
+    17.0    1
+    18.5    1
+    dtype: int64
+    """
+
+    def __init__(self, values: list = None, min: int = None, max: int = None):
+        self.min = min
+        self.max = max
+        self.index = None if values is None else pd.Index(values)
+
+    @classmethod
+    def from_config(cls, expected_values) -> "ExpectedValues":
+        if isinstance(expected_values, ExpectedValues):
+            return expected_values
+        if type(expected_values) is dict:
+            return cls(min=expected_values["min"], max=expected_values["max"])
+        if type(expected_values) is str:
+            return cls(values=read_expected_values(expected_values))
+        return cls(values=list(expected_values))
+
+    @property
+    def is_range(self) -> bool:
+        return self.index is None
+
+    def tolist(self) -> list:
+        if self.is_range:
+            return [float(x) for x in range(self.min, self.max + 1)]
+        return self.index.tolist()
+
+    def unexpected(self, field_values) -> pd.Series:
+        """
+        Counts of every value of field_values that is neither NaN nor expected.
+        """
+        field_values = pd.Series(field_values)
+        if isinstance(field_values.dtype, pd.CategoricalDtype):
+            return self._unexpected_categories(field_values)
+        missing = field_values.isna().values
+        if self.is_range:
+            numeric = pd.to_numeric(field_values, errors="coerce").values
+            is_expected = (
+                (numeric >= self.min) & (numeric <= self.max) & (numeric % 1 == 0)
+            )
+        else:
+            is_expected = field_values.isin(self.index).values
+        return field_values[~(is_expected | missing)].value_counts()
+
+    def _unexpected_categories(self, field_values: pd.Series) -> pd.Series:
+        # The categories are checked instead of the rows, which are counted
+        # by code only when some category is unexpected.
+        categories = field_values.cat.categories
+        unexpected = self.unexpected(pd.Series(categories.values)).index
+        if len(unexpected) == 0:
+            return pd.Series(dtype="int64")
+        codes = field_values.cat.codes.values
+        counts = pd.Series(
+            np.bincount(codes[codes >= 0], minlength=len(categories)),
+            index=categories,
+        )
+        counts = counts[categories.isin(unexpected) & (counts.values > 0)]
+        return counts.sort_values(ascending=False, kind="stable")
+
+
 def check_expected_values(
-    field_values: list, expected_values: list, field_name: str, operation: str
-):
-    remain = list(set(field_values) - set(expected_values))
-    remain = [x for x in remain if str(x) != str(float(np.nan))]
+    field_values: list,
+    expected_values,
+    field_name: str,
+    operation: str,
+    raise_flag: bool = True,
+) -> pd.Series:
+    """
+    Counts of the values of field_values that are not expected, most frequent
+    first, empty when all are. Raises if any is found, unless raise_flag is
+    False, in which case they are logged as a warning and returned.
+    """
+    remain = ExpectedValues.from_config(expected_values).unexpected(field_values)
     if len(remain) > 0:
-        log.error(
-            "{} contains {} unexpected values following {} operation".format(
-                field_name, str(len(remain)), operation
+        if raise_flag:
+            log.error(
+                "%s contains %s unexpected values following %s operation: %s",
+                field_name,
+                len(remain),
+                operation,
+                remain.head(10).to_dict(),
             )
-        )
-        raise ValueError(
-            "{} contains {} unexpected values following {} operation".format(
-                field_name, str(len(remain)), operation
+            raise ValueError(
+                "{} contains {} unexpected values following {} operation: {}".format(
+                    field_name, str(len(remain)), operation, remain.head(10).to_dict()
+                )
             )
+        log.warning(
+            "%s contains %s unexpected values following %s operation: %s",
+            field_name,
+            len(remain),
+            operation,
+            remain.head(10).to_dict(),
         )
     else:
         log.info(
-            "Expected values check for feature {} following operation {} complete...".format(
-                field_name, operation
-            )
+            "Expected values check for feature %s following operation %s complete...",
+            field_name,
+            operation,
         )
+    return remain
 
 
 def check_nans(
@@ -262,17 +439,15 @@ def check_nans(
 ):
     if data.isna().sum() > 0:
         if raise_flag:
-            log.error(
-                "{} contains nans following operation {}.".format(field_name, operation)
-            )
+            log.error("%s contains nans following operation %s.", field_name, operation)
             raise ValueError(
                 "{} contains nans following operation {}.".format(field_name, operation)
             )
     else:
         log.info(
-            "NaN check for feature {} following operation {} complete...".format(
-                field_name, operation
-            )
+            "NaN check for feature %s following operation %s complete...",
+            field_name,
+            operation,
         )
 
 
@@ -282,9 +457,9 @@ def check_numeric(
     if not pd.api.types.is_numeric_dtype(data):
         if raise_flag:
             log.error(
-                "{} contains non-numeric values following operation {}.".format(
-                    field_name, operation
-                )
+                "%s contains non-numeric values following operation %s.",
+                field_name,
+                operation,
             )
             raise ValueError(
                 "{} contains non-numeric values following operation {}.".format(
@@ -294,7 +469,26 @@ def check_numeric(
 
     else:
         log.info(
-            "Numeric check for feature {} following operation {} complete...".format(
-                field_name, operation
-            )
+            "Numeric check for feature %s following operation %s complete...",
+            field_name,
+            operation,
         )
+
+
+def check_transform_only(config: dict, operation: str):
+    STEP_KEYS = ["imputation", "outlier_removal", "transformation", "binning"]
+
+    for feature_name, feature_values in config.items():
+        for k in STEP_KEYS:
+            if type(feature_values[k]) is dict and feature_values[k].get("fit", 0) != 0:
+                log.error(
+                    "%s step %s is in fit mode, %s requires fit: 0 for every step",
+                    feature_name,
+                    k,
+                    operation,
+                )
+                raise ValueError(
+                    "{} step {} is in fit mode, {} requires fit: 0 for every step".format(
+                        feature_name, k, operation
+                    )
+                )
@@ -6,11 +6,7 @@ TRAIN_V_TEST = "test"
 
 df = pd.DataFrame(index=list(range(1, LEN)))
 
-state_abbr = list(
-    pd.read_csv(
-        "/Users/simon/Desktop/envs/GEICO/lookups/us_state_abbr.csv", header=None
-    )[0]
-)
+state_abbr = list(pd.read_csv("lookups/us_state_abbr.csv", header=None)[0])
 
 
 df["Feature_1"] = np.random.choice(["A", "B", "C", "D"], len(df))
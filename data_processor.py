@@ -1,13 +1,78 @@
 import pandas as pd
-from imputers import Imputer
-from outlier_removers import OutlierRemover
-from transformers import Transformers
-from binners import Binners
-from checks import config_checker, check_fields_exist, check_expected_values
+from binners import FITTED_EDGE_TYPES, Binners, edges_sketch, fit_edges
+from categorical import categorize, expected_categories
+from checks import config_checker, check_fields_exist, check_transform_only
+from plan import (
+    STEPS,
+    ExecutionPlan,
+    compile_config,
+    collect_artifacts,
+    compile_feature,
+    expected_values_of,
+)
 from enums import DataProc
+from logger import create_logger
+from metrics import TransformMetrics
+from read_write import (
+    ArtifactStore,
+    fit_state_path,
+    read_fitted_data,
+    write_fitted_data,
+)
+from scoring import RowPlan, compile_rows
+from sinks import ArrowSink, CsvSink, NpySink, ParquetSink, Sink
+from sketches import (
+    GroupMoments,
+    MinMax,
+    ModeCounter,
+    QuantileSketch,
+    sketch_from_dict,
+)
+from transformers import field_mean_lookup
 from copy import deepcopy
+from multiprocessing import get_context
+from typing import NamedTuple
 import json
 import os
+import sys
+import time
+
+log = create_logger("DataProcessor")
+
+PARQUET_EXTENSIONS = [".parquet", ".pq"]
+FEATHER_EXTENSIONS = [".feather", ".arrow"]
+# Sink and file extension of each output format of transform_files.
+OUTPUT_FORMATS = {
+    "csv": (CsvSink, ".csv"),
+    "parquet": (ParquetSink, ".parquet"),
+    "arrow": (ArrowSink, ".arrow"),
+    "npy": (NpySink, ".npy"),
+}
+
+# Processor shared with the workers of transform_files, set before they are
+# forked so its compiled plan is inherited rather than pickled per file.
+_SHARED = {}
+
+
+class FileResult(NamedTuple):
+    """
+    Outcome of transforming one input file: rows written, wall time and the
+    error, None when it succeeded.
+    """
+
+    data_path: str
+    output_path: str
+    rows: int
+    seconds: float
+    error: str = None
+
+    @property
+    def ok(self) -> bool:
+        return self.error is None
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds > 0 else 0.0
 
 
 class DataProcessor(object):
@@ -18,98 +83,710 @@ class DataProcessor(object):
     ----------
     config_path: str
         path to config json format
+    artifact_path: str
+        path to an ArtifactStore file holding every fitted lookup, used instead
+        of the per-step lookup paths when given
+    fused: bool
+        run the transform-only steps of numeric features as one in place
+        kernel instead of step by step, with the same results
 
     Examples
     ----------
     >>> data_processor = DataProcessor(config_path='configs/config.json')
     >>> data_processor.read_data(data_path='data/data_1000_train.csv')
     >>> results = data_processor.transform()
+
+    Data already in memory or in Parquet skips the CSV round trip:
+
+    >>> data_processor.read_data(data=data_df)
+    >>> data_processor.read_data(data_path='data/data_1000_train.parquet')
+
+    Transform-only recipes (every step ``fit: 0``) can also stream a CSV
+    that does not fit in memory, chunk by chunk:
+
+    >>> chunks = data_processor.transform_stream(data_path='data/data_1000_test.csv', chunksize=100)
+    >>> results = pd.concat(chunks)
+
+    Results can be written chunk by chunk to a Parquet, Arrow or CSV file, or
+    to a float32 .npy matrix for model input, without holding all of them:
+
+    >>> data_processor.transform_to(sink=NpySink(data_path='results.npy'))
+
+    Many partitioned files are transformed by forked workers sharing one
+    compiled recipe, also from the command line (``python -m batch``):
+
+    >>> results = list(data_processor.transform_files(data_paths=paths, output_dir='results', n_workers=8))
+
+    Rows of an online request are transformed one dict at a time, in
+    microseconds:
+
+    >>> data_processor.transform_row({'Feature_1': 'A', 'Feature_2': 25.0, ...})
+
+    Per feature and stage timings of a transform:
+
+    >>> metrics = TransformMetrics()
+    >>> results = data_processor.transform(metrics=metrics)
+    >>> print(metrics.to_json(indent=2))
     """
 
-    def __init__(self, config_path: str):
+    def __init__(
+        self, config_path: str, artifact_path: str = None, fused: bool = False
+    ):
         with open(config_path) as f:
             self.config = json.load(f)
         config_checker(config=self.config)
+        self.artifact_path = artifact_path
+        self.fused = fused
+        self.plan = None
+        self.row_plan = None
 
-    def read_data(self, data_path: str):
-        if not os.path.isfile(data_path):
-            raise FileNotFoundError("{} is not a valid file path".format(data_path))
-        self.data_df = pd.read_csv(data_path, index_col=0)
-        check_fields_exist(
-            found_fields=self.data_df.columns, expected_fields=self.config.keys()
+    def compile(self) -> ExecutionPlan:
+        """
+        Compile the recipe into an ``ExecutionPlan``, building expected values
+        and loading the fitted lookups of every ``fit: 0`` step once. The plan
+        is kept and reused by ``transform`` and ``transform_stream``; call
+        ``compile`` again to pick up lookups refitted on disk.
+        """
+        store = None
+        if self.artifact_path is not None:
+            store = ArtifactStore.load(data_path=self.artifact_path)
+        self.plan = compile_config(config=self.config, store=store, fused=self.fused)
+        self.row_plan = None
+        return self.plan
+
+    def export_artifacts(self, artifact_path: str, version: str = None):
+        """
+        Package the fitted lookups of every step into a single ArtifactStore
+        file, for scoring workers to load with ``artifact_path``.
+        """
+        collect_artifacts(config=self.config, version=version).save(
+            data_path=artifact_path
         )
 
-    def transform(self):
-        self.results_lst = []
+    def _csv_dtypes(self) -> dict:
+        # Pin numeric features so every chunk of a streamed read parses to the
+        # same dtype as a full read, regardless of whether it holds any NaN.
+        # Categorical features of string values are parsed to codes against
+        # the values seen, then recoded to their expected values by
+        # _categorize. Numeric coded ones are parsed as numbers, as parsed
+        # categories would be strings ('1') never equal to the expected 1.
+        dtypes = {}
         for name, methods in self.config.items():
-            feature_data = deepcopy(self.data_df[name])
-            if type(methods[DataProc.EXPECTED_VALUES.value]) is dict:
-                expected_values = list(
-                    range(
-                        methods[DataProc.EXPECTED_VALUES.value][DataProc.MIN.value],
-                        methods[DataProc.EXPECTED_VALUES.value][DataProc.MAX.value] + 1,
+            if methods[DataProc.TYPE.value] in ["discrete", "continuous"]:
+                dtypes[name] = "float64"
+            elif methods[DataProc.TYPE.value] == "categorical":
+                expected_values = expected_values_of(methods=methods)
+                if expected_values.is_range or pd.api.types.is_numeric_dtype(
+                    expected_categories(expected_values=expected_values)
+                ):
+                    dtypes[name] = "float64"
+                else:
+                    dtypes[name] = "category"
+        return dtypes
+
+    def _csv_read_args(self, data_path: str) -> dict:
+        # Project the read to the index and the columns the recipe uses.
+        header = pd.read_csv(data_path, index_col=0, nrows=0).columns
+        columns = [c for c in self.input_columns() if c in header]
+        dtypes = self._csv_dtypes()
+        return {
+            "index_col": 0,
+            "usecols": [0] + sorted(header.get_loc(c) + 1 for c in columns),
+            "dtype": {c: dtypes[c] for c in columns if c in dtypes},
+        }
+
+    def _categorize(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        """
+        Recode every categorical feature read as ``category`` to its sorted
+        expected values as categories, so all reads and chunks share one dtype
+        and groupbys on it order groups as on the raw values. Values seen but
+        not expected are kept as extra categories for the READ IN check to
+        report rather than being turned into NaN.
+        """
+        for name, methods in self.config.items():
+            if name not in data_df or not isinstance(
+                data_df[name].dtype, pd.CategoricalDtype
+            ):
+                continue
+            expected_values = expected_values_of(methods=methods)
+            if expected_values.is_range:
+                continue
+            data_df[name] = categorize(
+                values=data_df[name],
+                categories=expected_categories(expected_values=expected_values),
+            )
+        return data_df
+
+    def input_columns(self) -> list:
+        """
+        Columns the recipe reads: every feature, and the groupby and target
+        fields of transformations (targets only when fitting).
+        """
+        columns = list(self.config.keys())
+        for methods in self.config.values():
+            transformation = methods[DataProc.TRANSFORMATION.value]
+            if type(transformation) is not dict:
+                continue
+            fields = [transformation[DataProc.GROUPBY.value]]
+            if transformation[DataProc.FIT.value] == 1:
+                fields.append(transformation[DataProc.TARGET_FIELD.value])
+            columns += [f for f in fields if f != 0 and f not in columns]
+        return columns
+
+    def read_data(self, data_path: str = None, data=None, engine: str = None):
+        """
+        Read the data to transform from ``data_path``, a CSV, Parquet
+        (``.parquet``, ``.pq``) or Feather (``.feather``, ``.arrow``) file, or
+        take it from ``data``, a DataFrame or ``pyarrow.Table``.
+
+        A DataFrame is used as is, without a copy. Parquet, Feather and Arrow
+        sources are projected to ``input_columns`` so no other column is read
+        or converted, and numeric features are cast to float64 as when read
+        from CSV. Parquet and Feather require pyarrow.
+
+        CSVs are read with the same projection, numeric features as float64 and
+        categorical features as ``category`` with their expected values as
+        categories. ``engine='pyarrow'`` parses CSVs with the multithreaded
+        pyarrow reader.
+        """
+        if (data_path is None) == (data is None):
+            log.error("read_data takes one of data_path or data")
+            raise ValueError("read_data takes one of data_path or data")
+        if data is not None:
+            self.data_df = self._from_memory(data=data)
+        else:
+            if not os.path.isfile(data_path):
+                raise FileNotFoundError("{} is not a valid file path".format(data_path))
+            extension = os.path.splitext(data_path)[1].lower()
+            if extension in PARQUET_EXTENSIONS:
+                self.data_df = self._pin_dtypes(
+                    pd.read_parquet(data_path, columns=self.input_columns())
+                )
+            elif extension in FEATHER_EXTENSIONS:
+                self.data_df = self._pin_dtypes(
+                    pd.read_feather(data_path, columns=self.input_columns())
+                )
+            else:
+                self.data_df = self._categorize(
+                    pd.read_csv(
+                        data_path, engine=engine, **self._csv_read_args(data_path)
                     )
                 )
-                expected_values = [float(x) for x in expected_values]
-            if type(methods[DataProc.EXPECTED_VALUES.value]) is list:
-                expected_values = methods[DataProc.EXPECTED_VALUES.value]
-            if type(methods[DataProc.EXPECTED_VALUES.value]) is str:
-                expected_values = list(
-                    pd.read_csv(methods[DataProc.EXPECTED_VALUES.value], header=None)[0]
+        check_fields_exist(
+            found_fields=self.data_df.columns, expected_fields=self.config.keys()
+        )
+
+    def _from_memory(self, data) -> pd.DataFrame:
+        if isinstance(data, pd.DataFrame):
+            return data
+        pyarrow = sys.modules.get("pyarrow")
+        if pyarrow is not None and isinstance(data, pyarrow.Table):
+            columns = self.input_columns()
+            pandas_metadata = data.schema.pandas_metadata or {}
+            columns += [
+                c
+                for c in pandas_metadata.get("index_columns", [])
+                if type(c) is str and c not in columns
+            ]
+            return self._pin_dtypes(
+                data.select([c for c in columns if c in data.column_names]).to_pandas()
+            )
+        log.error("%s is not a DataFrame or pyarrow Table", type(data).__name__)
+        raise TypeError(
+            "{} is not a DataFrame or pyarrow Table".format(type(data).__name__)
+        )
+
+    def _pin_dtypes(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        dtypes = {
+            name: dtype
+            for name, dtype in self._csv_dtypes().items()
+            if name in data_df.columns and data_df[name].dtype != dtype
+        }
+        return self._categorize(data_df.astype(dtypes) if dtypes else data_df)
+
+    def transform(
+        self, n_jobs: int = 1, backend: str = "thread", metrics: TransformMetrics = None
+    ):
+        """
+        Transform the data read by ``read_data``. With ``n_jobs`` > 1 (or -1 for
+        all cores) features run concurrently on a ``thread`` or fork-based
+        ``process`` pool sharing the data without copying it. A
+        ``TransformMetrics`` passed as ``metrics`` records the time, rows,
+        output size and cache hits of every stage of every feature.
+        """
+        if self.plan is None:
+            self.compile()
+        return self.plan.transform(
+            data_df=self.data_df, n_jobs=n_jobs, backend=backend, metrics=metrics
+        )
+
+    def transform_row(self, row: dict) -> dict:
+        """
+        Transform a single row given as a dict of field values, e.g. an online
+        scoring request, without building a DataFrame. Gives the same values as
+        ``transform`` on that row. Requires a transform-only recipe.
+        """
+        if self.row_plan is None:
+            self.compile_rows()
+        return self.row_plan.transform_row(row)
+
+    def transform_records(self, records: list) -> list:
+        """
+        Transform a small batch of rows given as dicts, see ``transform_row``.
+        """
+        if self.row_plan is None:
+            self.compile_rows()
+        return self.row_plan.transform_records(records)
+
+    def compile_rows(self) -> RowPlan:
+        check_transform_only(config=self.config, operation="row transform")
+        if self.plan is None:
+            self.compile()
+        self.row_plan = compile_rows(plan=self.plan)
+        return self.row_plan
+
+    def transform_stream(
+        self, data_path: str, chunksize: int = 100000, metrics: TransformMetrics = None
+    ):
+        """
+        Read ``data_path`` in chunks of ``chunksize`` rows and yield each
+        transformed chunk. Only the current chunk and its results are held in
+        memory, and concatenating the yielded chunks gives the same frame as
+        ``read_data`` followed by ``transform``.
+
+        Requires every step of the recipe to be in transform-only mode
+        (``fit: 0``) as fitted statistics must not depend on the chunking.
+        """
+        check_transform_only(config=self.config, operation="streaming transform")
+        if not os.path.isfile(data_path):
+            raise FileNotFoundError("{} is not a valid file path".format(data_path))
+        if self.plan is None:
+            self.compile()
+        for data_df in self._read_chunks(data_path, chunksize=chunksize):
+            yield self.plan.transform(data_df=data_df, metrics=metrics)
+
+    def transform_to(
+        self,
+        sink: Sink,
+        data_path: str = None,
+        chunksize: int = 100000,
+        n_jobs: int = 1,
+        backend: str = "thread",
+    ) -> int:
+        """
+        Transform chunks of ``chunksize`` rows and write each to ``sink`` as it
+        is done, so only one chunk of results is held in memory. Chunks are
+        streamed from the CSV at ``data_path`` when given, else sliced from the
+        data read by ``read_data``. Returns the number of rows written.
+
+        Recipes with a ``fit: 1`` step are transformed whole, in one chunk, as
+        fitted statistics must not depend on the chunking.
+        """
+        if data_path is not None:
+            chunks = self.transform_stream(data_path=data_path, chunksize=chunksize)
+        elif any(
+            type(methods[step]) is dict and methods[step].get(DataProc.FIT.value, 0)
+            for methods in self.config.values()
+            for step in STEPS
+        ):
+            chunks = [self.transform(n_jobs=n_jobs, backend=backend)]
+        else:
+            if self.plan is None:
+                self.compile()
+            chunks = (
+                self.plan.transform(
+                    data_df=self.data_df.iloc[start : start + chunksize],
+                    n_jobs=n_jobs,
+                    backend=backend,
+                )
+                for start in range(0, len(self.data_df), chunksize)
+            )
+        with sink:
+            for results in chunks:
+                sink.write(results)
+        return sink.rows
+
+    def transform_to_csv(
+        self, data_path: str, output_path: str, chunksize: int = 100000
+    ) -> int:
+        """
+        Stream ``data_path`` through the recipe and append every transformed
+        chunk to the CSV at ``output_path``. Returns the number of rows written.
+        """
+        return self.transform_to(
+            sink=CsvSink(data_path=output_path),
+            data_path=data_path,
+            chunksize=chunksize,
+        )
+
+    def transform_files(
+        self,
+        data_paths: list,
+        output_dir: str,
+        output_format: str = "csv",
+        n_workers: int = 1,
+        chunksize: int = 100000,
+    ):
+        """
+        Stream every CSV of ``data_paths`` through the recipe into a file of the
+        same name in ``output_dir``, and yield a ``FileResult`` per input file
+        as it completes. Requires a transform-only recipe.
+
+        The recipe is validated and compiled, and its lookups loaded, once.
+        With ``n_workers`` > 1 (or -1 for all cores) files are transformed
+        concurrently by forked workers that inherit the compiled processor
+        copy-on-write. Each worker holds a single chunk of a single file at a
+        time and returns only its FileResult, so memory stays bounded however
+        many files are queued. A failing file is reported with its error, its
+        partial output removed, and the others carry on.
+
+        Examples
+        ----------
+        >>> for result in data_processor.transform_files(data_paths=glob.glob('data/part-*.csv'), output_dir='results', n_workers=8):
+        ...     print(result.data_path, result.ok, result.rows_per_second)
+        """
+        check_transform_only(config=self.config, operation="transform_files")
+        if output_format not in OUTPUT_FORMATS:
+            log.error(
+                "%s is not a valid output format (Options: %s)",
+                output_format,
+                list(OUTPUT_FORMATS),
+            )
+            raise ValueError(
+                "{} is not a valid output format (Options: {})".format(
+                    output_format, list(OUTPUT_FORMATS)
                 )
-            check_expected_values(
-                field_values=feature_data.unique(),
-                expected_values=expected_values,
-                field_name=name,
-                operation="READ IN",
             )
+        output_paths = [
+            os.path.join(
+                output_dir,
+                os.path.splitext(os.path.basename(data_path))[0]
+                + OUTPUT_FORMATS[output_format][1],
+            )
+            for data_path in data_paths
+        ]
+        if len(set(output_paths)) < len(output_paths):
+            log.error("Input files of the same name would share an output file")
+            raise ValueError("Input files of the same name would share an output file")
+        os.makedirs(output_dir, exist_ok=True)
+        if self.plan is None:
+            self.compile()
+
+        tasks = [
+            (data_path, output_path, output_format, chunksize)
+            for data_path, output_path in zip(data_paths, output_paths)
+        ]
+        if n_workers == -1:
+            n_workers = os.cpu_count()
+        n_workers = min(n_workers, len(tasks))
+        if n_workers <= 1:
+            for task in tasks:
+                yield self._transform_file(*task)
+            return
+        _SHARED.update(processor=self)
+        try:
+            with get_context("fork").Pool(processes=n_workers) as pool:
+                for result in pool.imap_unordered(_transform_shared_file, tasks):
+                    yield result
+        finally:
+            _SHARED.clear()
+
+    def _transform_file(
+        self, data_path: str, output_path: str, output_format: str, chunksize: int
+    ) -> FileResult:
+        start = time.perf_counter()
+        try:
+            rows = self.transform_to(
+                sink=OUTPUT_FORMATS[output_format][0](data_path=output_path),
+                data_path=data_path,
+                chunksize=chunksize,
+            )
+        except Exception as e:
+            log.error("Transforming %s failed: %s", data_path, e)
+            if os.path.isfile(output_path):
+                os.remove(output_path)
+            return FileResult(
+                data_path=data_path,
+                output_path=output_path,
+                rows=0,
+                seconds=time.perf_counter() - start,
+                error="{}: {}".format(type(e).__name__, e),
+            )
+        log.info("Transformed %s rows of %s to %s", rows, data_path, output_path)
+        return FileResult(
+            data_path=data_path,
+            output_path=output_path,
+            rows=rows,
+            seconds=time.perf_counter() - start,
+        )
+
+    def fit_stream(self, data_path: str, chunksize: int = 100000):
+        """
+        Fit every ``fit: 1`` step of the recipe on ``data_path`` read in chunks
+        of ``chunksize`` rows and write the same lookups as ``transform`` does
+        in fit mode. Memory is bounded by the chunk size and the number of
+        distinct values / groups rather than by the number of rows.
+
+        Steps are fitted in recipe order, one pass over the data per step, so
+        each step is fitted on the output of the already fitted steps before
+        it. Median and percentile fits on features with more distinct values
+        than ``QuantileSketch`` counts exactly take one additional pass.
+
+        The mergeable statistics behind every lookup are saved next to it (see
+        ``refit``), so later data can be added without reading this data again.
+        """
+        self._fit_chunks(data_path=data_path, chunksize=chunksize, decay=None)
+
+    def refit(self, data_path: str, chunksize: int = 100000, decay: float = 1.0):
+        """
+        Update every ``fit: 1`` step of the recipe with the new data at
+        ``data_path`` only. The statistics saved by the last ``fit_stream`` or
+        ``refit`` (group counts, means and sums of squares, value counts,
+        quantile sketches) are weighed by ``decay``, merged with those of the
+        new data, and the lookups rewritten from the merged statistics. Cost is
+        proportional to the new data, not to the history.
+
+        With ``decay`` 1 refitting batch by batch gives the same lookups as
+        ``fit_stream`` on all batches at once, for a step fitted on raw data.
+        With ``decay`` < 1 older batches weigh less, e.g. 0.9 per daily refit;
+        0 refits on the new data alone. Ranges (uniform binning) cannot be
+        weighed, so any ``decay`` above 0 keeps the old extremes. Steps
+        without saved statistics start from the new data.
+
+        Notes
+        ----------
+        Statistics of a step fitted on the output of another fitted step keep
+        the history as transformed by the upstream lookups of its time; only
+        the new data is transformed by the updated ones.
+
+        Examples
+        ----------
+        >>> data_processor.fit_stream(data_path='data/2024-01-01.csv')
+        >>> data_processor.refit(data_path='data/2024-01-02.csv', decay=0.9)
+        """
+        if not 0 <= decay <= 1:
+            log.error("decay must be between 0 and 1, got %s", decay)
+            raise ValueError("decay must be between 0 and 1, got {}".format(decay))
+        self._fit_chunks(data_path=data_path, chunksize=chunksize, decay=decay)
 
-            if methods[DataProc.IMPUTATION.value] != 0:
-                imputer = Imputer(
-                    method=methods[DataProc.IMPUTATION.value],
-                    data=pd.DataFrame(feature_data),
-                    flag=bool(methods[DataProc.FLAG_IMPUTED.value]),
+    def _fit_chunks(self, data_path: str, chunksize: int, decay: float = None):
+        # decay None fits on data_path alone, else merges the saved statistics.
+        if not os.path.isfile(data_path):
+            raise FileNotFoundError("{} is not a valid file path".format(data_path))
+        fitted_config = deepcopy(self.config)
+        for step in STEPS:
+            accumulators = {
+                name: self._stream_accumulator(step_methods=methods[step])
+                for name, methods in fitted_config.items()
+                if type(methods[step]) is dict
+                and methods[step].get(DataProc.FIT.value, 0) == 1
+            }
+            if len(accumulators) == 0:
+                continue
+            upstream_plans = {
+                name: compile_feature(
+                    name=name,
+                    methods={
+                        **fitted_config[name],
+                        **{later: 0 for later in STEPS[STEPS.index(step) :]},
+                    },
                 )
-                imputer.run()
-                feature_data = imputer.results
+                for name in accumulators
+            }
 
-            if methods[DataProc.OUTLIER_REMOVAL.value] != 0:
-                outlier_remover = OutlierRemover(
-                    method=methods[DataProc.OUTLIER_REMOVAL.value],
-                    data=pd.DataFrame(feature_data),
+            for histogram_pass in [False, True]:
+                updated = accumulators
+                if histogram_pass:
+                    updated = _second_pass_sketches(accumulators)
+                    if len(updated) == 0:
+                        break
+                for data_df in self._read_chunks(data_path, chunksize=chunksize):
+                    for name, accumulator in updated.items():
+                        self._update_accumulator(
+                            step_methods=fitted_config[name][step],
+                            upstream_plan=upstream_plans[name],
+                            data_df=data_df,
+                            accumulator=accumulator,
+                            histogram_pass=histogram_pass,
+                        )
+
+            for name, accumulator in accumulators.items():
+                if accumulator is not None:
+                    if decay is not None:
+                        accumulator = self._merge_fit_state(
+                            step_methods=fitted_config[name][step],
+                            name=name,
+                            accumulator=accumulator,
+                            decay=decay,
+                        )
+                    write_fitted_data(
+                        data=accumulator.to_dict(),
+                        data_path=fit_state_path(fitted_config[name][step]),
+                        feature_name=name,
+                        file_type="json",
+                    )
+                self._write_stream_fit(
+                    step=step,
+                    methods=fitted_config[name],
+                    name=name,
+                    accumulator=accumulator,
                 )
-                outlier_remover.run()
-                feature_data = outlier_remover.results
-
-            if methods[DataProc.TRANSFORMATION.value] != 0:
-                transform_df = pd.DataFrame(feature_data)
-                if methods[DataProc.TRANSFORMATION.value][DataProc.GROUPBY.value] != 0:
-                    transform_df[DataProc.GROUPBY.value] = self.data_df[
-                        methods[DataProc.TRANSFORMATION.value][DataProc.GROUPBY.value]
-                    ]
-                if (
-                    methods[DataProc.TRANSFORMATION.value][DataProc.TARGET_FIELD.value]
-                    != 0
-                ):
-                    transform_df[DataProc.TARGET_FIELD.value] = self.data_df[
-                        methods[DataProc.TRANSFORMATION.value][
-                            DataProc.TARGET_FIELD.value
-                        ]
-                    ]
-                transformer = Transformers(
-                    method=methods[DataProc.TRANSFORMATION.value], data=transform_df
+                fitted_config[name][step][DataProc.FIT.value] = 0
+
+    def _read_chunks(self, data_path: str, chunksize: int):
+        with pd.read_csv(
+            data_path, chunksize=chunksize, **self._csv_read_args(data_path)
+        ) as reader:
+            for data_df in reader:
+                data_df = self._categorize(data_df)
+                check_fields_exist(
+                    found_fields=data_df.columns, expected_fields=self.config.keys()
                 )
-                transformer.run()
-                feature_data = transformer.results
-
-            if methods[DataProc.BINNING.value] != 0:
-                binner = Binners(
-                    method=methods[DataProc.BINNING.value],
-                    data=feature_data,
-                    expected_values=expected_values,
+                yield data_df
+
+    def _merge_fit_state(
+        self, step_methods: dict, name: str, accumulator, decay: float
+    ):
+        state_path = fit_state_path(step_methods)
+        if not os.path.isfile(state_path):
+            log.info("No saved statistics at %s, fitting new data only", state_path)
+            return accumulator
+        state = sketch_from_dict(
+            read_fitted_data(data_path=state_path, feature_name=name, file_type="json")
+        )
+        if type(state) is not type(accumulator):
+            log.error(
+                "%s holds %s statistics, method %s of feature %s needs %s",
+                state_path,
+                type(state).__name__,
+                step_methods.get(DataProc.METHOD.value, step_methods["type"]),
+                name,
+                type(accumulator).__name__,
+            )
+            raise ValueError(
+                "{} holds {} statistics, method {} of feature {} needs {}".format(
+                    state_path,
+                    type(state).__name__,
+                    step_methods.get(DataProc.METHOD.value, step_methods["type"]),
+                    name,
+                    type(accumulator).__name__,
                 )
-                binner.run()
-                feature_data = binner.data
-            self.results_lst.append(feature_data)
+            )
+        state.decay(decay)
+        state.merge(accumulator)
+        return state
+
+    def _stream_accumulator(self, step_methods: dict):
+        method = step_methods.get(DataProc.METHOD.value)
+        if method in [DataProc.MEDIAN.value, DataProc.PERCENTILE.value]:
+            return QuantileSketch()
+        if step_methods.get(DataProc.TYPE.value) in FITTED_EDGE_TYPES:
+            return edges_sketch(method=step_methods)
+        if method == DataProc.MODE.value:
+            return ModeCounter()
+        if method in [DataProc.Z_TRANSFORM.value, DataProc.MEAN.value]:
+            return GroupMoments()
+        # Label encoding is fitted from expected values only, no data needed.
+        return None
+
+    def _update_accumulator(
+        self,
+        step_methods: dict,
+        upstream_plan,
+        data_df: pd.DataFrame,
+        accumulator,
+        histogram_pass: bool,
+    ):
+        if accumulator is None:
+            return
+        if step_methods.get(DataProc.METHOD.value) == DataProc.MEAN.value:
+            accumulator.update(
+                groups=data_df[step_methods[DataProc.GROUPBY.value]],
+                values=data_df[step_methods[DataProc.TARGET_FIELD.value]],
+            )
+            return
+
+        # Run the already fitted steps preceding this one in transform mode.
+        values = pd.DataFrame(upstream_plan.transform(data_df=data_df))[
+            upstream_plan.name
+        ]
+
+        if isinstance(accumulator, GroupMoments):
+            accumulator.update(
+                groups=data_df[step_methods[DataProc.GROUPBY.value]], values=values
+            )
+        elif isinstance(accumulator, ModeCounter):
+            accumulator.update(values.dropna())
+        elif isinstance(accumulator, MinMax):
+            accumulator.update(values)
+        elif histogram_pass:
+            accumulator.update_histogram(values)
+        else:
+            accumulator.update(values)
+
+    def _write_stream_fit(self, step: str, methods: dict, name: str, accumulator):
+        step_methods = methods[step]
+        if accumulator is None:
+            binner = Binners(
+                method=step_methods,
+                data=pd.DataFrame({name: []}),
+                expected_values=expected_values_of(methods=methods),
+            )
+            binner.run()
+            return
+
+        file_type = "json"
+        if step_methods.get(DataProc.TYPE.value) in FITTED_EDGE_TYPES:
+            fitted = {
+                DataProc.EDGES.value: fit_edges(method=step_methods, sketch=accumulator)
+            }
+        elif step_methods[DataProc.METHOD.value] == DataProc.MEDIAN.value:
+            fitted = {DataProc.MEDIAN.value: accumulator.quantile(0.5)}
+        elif step_methods[DataProc.METHOD.value] == DataProc.MODE.value:
+            fitted = {DataProc.MODE.value: accumulator.mode()}
+        elif step_methods[DataProc.METHOD.value] == DataProc.PERCENTILE.value:
+            fitted = {
+                DataProc.LOWER_PCT.value: accumulator.quantile(
+                    step_methods[DataProc.MIN.value]
+                ),
+                DataProc.UPPER_PCT.value: accumulator.quantile(
+                    step_methods[DataProc.MAX.value]
+                ),
+            }
+        elif step_methods[DataProc.METHOD.value] == DataProc.Z_TRANSFORM.value:
+            fitted = pd.DataFrame(
+                {
+                    DataProc.GROUPBY.value: accumulator.moments.index,
+                    "mean": accumulator.mean().values,
+                    "std": accumulator.std().values,
+                }
+            )
+            file_type = "csv"
+        else:
+            counts = accumulator.moments["count"]
+            fitted = field_mean_lookup(
+                groups=accumulator.moments.index,
+                sums=(counts * accumulator.mean()).values,
+                counts=counts.values,
+                method=step_methods,
+            )
+        write_fitted_data(
+            data=fitted,
+            data_path=step_methods[DataProc.PATH.value],
+            feature_name=name,
+            file_type=file_type,
+        )
+
+
+def _second_pass_sketches(accumulators: dict) -> dict:
+    # Only quantile sketches past max_distinct read the data again; updating
+    # the others would count every row twice.
+    return {
+        name: accumulator
+        for name, accumulator in accumulators.items()
+        if isinstance(accumulator, QuantileSketch) and accumulator.needs_second_pass
+    }
+
 
-        return pd.concat(self.results_lst, axis=1)
+def _transform_shared_file(task: tuple) -> FileResult:
+    return _SHARED["processor"]._transform_file(*task)
@@ -24,8 +24,19 @@ class DataProc(Enum):
     IMPUTATION_FLAG_SUFFIX = "IMPUTATION_FLAG"
     ASCENDING = "ascending"
     LABEL_ENCODING = "label_encoding"
+    QUANTILE = "quantile"
+    UNIFORM = "uniform"
+    KMEANS = "kmeans"
+    N_BINS = "n_bins"
+    EDGES = "edges"
     FIT = "fit"
     FIELD_MEAN_TRANSFORMER = "field_mean_transformer"
+    SMOOTHING = "smoothing"
+    MIN_COUNT = "min_count"
+    PRIOR = "prior"
+    FOLDS = "folds"
+    SEED = "seed"
+    N_JOBS = "n_jobs"
     PATH = "path"
     LOWER_PCT = "lower_pct"
     UPPER_PCT = "upper_pct"
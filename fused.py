@@ -0,0 +1,194 @@
+import numbers
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from binners import BinEdges
+from checks import ExpectedValues, check_expected_values, check_nans
+from enums import DataProc
+from transformers import GroupStatistics
+
+"""
+Numeric features lowered from their chain of recipe steps to one kernel over
+a float64 array: the column is copied once into the output, every step is
+applied to it in place with ufunc ``out=``, and the checks of the steps are
+folded into the missing value mask the kernel computes anyway.
+"""
+
+
+# Rows range checked at a time, so the temporaries of the check stay in cache.
+BLOCK_SIZE = 1 << 16
+
+
+class NumericKernel(NamedTuple):
+    """
+    Transform-only recipe of a numeric feature as in place array operations,
+    giving the same results and raising the same errors as its steps.
+
+    Parameters
+    ----------
+    name: str
+        Feature name
+    expected_values: ExpectedValues
+        Expected values the input is checked against
+    output_dtype: np.dtype or pd.CategoricalDtype
+        Dtype of the output, categorical when binned
+    fill_value: float
+        Imputed value, None without imputation
+    check_fill: bool
+        Whether fill_value is validated, as by aggregate imputation
+    flag_column: str
+        Name of the imputation flag column, None when not flagged
+    clip: tuple
+        Lower and upper percentile of outlier removal, None without
+    groupby: str
+        Group field of a z transform, None without
+    group_statistics: GroupStatistics
+        Per group mean and std of a z transform
+    bins: BinEdges
+        Compiled bin edges, None without binning
+    """
+
+    name: str
+    expected_values: ExpectedValues
+    output_dtype: object
+    fill_value: float = None
+    check_fill: bool = False
+    flag_column: str = None
+    clip: tuple = None
+    groupby: str = None
+    group_statistics: GroupStatistics = None
+    bins: BinEdges = None
+
+    def __call__(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        values = data_df[self.name]
+        x = values.to_numpy(dtype="float64", na_value=np.nan, copy=True)
+        missing = np.isnan(x)
+        self._check(values=values, x=x, missing=missing, operation="READ IN")
+        has_missing = bool(missing.any())
+
+        results = {}
+        if self.fill_value is not None:
+            if self.flag_column is not None:
+                results[self.flag_column] = missing.view("int8")
+            if has_missing:
+                np.copyto(x, self.fill_value, where=missing)
+                if self.check_fill:
+                    self._check(values=None, x=x, missing=None, operation="Imputer")
+                has_missing = bool(np.isnan(self.fill_value))
+
+        if self.clip is not None:
+            np.clip(x, self.clip[0], self.clip[1], out=x)
+            if has_missing:
+                check_nans(
+                    data=pd.Series(x), field_name=self.name, operation="Outlier Remover"
+                )
+
+        if self.group_statistics is not None:
+            codes = self.group_statistics.codes(data_df[self.groupby])
+            scratch = np.empty_like(x)
+            np.take(self.group_statistics.statistics["mean"], codes, out=scratch)
+            np.subtract(x, scratch, out=x)
+            np.take(self.group_statistics.statistics["std"], codes, out=scratch)
+            np.divide(x, scratch, out=x)
+
+        if self.bins is not None:
+            column = pd.Categorical.from_codes(
+                self.bins.codes(x), dtype=self.output_dtype
+            )
+        else:
+            column = x
+        return pd.DataFrame(
+            {self.name: column, **results}, index=data_df.index, copy=False
+        )
+
+    def _check(self, values, x: np.ndarray, missing: np.ndarray, operation: str):
+        expected_values = self.expected_values
+        if missing is None:
+            # Only the fill value is new, the rest passed the READ IN check.
+            unexpected = len(expected_values.unexpected([self.fill_value])) > 0
+        elif expected_values.is_range:
+            unexpected = any(
+                _out_of_range(
+                    x=x[start : start + BLOCK_SIZE],
+                    missing=missing[start : start + BLOCK_SIZE],
+                    low=expected_values.min,
+                    high=expected_values.max,
+                )
+                for start in range(0, len(x), BLOCK_SIZE)
+            )
+        else:
+            unexpected = len(expected_values.unexpected(x)) > 0
+        if unexpected:
+            # Raised by the regular check, so errors and logs are the same.
+            check_expected_values(
+                field_values=pd.Series(x) if values is None else values,
+                expected_values=expected_values,
+                field_name=self.name,
+                operation=operation,
+            )
+
+
+def _out_of_range(x: np.ndarray, missing: np.ndarray, low: int, high: int) -> bool:
+    with np.errstate(invalid="ignore"):
+        return bool((~missing & ((x < low) | (x > high) | (np.fmod(x, 1) != 0))).any())
+
+
+def compile_numeric_kernel(feature_plan) -> NumericKernel:
+    """
+    Kernel of a compiled feature, or None if any of its steps cannot be fused:
+    fused are numeric features whose steps are all in transform mode and are
+    an imputation by a number, percentile outlier removal, a z transform and
+    binning by a list of edges.
+    """
+    methods = feature_plan.methods
+    if methods[DataProc.TYPE.value] not in ["discrete", "continuous"]:
+        return None
+    kernel = {}
+
+    imputation = methods[DataProc.IMPUTATION.value]
+    if imputation != 0:
+        if imputation.get(DataProc.FIT.value, 0) != 0:
+            return None
+        fill_value = feature_plan.fill_value()
+        if not isinstance(fill_value, numbers.Number) or isinstance(fill_value, bool):
+            return None
+        kernel.update(
+            fill_value=float(fill_value),
+            check_fill=imputation[DataProc.TYPE.value] == DataProc.AGGREGATE.value,
+            flag_column=feature_plan.flag_column,
+        )
+
+    outlier_removal = methods[DataProc.OUTLIER_REMOVAL.value]
+    if outlier_removal != 0:
+        if outlier_removal.get(DataProc.FIT.value, 0) != 0:
+            return None
+        fitted_values = feature_plan.fitted_values[DataProc.OUTLIER_REMOVAL.value]
+        kernel["clip"] = (
+            fitted_values[DataProc.LOWER_PCT.value],
+            fitted_values[DataProc.UPPER_PCT.value],
+        )
+
+    transformation = methods[DataProc.TRANSFORMATION.value]
+    if transformation != 0:
+        if (
+            transformation.get(DataProc.FIT.value, 0) != 0
+            or transformation[DataProc.METHOD.value] != DataProc.Z_TRANSFORM.value
+        ):
+            return None
+        kernel.update(
+            groupby=transformation[DataProc.GROUPBY.value],
+            group_statistics=feature_plan.fitted_values[DataProc.TRANSFORMATION.value],
+        )
+
+    binning = methods[DataProc.BINNING.value]
+    if binning != 0:
+        if type(binning) is not list:
+            return None
+        kernel["bins"] = feature_plan.fitted_values[DataProc.BINNING.value]
+
+    return NumericKernel(
+        name=feature_plan.name,
+        expected_values=feature_plan.expected_values,
+        output_dtype=feature_plan.output_dtype(),
+        **kernel,
+    )
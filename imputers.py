@@ -1,6 +1,6 @@
 import pandas as pd
 from enums import DataProc
-from checks import check_expected_values
+from checks import ExpectedValues, check_expected_values
 from read_write import read_fitted_data, write_fitted_data
 from logger import create_logger
 import numpy as np
@@ -18,6 +18,15 @@ class Imputer(object):
         Data to transform
     flag: bool
         If True, creates flag field for imputed observations
+    expected_values: ExpectedValues or List
+        Expected values of the feature or None
+    fitted_values: dict
+        Fitted lookup loaded up front, read from method path when None
+
+    Notes
+    ----------
+    Aggregate imputations are validated against expected values when given,
+    else against the values observed in data.
 
     Examples
      ----------
@@ -27,30 +36,29 @@ class Imputer(object):
      >>> my_imputer.run()
     """
 
-    def __init__(self, method: dict, data: pd.DataFrame, flag: bool):
+    def __init__(
+        self,
+        method: dict,
+        data: pd.DataFrame,
+        flag: bool,
+        expected_values: ExpectedValues or list = None,
+        fitted_values: dict = None,
+    ):
         self.method = method
         self.data = data
         self.flag = flag
+        self.expected_values = expected_values
+        self.fitted_values = fitted_values
         self.feature_name = data.columns[0]
         self.results = pd.DataFrame()
         self.log = create_logger(name="Imputer")
 
     def run(self):
         self.log.info(
-            "Running {} impute for feature {}...".format(
-                self.method[DataProc.METHOD.value], self.feature_name
-            )
+            "Running %s impute for feature %s...",
+            self.method[DataProc.METHOD.value],
+            self.feature_name,
         )
-        if self.flag:
-            self.data[
-                "{}_{}".format(self.feature_name, DataProc.IMPUTATION_FLAG_SUFFIX.value)
-            ] = 0
-            self.data.loc[
-                self.data[self.feature_name].isna(),
-                "{}_{}".format(
-                    self.feature_name, DataProc.IMPUTATION_FLAG_SUFFIX.value
-                ),
-            ] = 1
         if self.method[DataProc.TYPE.value] == DataProc.REPLACE.value:
             self.replace_imputer()
         if self.method[DataProc.TYPE.value] == DataProc.AGGREGATE.value:
@@ -59,80 +67,84 @@ class Imputer(object):
                 self.fit_aggregate_imputer()
                 write_fitted_data(
                     data=self.imputed_values,
-                    data_path=DataProc.PATH.value,
+                    data_path=self.method[DataProc.PATH.value],
                     feature_name=self.feature_name,
                     file_type="json",
                 )
             if self.method[DataProc.FIT.value] == 0:
-                self.imputed_values = read_fitted_data(
-                    data_path=DataProc.PATH.value,
-                    feature_name=self.feature_name,
-                    file_type="json",
-                )
+                self.imputed_values = self.fitted_values
+                if self.imputed_values is None:
+                    self.imputed_values = read_fitted_data(
+                        data_path=self.method[DataProc.PATH.value],
+                        feature_name=self.feature_name,
+                        file_type="json",
+                    )
                 self.transform_aggregate_imputer()
             check_expected_values(
-                field_values=self.results[self.feature_name].unique(),
-                expected_values=self.data[self.feature_name],
+                field_values=self.results[self.feature_name],
+                expected_values=(
+                    self.expected_values
+                    if self.expected_values is not None
+                    else self.data[self.feature_name].unique()
+                ),
                 field_name=self.feature_name,
                 operation="Imputer",
             )
+        if self.flag:
+            self.results[
+                "{}_{}".format(self.feature_name, DataProc.IMPUTATION_FLAG_SUFFIX.value)
+            ] = (self.data[self.feature_name].isna().values.astype("int8"))
         self.log.info(
-            "{} impute for feature {} complete...".format(
-                self.method[DataProc.METHOD.value], self.feature_name
-            )
+            "%s impute for feature %s complete...",
+            self.method[DataProc.METHOD.value],
+            self.feature_name,
         )
 
+    def fill(self, value) -> pd.DataFrame:
+        values = self.data[self.feature_name]
+        # A categorical can only be filled with one of its categories.
+        if (
+            isinstance(values.dtype, pd.CategoricalDtype)
+            and value not in values.cat.categories
+        ):
+            values = values.cat.add_categories([value])
+        return values.fillna(value=value).to_frame(name=self.feature_name)
+
     def replace_imputer(self):
-        self.log.info(
-            "Running replace imputer for feature {}...".format(self.feature_name)
-        )
-        self.results[self.feature_name] = self.data[self.feature_name].fillna(
-            value=self.method[DataProc.METHOD.value]
-        )
+        self.log.info("Running replace imputer for feature %s...", self.feature_name)
+        self.results = self.fill(value=self.method[DataProc.METHOD.value])
 
     def fit_aggregate_imputer(self):
         self.log.info(
-            "Running fit transform for aggregate imputer for feature {}...".format(
-                self.feature_name
-            )
+            "Running fit transform for aggregate imputer for feature %s...",
+            self.feature_name,
         )
         if self.method[DataProc.METHOD.value] == DataProc.MEDIAN.value:
             self.imputed_values[DataProc.MEDIAN.value] = self.data[
                 self.feature_name
             ].median()
-            self.results[self.feature_name] = self.data[self.feature_name].fillna(
-                value=self.imputed_values[DataProc.MEDIAN.value]
-            )
+            self.results = self.fill(value=self.imputed_values[DataProc.MEDIAN.value])
 
         elif self.method[DataProc.METHOD.value] == DataProc.MODE.value:
             self.imputed_values[DataProc.MODE.value] = (
                 self.data[self.feature_name].mode().values[0]
             )
-            self.results[self.feature_name] = self.data[self.feature_name].fillna(
-                value=self.imputed_values[DataProc.MODE.value]
-            )
+            self.results = self.fill(value=self.imputed_values[DataProc.MODE.value])
         self.log.info(
-            "Fit and transform for aggregate imputer for feature {} complete...".format(
-                self.feature_name
-            )
+            "Fit and transform for aggregate imputer for feature %s complete...",
+            self.feature_name,
         )
 
     def transform_aggregate_imputer(self):
         self.log.info(
-            "Running transform for aggregate imputer for feature {}...".format(
-                self.feature_name
-            )
+            "Running transform for aggregate imputer for feature %s...",
+            self.feature_name,
         )
         if self.method[DataProc.METHOD.value] == DataProc.MEDIAN.value:
-            self.results[self.feature_name] = self.data[self.feature_name].fillna(
-                value=self.imputed_values[DataProc.MEDIAN.value]
-            )
+            self.results = self.fill(value=self.imputed_values[DataProc.MEDIAN.value])
         elif self.method[DataProc.METHOD.value] == DataProc.MODE.value:
-            self.results[self.feature_name] = self.data[self.feature_name].fillna(
-                value=self.imputed_values[DataProc.MODE.value]
-            )
+            self.results = self.fill(value=self.imputed_values[DataProc.MODE.value])
         self.log.info(
-            "Transform for aggregate imputer for feature {} complete...".format(
-                self.feature_name
-            )
+            "Transform for aggregate imputer for feature %s complete...",
+            self.feature_name,
         )
@@ -1,18 +1,107 @@
+import atexit
 import logging
+import logging.handlers
+import os
+import queue
 
 logger = logging.getLogger("test")
 logger.setLevel(level=logging.INFO)
 
+LOG_FORMAT = logging.Formatter(
+    fmt="%(levelname)s %(asctime)s (%(relativeCreated)d) \t %(pathname)s %(funcName)s L%(lineno)s - %(message)s",
+    datefmt="%Y-%m-%d %H:%M:%S",
+)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    Queues records as they are, leaving the message and traceback to be
+    formatted by the file handlers on the listener thread. Records stay in
+    this process, so they need not be made picklable first.
+    """
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+# Records are put on a queue by the calling thread and formatted and written
+# to the log files by a single background listener, so the hot path neither
+# formats messages nor blocks on disk.
+_log_queue = queue.SimpleQueue()
+_listener = logging.handlers.QueueListener(_log_queue, respect_handler_level=True)
+_listener_started = False
+_queue_handler = _DeferredQueueHandler(_log_queue)
+_file_handlers = {}
+
 
 def create_logger(name: str):
-    log_format = logging.Formatter(
-        fmt=f"%(levelname)s %(asctime)s (%(relativeCreated)d) \t %(pathname)s %(funcName)s L%(lineno)s - %(message)s",
-        datefmt="%Y-%m-%d %H:%M:%S",
+    """
+    Logger of the named component, writing to logs/<name>.log.
+
+    Idempotent: the file handler of a name is created once however often the
+    logger is requested, e.g. by every Imputer instance.
+    """
+    named_logger = logger.getChild(name)
+    if name not in _file_handlers:
+        os.makedirs("logs", exist_ok=True)
+        log_file = logging.FileHandler(filename="logs/{}.log".format(name))
+        log_file.setFormatter(LOG_FORMAT)
+        log_file.setLevel(level=logging.INFO)
+        log_file.addFilter(logging.Filter(named_logger.name))
+        _file_handlers[name] = log_file
+        _listener.handlers = tuple(_file_handlers.values())
+        named_logger.addHandler(_queue_handler)
+        _start_listener()
+    return named_logger
+
+
+def _start_listener():
+    global _listener_started
+    if not _listener_started:
+        _listener.start()
+        _listener_started = True
+
+
+def _stop_listener():
+    global _listener_started
+    if _listener_started:
+        _listener.stop()
+        _listener_started = False
+
+
+def set_quiet(quiet: bool = True):
+    """
+    Quiet mode only logs warnings and errors, so the per step INFO messages of
+    the transform hot path are skipped before their message is formatted.
+    """
+    logger.setLevel(level=logging.WARNING if quiet else logging.INFO)
+
+
+def flush_logs():
+    """
+    Block until every queued record is written to its log file.
+    """
+    if _listener_started:
+        _stop_listener()
+        _start_listener()
+
+
+def _restart_listener_in_child():
+    # The listener thread does not survive fork, give the child its own
+    # listener and queue.
+    global _log_queue, _listener, _listener_started
+    _log_queue = queue.SimpleQueue()
+    _queue_handler.queue = _log_queue
+    _listener = logging.handlers.QueueListener(
+        _log_queue, *_file_handlers.values(), respect_handler_level=True
     )
-    log_file = logging.FileHandler(filename="logs/{}.log".format(name))
-    log_file.setFormatter(log_format)
-    log_file.setLevel(level=logging.INFO)
+    _listener_started = False
+    if _file_handlers:
+        _start_listener()
+
 
-    logger.addHandler(log_file)
+os.register_at_fork(after_in_child=_restart_listener_in_child)
+atexit.register(_stop_listener)
 
-    return logger
+if os.environ.get("LOG_QUIET", "0") == "1":
+    set_quiet()
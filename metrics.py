@@ -0,0 +1,146 @@
+import json
+import threading
+import time
+import tracemalloc
+import pandas as pd
+from read_write import lookup_cache
+
+"""
+Per (feature, stage) instrumentation of a transform.
+"""
+
+FIELDS = ["seconds", "rows", "output_bytes", "cache_hits", "calls"]
+TRACED_FIELDS = ["allocated_bytes"]
+
+PROMETHEUS_HELP = {
+    "seconds": "Wall time spent in the stage",
+    "rows": "Rows processed by the stage",
+    "output_bytes": "Size of the output of the stage",
+    "allocated_bytes": "Peak bytes allocated by the stage",
+    "cache_hits": "Fitted lookups and expected values served from memory",
+    "calls": "Number of times the stage ran",
+}
+
+
+class TransformMetrics(object):
+    """
+    Records wall time, rows, output size and lookup cache hits of every
+    (feature, stage) run by a transform, where stage is ``read`` or a recipe
+    step.
+
+    Parameters
+    ----------
+    trace_memory: bool
+        Also record ``allocated_bytes``, the tracemalloc peak of the stage.
+        Slows the transform down several times.
+    callbacks: list
+        Callables called with every record as it is made
+
+    Examples
+    ----------
+    >>> metrics = TransformMetrics()
+    >>> results = data_processor.transform(metrics=metrics)
+    >>> metrics.to_dict()['Feature_4']['imputation']
+    {'seconds': 0.0011, 'rows': 1000, 'output_bytes': 8000, 'cache_hits': 1, 'calls': 1}
+    >>> print(metrics.to_prometheus())
+
+    Notes
+    ----------
+    Records of repeated transforms, e.g. the chunks of ``transform_stream``,
+    add up. Cache hits count the lookups a stage uses from memory: those
+    compiled into the plan, one per use, plus the change of the shared lookup
+    cache counters over the stage, approximate when features run on threads.
+    Peak memory is likewise process wide under tracing. Transforms run without
+    metrics skip all of this behind a single ``None`` check per stage.
+    """
+
+    def __init__(self, trace_memory: bool = False, callbacks: list = None):
+        self.trace_memory = trace_memory
+        self.fields = FIELDS[:-1] + (TRACED_FIELDS if trace_memory else []) + ["calls"]
+        self.callbacks = [] if callbacks is None else list(callbacks)
+        self.records = []
+        self._lock = threading.Lock()
+
+    def call(
+        self, feature: str, stage: str, fn, compiled_lookups: int = 0, **kwargs
+    ) -> pd.DataFrame:
+        """
+        Run fn(**kwargs) as the stage of feature and record it, counting
+        compiled_lookups held in memory by the caller as cache hits.
+        """
+        cache_hits = lookup_cache.hits
+        if self.trace_memory:
+            started_tracing = not tracemalloc.is_tracing()
+            if started_tracing:
+                tracemalloc.start()
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        results = fn(**kwargs)
+        seconds = time.perf_counter() - start
+        record = {
+            "feature": feature,
+            "stage": stage,
+            "seconds": seconds,
+            "rows": len(results),
+            "output_bytes": int(results.memory_usage(index=False).sum()),
+            "cache_hits": compiled_lookups + lookup_cache.hits - cache_hits,
+        }
+        if self.trace_memory:
+            record["allocated_bytes"] = tracemalloc.get_traced_memory()[1]
+            if started_tracing:
+                tracemalloc.stop()
+        self.add(record)
+        return results
+
+    def add(self, record: dict):
+        with self._lock:
+            self.records.append(record)
+        for callback in self.callbacks:
+            callback(record)
+
+    def reset(self):
+        with self._lock:
+            self.records = []
+
+    def to_dict(self) -> dict:
+        """
+        Totals of every stage keyed by feature then stage, in run order.
+        """
+        totals = {}
+        with self._lock:
+            records = list(self.records)
+        for record in records:
+            stage = totals.setdefault(record["feature"], {}).setdefault(
+                record["stage"], dict.fromkeys(self.fields, 0)
+            )
+            for field in self.fields[:-1]:
+                stage[field] += record[field]
+            stage["calls"] += 1
+        return totals
+
+    def to_json(self, indent: int = None) -> str:
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_prometheus(self, prefix: str = "data_processor") -> str:
+        """
+        Totals in the Prometheus text exposition format, one counter per field
+        labelled by feature and stage.
+        """
+        totals = self.to_dict()
+        lines = []
+        for field in self.fields:
+            metric = "{}_stage_{}_total".format(prefix, field)
+            lines.append("# HELP {} {}".format(metric, PROMETHEUS_HELP[field]))
+            lines.append("# TYPE {} counter".format(metric))
+            for feature, stages in totals.items():
+                for stage, values in stages.items():
+                    lines.append(
+                        '{}{{feature="{}",stage="{}"}} {}'.format(
+                            metric, _escape(feature), _escape(stage), values[field]
+                        )
+                    )
+        return "\n".join(lines) + "\n"
+
+
+def _escape(label: str) -> str:
+    return str(label).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
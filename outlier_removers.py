@@ -15,6 +15,8 @@ class OutlierRemover(object):
         Outlier removal methods and attributes
     data: pd.DataFrame
         Data to perform outlier removal on
+    fitted_values: dict
+        Fitted lookup loaded up front, read from method path when None
 
      Examples
      ----------
@@ -24,18 +26,19 @@ class OutlierRemover(object):
      >>> outlier_remover.run()
     """
 
-    def __init__(self, method: dict, data: pd.DataFrame):
+    def __init__(self, method: dict, data: pd.DataFrame, fitted_values: dict = None):
         self.method = method
         self.data = data
+        self.fitted_values = fitted_values
         self.feature_name = data.columns[0]
         self.results = pd.DataFrame()
         self.log = create_logger(name="Outlier_remover")
 
     def run(self):
         self.log.info(
-            "Running {} outlier removal for feature {}...".format(
-                self.method[DataProc.METHOD.value], self.feature_name
-            )
+            "Running %s outlier removal for feature %s...",
+            self.method[DataProc.METHOD.value],
+            self.feature_name,
         )
         if self.method[DataProc.METHOD.value] == DataProc.PERCENTILE.value:
             if self.method[DataProc.FIT.value] == 1:
@@ -43,16 +46,18 @@ class OutlierRemover(object):
                 self.percentile_remover_fit()
                 write_fitted_data(
                     data=self.imputed_values,
-                    data_path=DataProc.PATH.value,
+                    data_path=self.method[DataProc.PATH.value],
                     feature_name=self.feature_name,
                     file_type="json",
                 )
             if self.method[DataProc.FIT.value] == 0:
-                self.imputed_values = read_fitted_data(
-                    data_path=DataProc.PATH.value,
-                    feature_name=self.feature_name,
-                    file_type="json",
-                )
+                self.imputed_values = self.fitted_values
+                if self.imputed_values is None:
+                    self.imputed_values = read_fitted_data(
+                        data_path=self.method[DataProc.PATH.value],
+                        feature_name=self.feature_name,
+                        file_type="json",
+                    )
                 self.percentile_remover_transform()
 
             check_nans(
@@ -66,16 +71,15 @@ class OutlierRemover(object):
                 operation="Outlier Remover",
             )
         self.log.info(
-            "{} outlier removal for feature {} complete...".format(
-                self.method[DataProc.METHOD.value], self.feature_name
-            )
+            "%s outlier removal for feature %s complete...",
+            self.method[DataProc.METHOD.value],
+            self.feature_name,
         )
 
     def percentile_remover_fit(self):
         self.log.info(
-            "Running percentile remover fit transform for feature {}...".format(
-                self.feature_name
-            )
+            "Running percentile remover fit transform for feature %s...",
+            self.feature_name,
         )
         self.imputed_values[DataProc.LOWER_PCT.value] = self.data[
             self.feature_name
@@ -83,28 +87,31 @@ class OutlierRemover(object):
         self.imputed_values[DataProc.UPPER_PCT.value] = self.data[
             self.feature_name
         ].quantile(self.method[DataProc.MAX.value])
-        self.results[self.feature_name] = self.data[self.feature_name].clip(
-            lower=self.imputed_values[DataProc.LOWER_PCT.value],
-            upper=self.imputed_values[DataProc.UPPER_PCT.value],
+        self.results = (
+            self.data[self.feature_name]
+            .clip(
+                lower=self.imputed_values[DataProc.LOWER_PCT.value],
+                upper=self.imputed_values[DataProc.UPPER_PCT.value],
+            )
+            .to_frame(name=self.feature_name)
         )
         self.log.info(
-            "Percentile remover fit transform for feature {} complete...".format(
-                self.feature_name
-            )
+            "Percentile remover fit transform for feature %s complete...",
+            self.feature_name,
         )
 
     def percentile_remover_transform(self):
         self.log.info(
-            "Running percentile remover transform for feature {}...".format(
-                self.feature_name
-            )
+            "Running percentile remover transform for feature %s...", self.feature_name
         )
-        self.results[self.feature_name] = self.data[self.feature_name].clip(
-            lower=self.imputed_values[DataProc.LOWER_PCT.value],
-            upper=self.imputed_values[DataProc.UPPER_PCT.value],
+        self.results = (
+            self.data[self.feature_name]
+            .clip(
+                lower=self.imputed_values[DataProc.LOWER_PCT.value],
+                upper=self.imputed_values[DataProc.UPPER_PCT.value],
+            )
+            .to_frame(name=self.feature_name)
         )
         self.log.info(
-            "Percentile remover transform for feature {} complete...".format(
-                self.feature_name
-            )
+            "Percentile remover transform for feature %s complete...", self.feature_name
         )
@@ -0,0 +1,135 @@
+import numpy as np
+import pandas as pd
+from typing import NamedTuple
+from logger import create_logger
+
+"""
+Transform output allocated once from the recipe and filled by position, in
+place of per feature frames joined on their index by pd.concat.
+"""
+
+log = create_logger("output")
+
+FLOAT = np.dtype("float64")
+
+
+class OutputSchema(NamedTuple):
+    """
+    Names and dtypes of every output column, in output order. Dtypes are
+    float64, int8 (imputation flags), a CategoricalDtype or object.
+    """
+
+    columns: tuple
+
+    def names(self) -> list:
+        return [name for name, _ in self.columns]
+
+    def allocate(self, n_rows: int) -> "OutputBuffer":
+        return OutputBuffer(schema=self, n_rows=n_rows)
+
+
+class OutputBuffer(object):
+    """
+    Preallocated output of a transform, written column by column by position.
+
+    Parameters
+    ----------
+    schema: OutputSchema
+        Columns of the output
+    n_rows: int
+        Number of rows of the output
+
+    Notes
+    ----------
+    Float columns share one Fortran ordered block, so every column is
+    contiguous and the block becomes the DataFrame without a copy.
+    Categorical columns are held as codes against their schema categories.
+    Writes to distinct columns may run concurrently.
+    """
+
+    def __init__(self, schema: OutputSchema, n_rows: int):
+        self.schema = schema
+        self.n_rows = n_rows
+        self.float_columns = [name for name, dtype in schema.columns if dtype == FLOAT]
+        self.float_block = np.empty(
+            (n_rows, len(self.float_columns)), dtype=FLOAT, order="F"
+        )
+        self.dtypes = dict(schema.columns)
+        self.arrays = {
+            name: self.float_block[:, column_idx]
+            for column_idx, name in enumerate(self.float_columns)
+        }
+        for name, dtype in schema.columns:
+            if isinstance(dtype, pd.CategoricalDtype):
+                self.arrays[name] = np.empty(
+                    n_rows, dtype=codes_dtype(len(dtype.categories))
+                )
+            elif dtype != FLOAT:
+                self.arrays[name] = np.empty(n_rows, dtype=dtype)
+
+    def write(self, results: pd.DataFrame):
+        if len(results) != self.n_rows:
+            log.error(
+                "Results of %s rows do not fit an output of %s rows",
+                len(results),
+                self.n_rows,
+            )
+            raise ValueError(
+                "Results of {} rows do not fit an output of {} rows".format(
+                    len(results), self.n_rows
+                )
+            )
+        for name in results.columns:
+            values = results[name]
+            dtype = self.dtypes[name]
+            if isinstance(dtype, pd.CategoricalDtype):
+                self.arrays[name][:] = _recode(values=values, dtype=dtype)
+            elif values.dtype == FLOAT:
+                np.copyto(self.arrays[name], values.values)
+            elif dtype == FLOAT:
+                self.arrays[name][:] = values.to_numpy(dtype=FLOAT, na_value=np.nan)
+            else:
+                self.arrays[name][:] = values.to_numpy(dtype=dtype)
+
+    def to_frame(self, index: pd.Index) -> pd.DataFrame:
+        results = pd.DataFrame(
+            self.float_block, index=index, columns=self.float_columns, copy=False
+        )
+        for position, (name, dtype) in enumerate(self.schema.columns):
+            if dtype == FLOAT:
+                continue
+            if isinstance(dtype, pd.CategoricalDtype):
+                values = pd.Categorical.from_codes(self.arrays[name], dtype=dtype)
+            else:
+                values = self.arrays[name]
+            results.insert(position, name, values)
+        return results
+
+
+def codes_dtype(n_categories: int) -> np.dtype:
+    # Smallest integer type pandas itself would use for the codes.
+    for dtype in [np.int8, np.int16, np.int32]:
+        if n_categories < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype(np.int64)
+
+
+def _recode(values: pd.Series, dtype: pd.CategoricalDtype) -> np.ndarray:
+    if not isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype("category")
+    categories = values.cat.categories
+    if categories.equals(dtype.categories):
+        return values.cat.codes.values
+    positions = dtype.categories.get_indexer(categories)
+    if (positions == -1).any():
+        log.error(
+            "%s holds categories %s outside its output schema",
+            values.name,
+            categories[positions == -1].tolist(),
+        )
+        raise ValueError(
+            "{} holds categories {} outside its output schema".format(
+                values.name, categories[positions == -1].tolist()
+            )
+        )
+    return np.append(positions, -1)[values.cat.codes.values]
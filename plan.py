@@ -0,0 +1,455 @@
+import numpy as np
+import pandas as pd
+import os
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import get_context
+from typing import NamedTuple
+from imputers import Imputer
+from outlier_removers import OutlierRemover
+from transformers import GroupStatistics, Transformers
+from binners import FITTED_EDGE_TYPES, BinEdges, Binners
+from categorical import categorize, expected_categories
+from checks import ExpectedValues, check_expected_values
+from read_write import ArtifactStore, read_fitted_data
+from enums import DataProc
+from metrics import TransformMetrics
+from output import OutputBuffer, OutputSchema
+from fused import NumericKernel, compile_numeric_kernel
+from copy import deepcopy
+
+STEPS = [
+    DataProc.IMPUTATION.value,
+    DataProc.OUTLIER_REMOVAL.value,
+    DataProc.TRANSFORMATION.value,
+    DataProc.BINNING.value,
+]
+
+# Plan and data of the running process pool transform, inherited copy-on-write
+# by the forked workers so neither is pickled or copied per task.
+_SHARED = {}
+
+
+class FeaturePlan(NamedTuple):
+    """
+    Compiled recipe of a single feature.
+
+    Parameters
+    ----------
+    name: str
+        Feature name
+    methods: dict
+        Recipe of the feature
+    expected_values: ExpectedValues
+        Expected values of the feature, indexed once from the recipe
+    fitted_values: dict
+        Fitted lookups of every ``fit: 0`` step and the compiled edges of list
+        binning, keyed by step
+    kernel: NumericKernel
+        Fused kernel run in place of the steps on numeric input, or None
+    """
+
+    name: str
+    methods: dict
+    expected_values: ExpectedValues
+    fitted_values: dict
+    kernel: NumericKernel = None
+
+    @property
+    def is_categorical(self) -> bool:
+        return (
+            self.methods[DataProc.TYPE.value] == "categorical"
+            and not self.expected_values.is_range
+        )
+
+    def compiled_lookups(self, stage: str) -> int:
+        """
+        Number of lookup files the stage would read that the plan holds in
+        memory: the expected values file of ``read`` and fitted lookups.
+        """
+        if stage == "read":
+            return int(type(self.methods[DataProc.EXPECTED_VALUES.value]) is str)
+        return int(type(self.methods[stage]) is dict and stage in self.fitted_values)
+
+    def transform(self, data_df: pd.DataFrame, metrics: TransformMetrics = None):
+        if self.kernel is not None and pd.api.types.is_numeric_dtype(
+            data_df[self.name].dtype
+        ):
+            if metrics is None:
+                return self.kernel(data_df=data_df)
+            return metrics.call(
+                feature=self.name,
+                stage="fused",
+                fn=self.kernel,
+                compiled_lookups=sum(
+                    self.compiled_lookups(stage=stage) for stage in ["read"] + STEPS
+                ),
+                data_df=data_df,
+            )
+        if metrics is None:
+            feature_data = self.read(data_df=data_df)
+        else:
+            feature_data = metrics.call(
+                feature=self.name,
+                stage="read",
+                fn=self.read,
+                compiled_lookups=self.compiled_lookups(stage="read"),
+                data_df=data_df,
+            )
+        flags = None
+        for step in STEPS:
+            if self.methods[step] == 0:
+                continue
+            if metrics is None:
+                feature_data = self.run_step(
+                    step=step, feature_data=feature_data, data_df=data_df
+                )
+            else:
+                feature_data = metrics.call(
+                    feature=self.name,
+                    stage=step,
+                    fn=self.run_step,
+                    compiled_lookups=self.compiled_lookups(stage=step),
+                    step=step,
+                    feature_data=feature_data,
+                    data_df=data_df,
+                )
+            if step == DataProc.IMPUTATION.value and self.flag_column is not None:
+                flags = feature_data[self.flag_column]
+        if flags is not None and self.flag_column not in feature_data:
+            feature_data = feature_data.assign(**{self.flag_column: flags})
+        return feature_data
+
+    @property
+    def flag_column(self) -> str:
+        if self.methods[DataProc.IMPUTATION.value] == 0 or not bool(
+            self.methods[DataProc.FLAG_IMPUTED.value]
+        ):
+            return None
+        return "{}_{}".format(self.name, DataProc.IMPUTATION_FLAG_SUFFIX.value)
+
+    def output_columns(self) -> list:
+        """
+        Names and dtypes of the columns transform gives, known from the recipe
+        and fitted lookups before any data is seen.
+        """
+        columns = [(self.name, self.output_dtype())]
+        if self.flag_column is not None:
+            columns.append((self.flag_column, np.dtype("int8")))
+        return columns
+
+    def output_dtype(self):
+        methods = self.methods
+        if type(methods[DataProc.BINNING.value]) is list:
+            return self.fitted_values[DataProc.BINNING.value].dtype
+        if any(
+            methods[step] != 0
+            for step in [
+                DataProc.OUTLIER_REMOVAL.value,
+                DataProc.TRANSFORMATION.value,
+                DataProc.BINNING.value,
+            ]
+        ):
+            return np.dtype("float64")
+        if self.is_categorical:
+            categories = expected_categories(expected_values=self.expected_values)
+            fill_value = self.fill_value()
+            if fill_value is not None and fill_value not in categories:
+                categories = categories.append(pd.Index([fill_value]))
+            return pd.CategoricalDtype(categories=categories)
+        if (
+            methods[DataProc.TYPE.value] in ["discrete", "continuous"]
+            or self.expected_values.is_range
+        ):
+            # Range checked values are numbers, whatever the feature type.
+            return np.dtype("float64")
+        return np.dtype("object")
+
+    def fill_value(self):
+        imputation = self.methods[DataProc.IMPUTATION.value]
+        if imputation == 0:
+            return None
+        if imputation[DataProc.TYPE.value] == DataProc.REPLACE.value:
+            return imputation[DataProc.METHOD.value]
+        fitted_values = self.fitted_values.get(DataProc.IMPUTATION.value)
+        if fitted_values is None:
+            return None
+        return fitted_values[imputation[DataProc.METHOD.value]]
+
+    def read(self, data_df: pd.DataFrame) -> pd.DataFrame:
+        # Stages only read their input and return new frames (fillna, clip,
+        # array takes), never writing in place, so the feature is passed as a
+        # view of data_df without a copy.
+        feature_data = data_df[self.name].to_frame()
+        if self.is_categorical:
+            # Hashed once here; every later stage works on the codes.
+            feature_data[self.name] = categorize(
+                values=feature_data[self.name],
+                categories=expected_categories(expected_values=self.expected_values),
+            )
+        check_expected_values(
+            field_values=feature_data[self.name],
+            expected_values=self.expected_values,
+            field_name=self.name,
+            operation="READ IN",
+        )
+        return feature_data
+
+    def run_step(self, step: str, feature_data: pd.DataFrame, data_df: pd.DataFrame):
+        """
+        Run one step of the recipe on the output of the previous step.
+        """
+        methods = self.methods
+        if step == DataProc.IMPUTATION.value:
+            imputer = Imputer(
+                method=methods[DataProc.IMPUTATION.value],
+                data=feature_data,
+                flag=bool(methods[DataProc.FLAG_IMPUTED.value]),
+                expected_values=self.expected_values,
+                fitted_values=self.fitted_values.get(DataProc.IMPUTATION.value),
+            )
+            imputer.run()
+            return imputer.results
+
+        if step == DataProc.OUTLIER_REMOVAL.value:
+            outlier_remover = OutlierRemover(
+                method=methods[DataProc.OUTLIER_REMOVAL.value],
+                data=feature_data,
+                fitted_values=self.fitted_values.get(DataProc.OUTLIER_REMOVAL.value),
+            )
+            outlier_remover.run()
+            return outlier_remover.results
+
+        if step == DataProc.TRANSFORMATION.value:
+            transform_columns = {self.name: feature_data[self.name]}
+            if methods[DataProc.TRANSFORMATION.value][DataProc.GROUPBY.value] != 0:
+                transform_columns[DataProc.GROUPBY.value] = data_df[
+                    methods[DataProc.TRANSFORMATION.value][DataProc.GROUPBY.value]
+                ]
+            if (
+                methods[DataProc.TRANSFORMATION.value][DataProc.TARGET_FIELD.value] != 0
+                and methods[DataProc.TRANSFORMATION.value][DataProc.FIT.value] == 1
+            ):
+                transform_columns[DataProc.TARGET_FIELD.value] = data_df[
+                    methods[DataProc.TRANSFORMATION.value][DataProc.TARGET_FIELD.value]
+                ]
+            transformer = Transformers(
+                method=methods[DataProc.TRANSFORMATION.value],
+                data=pd.DataFrame(transform_columns, copy=False),
+                fitted_values=self.fitted_values.get(DataProc.TRANSFORMATION.value),
+            )
+            transformer.run()
+            return transformer.results
+
+        binner = Binners(
+            method=methods[DataProc.BINNING.value],
+            data=feature_data,
+            expected_values=self.expected_values,
+            fitted_values=self.fitted_values.get(DataProc.BINNING.value),
+        )
+        binner.run()
+        return binner.results
+
+
+class ExecutionPlan(NamedTuple):
+    """
+    Recipe compiled once, with expected values built and fitted lookups loaded,
+    that can be applied to any number of DataFrames without re-reading files.
+
+    Examples
+    ----------
+    >>> with open('configs/config_test.json') as f:
+    ...     plan = compile_config(config=json.load(f))
+    >>> results = plan.transform(data_df=pd.read_csv('data/data_1000_test.csv', index_col=0))
+
+    Features are independent of each other, so they can run concurrently on
+    ``n_jobs`` threads or forked processes. Results keep the recipe order.
+
+    >>> results = plan.transform(data_df=data_df, n_jobs=8, backend='process')
+
+    Passing a ``TransformMetrics`` records the time, rows, bytes and cache
+    hits of every stage of every feature, on any backend.
+
+    >>> results = plan.transform(data_df=data_df, metrics=TransformMetrics())
+    """
+
+    features: tuple
+
+    def transform(
+        self,
+        data_df: pd.DataFrame,
+        n_jobs: int = 1,
+        backend: str = "thread",
+        metrics: TransformMetrics = None,
+    ) -> pd.DataFrame:
+        if n_jobs == -1:
+            n_jobs = os.cpu_count()
+        n_jobs = min(n_jobs, len(self.features))
+        output = self.output_schema().allocate(n_rows=len(data_df))
+        self._transform_features(
+            data_df=data_df,
+            n_jobs=n_jobs,
+            backend=backend,
+            metrics=metrics,
+            output=output,
+        )
+        return output.to_frame(index=data_df.index)
+
+    def output_schema(self) -> OutputSchema:
+        return OutputSchema(
+            columns=tuple(
+                column for f in self.features for column in f.output_columns()
+            )
+        )
+
+    def _transform_features(
+        self,
+        data_df: pd.DataFrame,
+        n_jobs: int,
+        backend: str,
+        metrics: TransformMetrics,
+        output: OutputBuffer,
+    ):
+        # Each feature's results are written to the output, by position, as
+        # soon as they are done, and freed.
+        if n_jobs <= 1:
+            for f in self.features:
+                output.write(f.transform(data_df=data_df, metrics=metrics))
+        elif backend == "thread":
+            with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+                list(
+                    executor.map(
+                        lambda f: output.write(
+                            f.transform(data_df=data_df, metrics=metrics)
+                        ),
+                        self.features,
+                    )
+                )
+        elif backend == "process":
+            # Workers are forked after data_df is published, so they read the
+            # parent's frame through copy-on-write pages instead of a pickle.
+            _SHARED.update(plan=self, data_df=data_df, metrics=metrics)
+            try:
+                with get_context("fork").Pool(processes=n_jobs) as pool:
+                    worker_results = pool.map(
+                        _transform_shared_feature, range(len(self.features))
+                    )
+            finally:
+                _SHARED.clear()
+            for results, records in worker_results:
+                output.write(results)
+                for record in records:
+                    metrics.add(record)
+        else:
+            raise ValueError(
+                "{} is not a valid backend (Options: {})".format(
+                    backend, ["thread", "process"]
+                )
+            )
+
+
+def _transform_shared_feature(feature_idx: int):
+    # Metrics recorded in a worker are lost with it, so they are returned with
+    # the results and added to the parent's metrics.
+    metrics = None
+    if _SHARED["metrics"] is not None:
+        metrics = TransformMetrics(trace_memory=_SHARED["metrics"].trace_memory)
+    results = (
+        _SHARED["plan"]
+        .features[feature_idx]
+        .transform(data_df=_SHARED["data_df"], metrics=metrics)
+    )
+    return results, [] if metrics is None else metrics.records
+
+
+def expected_values_of(methods: dict) -> ExpectedValues:
+    return ExpectedValues.from_config(methods[DataProc.EXPECTED_VALUES.value])
+
+
+def fitted_file_type(step_methods: dict) -> str:
+    if step_methods.get(DataProc.METHOD.value) == DataProc.Z_TRANSFORM.value:
+        return "csv"
+    return "json"
+
+
+def fitted_values_of(name: str, methods: dict, store: ArtifactStore = None) -> dict:
+    fitted_values = {}
+    for step in STEPS:
+        step_methods = methods[step]
+        if type(step_methods) is list:
+            fitted_values[step] = BinEdges.from_list(step_methods)
+            continue
+        if type(step_methods) is not dict or step_methods.get(DataProc.FIT.value) != 0:
+            continue
+        if store is not None:
+            fitted_values[step] = store.get(feature_name=name, step=step)
+        else:
+            fitted_values[step] = read_fitted_data(
+                data_path=step_methods[DataProc.PATH.value],
+                feature_name=name,
+                file_type=fitted_file_type(step_methods=step_methods),
+            )
+        if step_methods.get(DataProc.METHOD.value) == DataProc.Z_TRANSFORM.value:
+            fitted_values[step] = GroupStatistics.from_frame(fitted_values[step])
+        if step_methods.get(DataProc.METHOD.value) == DataProc.MEAN.value:
+            fitted_values[step] = GroupStatistics.from_field_means(fitted_values[step])
+        if step_methods.get(DataProc.TYPE.value) in FITTED_EDGE_TYPES:
+            fitted_values[step] = BinEdges.from_fitted(fitted_values[step])
+    return fitted_values
+
+
+def collect_artifacts(config: dict, version: str = None) -> ArtifactStore:
+    """
+    Gather the fitted lookup files of every step of a recipe into one store.
+    """
+    store = ArtifactStore(version=version)
+    for name, methods in config.items():
+        for step in STEPS:
+            step_methods = methods[step]
+            if (
+                type(step_methods) is not dict
+                or DataProc.PATH.value not in step_methods
+            ):
+                continue
+            store.put(
+                feature_name=name,
+                step=step,
+                data=read_fitted_data(
+                    data_path=step_methods[DataProc.PATH.value],
+                    feature_name=name,
+                    file_type=fitted_file_type(step_methods=step_methods),
+                ),
+            )
+    return store
+
+
+def compile_feature(
+    name: str, methods: dict, store: ArtifactStore = None, fused: bool = False
+) -> FeaturePlan:
+    feature_plan = FeaturePlan(
+        name=name,
+        methods=deepcopy(methods),
+        expected_values=expected_values_of(methods=methods),
+        fitted_values=fitted_values_of(name=name, methods=methods, store=store),
+    )
+    if fused:
+        feature_plan = feature_plan._replace(
+            kernel=compile_numeric_kernel(feature_plan=feature_plan)
+        )
+    return feature_plan
+
+
+def compile_config(
+    config: dict, store: ArtifactStore = None, fused: bool = False
+) -> ExecutionPlan:
+    """
+    Compile a recipe. Fitted lookups come from ``store`` when given, else
+    from the path of each step. With ``fused`` the steps of every numeric
+    feature that allows it run as a single in place kernel (see
+    ``fused.NumericKernel``).
+    """
+    return ExecutionPlan(
+        features=tuple(
+            compile_feature(name=name, methods=methods, store=store, fused=fused)
+            for name, methods in config.items()
+        )
+    )
@@ -1,6 +1,13 @@
 import pandas as pd
+import numpy as np
 from logger import create_logger
+from collections import OrderedDict
+import hashlib
 import json
+import mmap
+import os
+import struct
+import threading
 
 log = create_logger("rw")
 
@@ -8,27 +15,315 @@ log = create_logger("rw")
 def write_fitted_data(
     data: pd.DataFrame or dict, data_path: str, feature_name: str, file_type: str
 ) -> None:
-    log.info("Saving fit data for feature {}...".format(feature_name))
+    log.info("Saving fit data for feature %s...", feature_name)
     if file_type == "json":
         with open(data_path, "w") as f:
             json.dump(data, f)
 
     if file_type == "csv":
         data.to_csv(data_path)
-    log.info("Saving fit data for feature {} complete...".format(feature_name))
+    log.info("Saving fit data for feature %s complete...", feature_name)
+
+
+def fit_state_path(method: dict) -> str:
+    """
+    Path of the mergeable statistics a step's lookup is fitted from, saved
+    next to the lookup, e.g. lookups/Feature_4_imputation.state.json.
+    """
+    return os.path.splitext(method["path"])[0] + ".state.json"
+
+
+class LookupCache(object):
+    """
+    Bounded, thread-safe LRU cache of parsed lookup files.
+
+    Entries are keyed by path and validated against the file's mtime and size
+    on every access, so a refitted lookup is re-read while an unchanged one
+    costs a single ``os.stat``. Cached objects are shared between callers and
+    must be treated as read-only.
+
+    Parameters
+    ----------
+    max_size: int
+        Number of parsed files kept
+    """
+
+    def __init__(self, max_size: int = 256):
+        self.max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, data_path: str, file_type: str, loader):
+        stat = os.stat(data_path)
+        key = (os.path.abspath(data_path), file_type)
+        signature = (stat.st_mtime_ns, stat.st_size)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] == signature:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+        data = loader(data_path)
+        with self._lock:
+            self._entries[key] = (signature, data)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return data
+
+    def info(self) -> dict:
+        with self._lock:
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._entries),
+                "max_size": self.max_size,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+lookup_cache = LookupCache()
+
+
+def _load_json(data_path: str) -> dict:
+    with open(data_path) as f:
+        return json.load(f)
+
+
+def _load_csv(data_path: str) -> pd.DataFrame:
+    return pd.read_csv(data_path, index_col=0)
+
+
+def _load_expected_values(data_path: str) -> list:
+    return list(pd.read_csv(data_path, header=None)[0])
 
 
 def read_fitted_data(
     data_path: str, feature_name: str, file_type: str
 ) -> pd.DataFrame or dict:
-    log.info("Loading fit data for feature {}...".format(feature_name))
+    log.info("Loading fit data for feature %s...", feature_name)
     data = None
     if file_type == "json":
-        with open(data_path) as f:
-            data = json.load(f)
+        data = lookup_cache.get(data_path, file_type=file_type, loader=_load_json)
 
     elif file_type == "csv":
-        data = pd.read_csv(data_path, index_col=0)
+        data = lookup_cache.get(data_path, file_type=file_type, loader=_load_csv)
 
-    log.info("Loading fit data for feature {} complete...".format(feature_name))
+    log.info("Loading fit data for feature %s complete...", feature_name)
     return data
+
+
+def read_expected_values(data_path: str) -> list:
+    return lookup_cache.get(
+        data_path, file_type="expected_values", loader=_load_expected_values
+    )
+
+
+class ArtifactStore(object):
+    """
+    Fitted lookups of every (feature, step) of a recipe in a single versioned
+    binary file, loaded with one memory map instead of a file open and parse
+    per step.
+
+    Parameters
+    ----------
+    entries: dict
+        Fitted lookups keyed by (feature name, step)
+    version: str
+        Label of the fitted artifacts, e.g. the training run
+
+    Notes
+    ----------
+    Layout: magic, manifest length, JSON manifest, then every array 64 byte
+    aligned. The manifest maps each entry to its arrays' dtype, shape and
+    offset and holds a sha256 checksum of the array section, verified on
+    load. Arrays are read-only views on the memory map.
+
+    Examples
+    ----------
+    >>> store = ArtifactStore()
+    >>> store.put(feature_name="Feature_4", step="imputation", data={"median": 5.0})
+    >>> store.save(data_path="lookups/artifacts.bin")
+    >>> ArtifactStore.load(data_path="lookups/artifacts.bin").get(feature_name="Feature_4", step="imputation")
+    {'median': 5.0}
+    """
+
+    MAGIC = b"CPFARTS\x00"
+    FORMAT_VERSION = 1
+    ALIGNMENT = 64
+
+    def __init__(self, entries: dict = None, version: str = None):
+        self.entries = {} if entries is None else dict(entries)
+        self.version = version
+
+    def put(self, feature_name: str, step: str, data: pd.DataFrame or dict):
+        self.entries[(feature_name, step)] = data
+
+    def get(self, feature_name: str, step: str) -> pd.DataFrame or dict:
+        return self.entries[(feature_name, step)]
+
+    def __contains__(self, key: tuple) -> bool:
+        return key in self.entries
+
+    def save(self, data_path: str):
+        log.info("Saving %s fitted artifacts to %s...", len(self.entries), data_path)
+        arrays, manifest_entries = [], {}
+        for (feature_name, step), data in self.entries.items():
+            manifest_entries["{}/{}".format(feature_name, step)] = _encode_artifact(
+                data=data, arrays=arrays
+            )
+
+        data_section, offset = [], 0
+        for array_manifest, array in arrays:
+            padding = -offset % self.ALIGNMENT
+            data_section.append(b"\x00" * padding)
+            offset += padding
+            array_manifest["offset"] = offset
+            data_section.append(array.tobytes())
+            offset += array.nbytes
+        data_section = b"".join(data_section)
+
+        manifest = json.dumps(
+            {
+                "format_version": self.FORMAT_VERSION,
+                "version": self.version,
+                "sha256": hashlib.sha256(data_section).hexdigest(),
+                "entries": manifest_entries,
+            }
+        ).encode("utf-8")
+        header = self.MAGIC + struct.pack("<Q", len(manifest)) + manifest
+        header += b"\x00" * (-len(header) % self.ALIGNMENT)
+        with open(data_path, "wb") as f:
+            f.write(header)
+            f.write(data_section)
+        log.info("Saving fitted artifacts to %s complete...", data_path)
+
+    @classmethod
+    def load(cls, data_path: str, verify: bool = True) -> "ArtifactStore":
+        log.info("Loading fitted artifacts from %s...", data_path)
+        with open(data_path, "rb") as f:
+            buffer = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        if buffer[: len(cls.MAGIC)] != cls.MAGIC:
+            log.error("%s is not a fitted artifact store", data_path)
+            raise ValueError("{} is not a fitted artifact store".format(data_path))
+        (manifest_len,) = struct.unpack_from("<Q", buffer, len(cls.MAGIC))
+        manifest_start = len(cls.MAGIC) + 8
+        manifest = json.loads(buffer[manifest_start : manifest_start + manifest_len])
+        if manifest["format_version"] != cls.FORMAT_VERSION:
+            log.error(
+                "%s has artifact format version %s, expects %s",
+                data_path,
+                manifest["format_version"],
+                cls.FORMAT_VERSION,
+            )
+            raise ValueError(
+                "{} has artifact format version {}, expects {}".format(
+                    data_path, manifest["format_version"], cls.FORMAT_VERSION
+                )
+            )
+        data_start = manifest_start + manifest_len
+        data_start += -data_start % cls.ALIGNMENT
+        data_section = memoryview(buffer)[data_start:]
+        if verify and hashlib.sha256(data_section).hexdigest() != manifest["sha256"]:
+            log.error("%s fails its checksum", data_path)
+            raise ValueError("{} fails its checksum".format(data_path))
+
+        store = cls(version=manifest["version"])
+        for key, entry in manifest["entries"].items():
+            feature_name, step = key.rsplit("/", 1)
+            store.put(
+                feature_name=feature_name,
+                step=step,
+                data=_decode_artifact(entry=entry, data_section=data_section),
+            )
+        log.info("Loading fitted artifacts from %s complete...", data_path)
+        return store
+
+
+def _encode_array(values, arrays: list) -> dict:
+    array = np.ascontiguousarray(values)
+    if array.dtype.kind == "O":
+        array = array.astype("U")
+    array_manifest = {"dtype": array.dtype.str, "shape": list(array.shape)}
+    arrays.append((array_manifest, array))
+    return array_manifest
+
+
+def _decode_array(array_manifest: dict, data_section) -> np.ndarray:
+    dtype = np.dtype(array_manifest["dtype"])
+    return np.frombuffer(
+        data_section,
+        dtype=dtype,
+        count=int(np.prod(array_manifest["shape"])),
+        offset=array_manifest["offset"],
+    ).reshape(array_manifest["shape"])
+
+
+def _encode_artifact(data: pd.DataFrame or dict, arrays: list) -> dict:
+    if isinstance(data, pd.DataFrame):
+        return {
+            "kind": "frame",
+            "index": _encode_array(data.index.values, arrays),
+            "columns": {
+                column: _encode_array(data[column].values, arrays)
+                for column in data.columns
+            },
+        }
+    # Lookups round trip through JSON like their per-step files, so the store
+    # returns exactly what read_fitted_data would.
+    data = json.loads(json.dumps(data))
+    if any(type(v) is dict for v in data.values()):
+        # e.g. a target encoding's group means next to its scalar prior.
+        return {
+            "kind": "nested",
+            "entries": {
+                k: (
+                    _encode_artifact(v, arrays)
+                    if type(v) is dict
+                    else {"kind": "json", "data": v}
+                )
+                for k, v in data.items()
+            },
+        }
+    # Only values of one type survive an array unchanged: mixed int and float
+    # would come back as float, mixed numbers and strings as strings.
+    value_types = {type(v) for v in data.values()}
+    if len(value_types) != 1 or value_types.pop() not in [int, float, str]:
+        return {"kind": "json", "data": data}
+    values = np.asarray(list(data.values()))
+    return {
+        "kind": "mapping",
+        "keys": _encode_array(np.asarray(list(data.keys()), dtype="U"), arrays),
+        "values": _encode_array(values, arrays),
+    }
+
+
+def _decode_artifact(entry: dict, data_section) -> pd.DataFrame or dict:
+    if entry["kind"] == "frame":
+        return pd.DataFrame(
+            {
+                column: _decode_array(array_manifest, data_section)
+                for column, array_manifest in entry["columns"].items()
+            },
+            index=_decode_array(entry["index"], data_section),
+        )
+    if entry["kind"] == "nested":
+        return {
+            k: _decode_artifact(v, data_section) for k, v in entry["entries"].items()
+        }
+    if entry["kind"] == "json":
+        return entry["data"]
+    return dict(
+        zip(
+            _decode_array(entry["keys"], data_section).tolist(),
+            _decode_array(entry["values"], data_section).tolist(),
+        )
+    )
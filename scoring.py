@@ -0,0 +1,309 @@
+import math
+import numbers
+from bisect import bisect_left
+from typing import NamedTuple
+import numpy as np
+import pandas as pd
+from checks import (
+    check_expected_values,
+    check_fields_exist,
+    check_nans,
+    check_numeric,
+)
+from binners import FITTED_EDGE_TYPES
+from enums import DataProc
+from plan import STEPS, ExecutionPlan, FeaturePlan
+from transformers import GroupStatistics
+
+"""
+Row at a time scoring: a compiled recipe lowered to pure Python kernels over
+scalars, for online requests of one or a few dozen rows where building
+DataFrames costs more than the recipe itself.
+"""
+
+
+def _is_missing(value) -> bool:
+    return value is None or (isinstance(value, float) and math.isnan(value))
+
+
+class RowFeature(NamedTuple):
+    """
+    Kernels of a single feature, each taking the value produced by the
+    previous one and the raw row.
+    """
+
+    name: str
+    kernels: tuple
+    flag_column: str = None
+
+    def transform(self, row: dict):
+        value = row[self.name]
+        for kernel in self.kernels:
+            value = kernel(value, row)
+        return value
+
+
+class RowPlan(NamedTuple):
+    """
+    Compiled recipe applied to rows given as dicts, giving the same values as
+    ``ExecutionPlan.transform`` on a DataFrame of those rows.
+
+    Examples
+    ----------
+    >>> row_plan = compile_rows(plan=compile_config(config=config))
+    >>> row_plan.transform_row({"Feature_1": "A", "Feature_2": 25.0, ...})
+    {'Feature_1': 'A', 'Feature_2': 1, ...}
+
+    Notes
+    ----------
+    Every check of the batch path is applied to each row. A failing check
+    re-runs the batch check on the offending value, so errors and log records
+    are the same as for a DataFrame. Requires a transform-only recipe.
+    """
+
+    features: tuple
+
+    def transform_row(self, row: dict) -> dict:
+        results = {}
+        try:
+            for feature in self.features:
+                results[feature.name] = feature.transform(row)
+                if feature.flag_column is not None:
+                    results[feature.flag_column] = int(_is_missing(row[feature.name]))
+        except KeyError:
+            check_fields_exist(
+                found_fields=row.keys(), expected_fields=self.feature_names()
+            )
+            raise
+        return results
+
+    def transform_records(self, records: list) -> list:
+        return [self.transform_row(row) for row in records]
+
+    def feature_names(self) -> list:
+        return [feature.name for feature in self.features]
+
+
+def _read_kernel(feature_plan: FeaturePlan, operation: str):
+    name = feature_plan.name
+    expected_values = feature_plan.expected_values
+    numeric = feature_plan.methods[DataProc.TYPE.value] in ["discrete", "continuous"]
+
+    def reject(value):
+        check_expected_values(
+            field_values=[value],
+            expected_values=expected_values,
+            field_name=name,
+            operation=operation,
+        )
+
+    if expected_values.is_range:
+        low, high = expected_values.min, expected_values.max
+
+        def check(value, row):
+            if _is_missing(value):
+                return value
+            try:
+                number = float(value)
+            except (TypeError, ValueError):
+                reject(value)
+            if not (low <= number <= high and number % 1 == 0):
+                reject(value)
+            return value
+
+    else:
+        allowed = frozenset(expected_values.index)
+
+        def check(value, row):
+            if not _is_missing(value) and value not in allowed:
+                reject(value)
+            return value
+
+    if operation != "READ IN" or not numeric:
+        return check
+
+    # Numeric features are read as float64 by read_data, so are rows.
+    def read(value, row):
+        if not _is_missing(value):
+            try:
+                value = float(value)
+            except (TypeError, ValueError):
+                pass
+        return check(value, row)
+
+    return read
+
+
+def _fill_value(feature_plan: FeaturePlan, fill_value):
+    # Filling a float64 column casts a numeric fill value to float.
+    if feature_plan.methods[DataProc.TYPE.value] in [
+        "discrete",
+        "continuous",
+    ] and isinstance(fill_value, numbers.Number):
+        return float(fill_value)
+    return fill_value
+
+
+def _imputation_kernel(feature_plan: FeaturePlan):
+    method = feature_plan.methods[DataProc.IMPUTATION.value]
+    if method[DataProc.TYPE.value] == DataProc.REPLACE.value:
+        fill_value = _fill_value(
+            feature_plan=feature_plan, fill_value=method[DataProc.METHOD.value]
+        )
+
+        def replace(value, row):
+            return fill_value if _is_missing(value) else value
+
+        return replace
+
+    fill_value = _fill_value(
+        feature_plan=feature_plan,
+        fill_value=feature_plan.fitted_values[DataProc.IMPUTATION.value][
+            method[DataProc.METHOD.value]
+        ],
+    )
+    check = _read_kernel(feature_plan=feature_plan, operation="Imputer")
+
+    def aggregate(value, row):
+        return check(fill_value if _is_missing(value) else value, row)
+
+    return aggregate
+
+
+def _numeric_kernel(name: str, operation: str, raise_nans: bool):
+    def check(value, row):
+        if not isinstance(value, numbers.Number) or isinstance(value, bool):
+            check_numeric(data=pd.Series([value]), field_name=name, operation=operation)
+        if raise_nans and _is_missing(value):
+            check_nans(data=pd.Series([value]), field_name=name, operation=operation)
+        return value
+
+    return check
+
+
+def _outlier_removal_kernel(feature_plan: FeaturePlan):
+    fitted_values = feature_plan.fitted_values[DataProc.OUTLIER_REMOVAL.value]
+    lower = fitted_values[DataProc.LOWER_PCT.value]
+    upper = fitted_values[DataProc.UPPER_PCT.value]
+    check = _numeric_kernel(
+        name=feature_plan.name, operation="Outlier Remover", raise_nans=True
+    )
+
+    def clip(value, row):
+        if value < lower:
+            value = lower
+        elif value > upper:
+            value = upper
+        return check(value, row)
+
+    return clip
+
+
+def _divide(numerator: float, denominator: float) -> float:
+    if denominator == 0:
+        # inf or NaN with a RuntimeWarning, as the vectorized division gives.
+        return float(np.float64(numerator) / np.float64(denominator))
+    return numerator / denominator
+
+
+def _transformation_kernel(feature_plan: FeaturePlan):
+    method = feature_plan.methods[DataProc.TRANSFORMATION.value]
+    fitted_values = feature_plan.fitted_values[DataProc.TRANSFORMATION.value]
+    if method[DataProc.METHOD.value] == DataProc.Z_TRANSFORM.value:
+        group_statistics = GroupStatistics.from_frame(fitted_values)
+        groupby = method[DataProc.GROUPBY.value]
+        statistics = dict(
+            zip(
+                group_statistics.groups,
+                zip(
+                    group_statistics.statistics["mean"][:-1].tolist(),
+                    group_statistics.statistics["std"][:-1].tolist(),
+                ),
+            )
+        )
+
+        def z_transform(value, row):
+            mean, std = statistics.get(row[groupby], (math.nan, math.nan))
+            return _divide(value - mean, std)
+
+        return z_transform
+
+    group_statistics = GroupStatistics.from_field_means(fitted_values)
+    means = dict(
+        zip(group_statistics.groups, group_statistics.statistics["mean"][:-1].tolist())
+    )
+    default = float(group_statistics.statistics["mean"][-1])
+    check = _numeric_kernel(
+        name=feature_plan.name, operation="Transform", raise_nans=False
+    )
+
+    def field_mean(value, row):
+        return check(means.get(value, default), row)
+
+    return field_mean
+
+
+def _binning_kernel(feature_plan: FeaturePlan):
+    method = feature_plan.methods[DataProc.BINNING.value]
+    if type(method) is dict and method[DataProc.TYPE.value] in FITTED_EDGE_TYPES:
+        edges = feature_plan.fitted_values[DataProc.BINNING.value].edges.tolist()
+
+        def edge_label(value, row):
+            if _is_missing(value):
+                return math.nan
+            # Outer edges are -inf and inf, so only -inf itself has no bin.
+            label = bisect_left(edges, value) - 1
+            return float(label) if label >= 0 else math.nan
+
+        return edge_label
+
+    if type(method) is not list:
+        encoding = feature_plan.fitted_values[DataProc.BINNING.value]
+
+        def label_encode(value, row):
+            code = encoding.get(value)
+            return math.nan if code is None else code
+
+        return label_encode
+
+    bins = list(method)
+    n_bins = len(bins) - 1
+
+    def cut(value, row):
+        if _is_missing(value):
+            return math.nan
+        # Bins are right-closed: bins[i] < value <= bins[i + 1] is label i.
+        label = bisect_left(bins, value) - 1
+        return label if 0 <= label < n_bins else math.nan
+
+    return cut
+
+
+STEP_KERNELS = {
+    DataProc.IMPUTATION.value: _imputation_kernel,
+    DataProc.OUTLIER_REMOVAL.value: _outlier_removal_kernel,
+    DataProc.TRANSFORMATION.value: _transformation_kernel,
+    DataProc.BINNING.value: _binning_kernel,
+}
+
+
+def compile_row_feature(feature_plan: FeaturePlan) -> RowFeature:
+    kernels = [_read_kernel(feature_plan=feature_plan, operation="READ IN")]
+    for step in STEPS:
+        if feature_plan.methods[step] == 0:
+            continue
+        kernels.append(STEP_KERNELS[step](feature_plan=feature_plan))
+    return RowFeature(
+        name=feature_plan.name,
+        kernels=tuple(kernels),
+        flag_column=feature_plan.flag_column,
+    )
+
+
+def compile_rows(plan: ExecutionPlan) -> RowPlan:
+    """
+    Lower a compiled transform-only recipe to row kernels.
+    """
+    return RowPlan(
+        features=tuple(compile_row_feature(feature) for feature in plan.features)
+    )
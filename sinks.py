@@ -0,0 +1,183 @@
+import struct
+import numpy as np
+import pandas as pd
+from logger import create_logger
+
+"""
+Destinations transformed results are written to chunk by chunk, so the full
+output never has to be held in memory to be saved.
+"""
+
+log = create_logger("sinks")
+
+
+class Sink(object):
+    """
+    Destination of transformed results. ``write`` is called once per chunk of
+    rows, in order, and ``close`` once after the last chunk.
+
+    Examples
+    ----------
+    >>> data_processor.transform_to(sink=NpySink(data_path='results.npy'))
+    >>> model_input = np.load('results.npy', mmap_mode='r')
+    """
+
+    def __init__(self, data_path: str):
+        self.data_path = data_path
+        self.rows = 0
+        self.columns = None
+
+    def write(self, results: pd.DataFrame):
+        if self.columns is None:
+            self.columns = list(results.columns)
+            self.open(results=results)
+        self.write_chunk(results=results)
+        self.rows += len(results)
+
+    def open(self, results: pd.DataFrame):
+        pass
+
+    def write_chunk(self, results: pd.DataFrame):
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+
+class CsvSink(Sink):
+    """
+    Results appended to a CSV, with the index, header written once.
+    """
+
+    def write_chunk(self, results: pd.DataFrame):
+        results.to_csv(
+            self.data_path, mode="w" if self.rows == 0 else "a", header=self.rows == 0
+        )
+
+
+class ParquetSink(Sink):
+    """
+    Results written to a Parquet file, one row group per chunk. Categorical
+    columns are dictionary encoded. Requires pyarrow.
+    """
+
+    def __init__(self, data_path: str, compression: str = "snappy"):
+        super().__init__(data_path=data_path)
+        import pyarrow.parquet
+
+        self.pa = pyarrow
+        self.pq = pyarrow.parquet
+        self.compression = compression
+        self.writer = None
+
+    def open(self, results: pd.DataFrame):
+        self.schema = self.pa.Schema.from_pandas(results, preserve_index=True)
+        self.writer = self.pq.ParquetWriter(
+            self.data_path, schema=self.schema, compression=self.compression
+        )
+
+    def write_chunk(self, results: pd.DataFrame):
+        self.writer.write_table(
+            self.pa.Table.from_pandas(results, schema=self.schema, preserve_index=True)
+        )
+
+    def close(self):
+        if self.writer is not None:
+            self.writer.close()
+            self.writer = None
+
+
+class ArrowSink(ParquetSink):
+    """
+    Results written to an Arrow IPC (Feather v2) file, one record batch per
+    chunk, readable zero copy with ``pyarrow.memory_map``. Requires pyarrow.
+    """
+
+    def __init__(self, data_path: str):
+        super().__init__(data_path=data_path, compression=None)
+        import pyarrow.ipc
+
+    def open(self, results: pd.DataFrame):
+        self.schema = self.pa.Schema.from_pandas(results, preserve_index=True)
+        self.writer = self.pa.ipc.new_file(self.data_path, schema=self.schema)
+
+
+class NpySink(Sink):
+    """
+    Results as one 2-D ``.npy`` matrix, rows in order and columns in recipe
+    order (``columns``), for model input loaded zero copy with
+    ``np.load(data_path, mmap_mode='r')``. The index is not written.
+
+    Parameters
+    ----------
+    data_path: str
+        Path of the .npy file
+    dtype: str
+        Dtype of the matrix
+
+    Notes
+    ----------
+    Chunks are appended to the file as they come and the header, reserved up
+    front, is completed on close, so the number of rows need not be known in
+    advance and only the current chunk is held in memory. Categorical columns
+    are written as their values when numeric (e.g. bins), else as their codes,
+    with NaN for missing values.
+    """
+
+    MAGIC = b"\x93NUMPY\x01\x00"
+    HEADER_SIZE = 256
+
+    def __init__(self, data_path: str, dtype: str = "float32"):
+        super().__init__(data_path=data_path)
+        self.dtype = np.dtype(dtype)
+        self.file = None
+
+    def open(self, results: pd.DataFrame):
+        self.file = open(self.data_path, "wb")
+        self.file.write(b"\x00" * self.HEADER_SIZE)
+
+    def write_chunk(self, results: pd.DataFrame):
+        matrix = np.empty((len(results), len(self.columns)), dtype=self.dtype)
+        for column_idx, column in enumerate(self.columns):
+            matrix[:, column_idx] = self._numeric(results[column])
+        self.file.write(matrix.tobytes())
+
+    def _numeric(self, values: pd.Series) -> np.ndarray:
+        if isinstance(values.dtype, pd.CategoricalDtype):
+            categories = values.cat.categories
+            if not pd.api.types.is_numeric_dtype(categories):
+                categories = np.arange(len(categories))
+            lookup = np.append(np.asarray(categories, dtype=self.dtype), np.nan)
+            return lookup[values.cat.codes.values]
+        if not pd.api.types.is_numeric_dtype(values):
+            log.error("%s is not numeric and cannot be written to .npy", values.name)
+            raise ValueError(
+                "{} is not numeric and cannot be written to .npy".format(values.name)
+            )
+        return values.values
+
+    def close(self):
+        if self.file is None:
+            return
+        header = (
+            "{{'descr': {!r}, 'fortran_order': False, 'shape': ({}, {}), }}".format(
+                self.dtype.str, self.rows, len(self.columns)
+            ).encode("latin1")
+        )
+        padding = self.HEADER_SIZE - len(self.MAGIC) - 2 - len(header) - 1
+        self.file.seek(0)
+        self.file.write(
+            self.MAGIC
+            + struct.pack("<H", self.HEADER_SIZE - len(self.MAGIC) - 2)
+            + header
+            + b" " * padding
+            + b"\n"
+        )
+        self.file.close()
+        self.file = None
@@ -0,0 +1,371 @@
+import pandas as pd
+import numpy as np
+
+"""
+Mergeable statistics accumulated chunk by chunk, used to fit recipe steps on
+data that does not fit in memory, and kept between fits so a refit only
+reads the new data.
+"""
+
+
+class QuantileSketch(object):
+    """
+    Quantiles of a stream of values with bounded memory.
+
+    Parameters
+    ----------
+    max_distinct: int
+        Number of distinct values counted exactly before switching to a histogram
+    n_bins: int
+        Number of equal width histogram bins used once max_distinct is exceeded
+
+    Notes
+    ----------
+    While the stream holds at most ``max_distinct`` distinct values the sketch
+    keeps exact value counts and quantiles equal ``pd.Series.quantile``. Past
+    that it needs a second pass over the data (``update_histogram``) over the
+    range seen in the first pass, and quantiles are interpolated within a bin,
+    so the error is at most ``(max - min) / n_bins``. Merging sketches past
+    ``max_distinct`` rebins both onto the combined range, which at most
+    doubles that error.
+
+    Examples
+    ----------
+    >>> sketch = QuantileSketch()
+    >>> for chunk in np.array_split(np.random.rand(1000), 10):
+    ...     sketch.update(chunk)
+    >>> sketch.quantile(0.5)
+    """
+
+    def __init__(self, max_distinct: int = 100000, n_bins: int = 65536):
+        self.max_distinct = max_distinct
+        self.n_bins = n_bins
+        self.n = 0
+        self.min = np.inf
+        self.max = -np.inf
+        self.exact = True
+        self.counts = pd.Series(dtype="float64")
+        self.histogram = None
+
+    @property
+    def needs_second_pass(self) -> bool:
+        return not self.exact and self.histogram is None
+
+    def update(self, values):
+        values = _drop_nans(values)
+        if len(values) == 0:
+            return
+        self.n += len(values)
+        self.min = min(self.min, values.min())
+        self.max = max(self.max, values.max())
+        if self.exact:
+            self.counts = self.counts.add(
+                pd.Series(values).value_counts(sort=False), fill_value=0
+            )
+            if len(self.counts) > self.max_distinct:
+                self.exact = False
+                self.counts = pd.Series(dtype="float64")
+
+    def update_histogram(self, values):
+        values = _drop_nans(values)
+        if self.histogram is None:
+            self.histogram = np.zeros(self.n_bins, dtype="float64")
+        if len(values) == 0:
+            return
+        bins = self._bin_of(values)
+        self.histogram += np.bincount(bins, minlength=self.n_bins)
+
+    def merge(self, other: "QuantileSketch"):
+        if self.needs_second_pass or other.needs_second_pass:
+            raise ValueError("Quantile sketch requires a second pass over the data")
+        if other.n == 0:
+            return
+        minimum, maximum = min(self.min, other.min), max(self.max, other.max)
+        if self.exact and other.exact:
+            self.counts = self.counts.add(other.counts, fill_value=0)
+        else:
+            self.histogram = self._histogram_on(minimum, maximum)
+            self.histogram += other._histogram_on(minimum, maximum)
+        self.n += other.n
+        self.min, self.max = minimum, maximum
+        if self.exact and not other.exact:
+            self.exact = False
+            self.counts = pd.Series(dtype="float64")
+        elif self.exact and len(self.counts) > self.max_distinct:
+            self.histogram = self._histogram_on(self.min, self.max)
+            self.exact = False
+            self.counts = pd.Series(dtype="float64")
+
+    def decay(self, factor: float):
+        """
+        Weigh every value seen so far by factor, e.g. before merging new data.
+        A factor of 0 empties the sketch, its range included, so the histogram
+        of a later merge spans the new data alone.
+        """
+        self.n *= factor
+        if self.n == 0:
+            self.min = np.inf
+            self.max = -np.inf
+            self.exact = True
+            self.counts = pd.Series(dtype="float64")
+            self.histogram = None
+        elif self.exact:
+            self.counts = self.counts * factor
+            self.counts = self.counts[self.counts > 0]
+        elif self.histogram is not None:
+            self.histogram *= factor
+
+    def quantile(self, q: float) -> float:
+        if self.n == 0:
+            return np.nan
+        if self.needs_second_pass:
+            raise ValueError("Quantile sketch requires a second pass over the data")
+        position = q * (self.n - 1)
+        if self.exact:
+            counts = self.counts.sort_index()
+            cum_counts = counts.values.cumsum()
+            lower = counts.index[np.searchsorted(cum_counts, np.floor(position) + 1)]
+            upper = counts.index[np.searchsorted(cum_counts, np.ceil(position) + 1)]
+            return float(lower + (upper - lower) * (position - np.floor(position)))
+
+        cum_counts = self.histogram.cumsum()
+        bin_idx = int(np.searchsorted(cum_counts, position + 1))
+        below = cum_counts[bin_idx - 1] if bin_idx > 0 else 0.0
+        fraction = (position - below + 0.5) / self.histogram[bin_idx]
+        width = (self.max - self.min) / self.n_bins
+        return float(min(self.min + (bin_idx + fraction) * width, self.max))
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": type(self).__name__,
+            "max_distinct": self.max_distinct,
+            "n_bins": self.n_bins,
+            "n": float(self.n),
+            "min": float(self.min),
+            "max": float(self.max),
+            "exact": self.exact,
+            "values": self.counts.index.tolist(),
+            "counts": self.counts.values.tolist(),
+            "histogram": None if self.histogram is None else self.histogram.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "QuantileSketch":
+        sketch = cls(max_distinct=state["max_distinct"], n_bins=state["n_bins"])
+        sketch.n = state["n"]
+        sketch.min = state["min"]
+        sketch.max = state["max"]
+        sketch.exact = state["exact"]
+        sketch.counts = pd.Series(
+            state["counts"],
+            index=pd.Index(state["values"], dtype="float64"),
+            dtype="float64",
+        )
+        if state["histogram"] is not None:
+            sketch.histogram = np.asarray(state["histogram"], dtype="float64")
+        return sketch
+
+    def _bin_of(self, values: np.ndarray, minimum=None, maximum=None) -> np.ndarray:
+        minimum = self.min if minimum is None else minimum
+        maximum = self.max if maximum is None else maximum
+        if maximum == minimum:
+            return np.zeros(len(values), dtype="int64")
+        bins = (values - minimum) / (maximum - minimum) * self.n_bins
+        return np.clip(bins.astype("int64"), 0, self.n_bins - 1)
+
+    def weighted_values(self) -> tuple:
+        """
+        Sorted values seen and their counts: the exact counts, or the centres
+        of the histogram bins once past max_distinct.
+        """
+        if self.needs_second_pass:
+            raise ValueError("Quantile sketch requires a second pass over the data")
+        if self.exact:
+            counts = self.counts.sort_index()
+            return counts.index.values, counts.values
+        width = (self.max - self.min) / self.n_bins
+        return self.min + (np.arange(self.n_bins) + 0.5) * width, self.histogram
+
+    def _histogram_on(self, minimum: float, maximum: float) -> np.ndarray:
+        # Exact counts are binned by value, histogram bins by their centre.
+        if self.n == 0:
+            return np.zeros(self.n_bins, dtype="float64")
+        values, weights = self.weighted_values()
+        return np.bincount(
+            self._bin_of(values, minimum=minimum, maximum=maximum),
+            weights=weights,
+            minlength=self.n_bins,
+        )
+
+
+class MinMax(object):
+    """
+    Smallest and largest value of a stream of values, NaN ignored.
+    """
+
+    def __init__(self):
+        self.min = np.inf
+        self.max = -np.inf
+
+    def update(self, values):
+        values = _drop_nans(values)
+        if len(values) > 0:
+            self.min = min(self.min, float(values.min()))
+            self.max = max(self.max, float(values.max()))
+
+    def merge(self, other: "MinMax"):
+        self.min = min(self.min, other.min)
+        self.max = max(self.max, other.max)
+
+    def decay(self, factor: float):
+        # A range has no weight to decay partially: any factor above 0 keeps
+        # the old extremes, 0 forgets them.
+        if factor == 0:
+            self.min = np.inf
+            self.max = -np.inf
+
+    def to_dict(self) -> dict:
+        return {"kind": type(self).__name__, "min": self.min, "max": self.max}
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "MinMax":
+        min_max = cls()
+        min_max.min = state["min"]
+        min_max.max = state["max"]
+        return min_max
+
+
+class ModeCounter(object):
+    """
+    Exact mode of a stream of values, kept as value counts. Memory grows with
+    the number of distinct values, so it suits discrete features.
+    """
+
+    def __init__(self):
+        self.counts = pd.Series(dtype="float64")
+
+    def update(self, values):
+        counts = pd.Series(values).value_counts(sort=False)
+        # Counts of categoricals include every category, seen or not.
+        counts = counts[counts > 0]
+        counts.index = np.asarray(counts.index)
+        self.counts = self.counts.add(counts, fill_value=0)
+
+    def merge(self, other: "ModeCounter"):
+        self.counts = self.counts.add(other.counts, fill_value=0)
+
+    def decay(self, factor: float):
+        self.counts = self.counts * factor
+        self.counts = self.counts[self.counts > 0]
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": type(self).__name__,
+            "values": self.counts.index.tolist(),
+            "counts": self.counts.values.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "ModeCounter":
+        counter = cls()
+        counter.counts = pd.Series(
+            state["counts"], index=pd.Index(state["values"]), dtype="float64"
+        )
+        return counter
+
+    def mode(self):
+        if len(self.counts) == 0:
+            return np.nan
+        # Ties resolve to the smallest value, as pd.Series.mode sorts its result.
+        return self.counts[self.counts == self.counts.max()].sort_index().index[0]
+
+
+class GroupMoments(object):
+    """
+    Per group count, mean and sum of squared deviations of a stream of values,
+    combined across chunks with Welford's (Chan et al.) parallel update.
+    """
+
+    def __init__(self):
+        self.moments = pd.DataFrame(
+            {"count": [], "mean": [], "m2": []}, dtype="float64"
+        )
+
+    def update(self, groups: pd.Series, values: pd.Series):
+        chunk = (
+            pd.DataFrame({"groups": groups.values, "values": values.values})
+            .groupby("groups")["values"]
+            .agg(["count", "mean", "var"])
+        )
+        chunk = chunk[chunk["count"] > 0]
+        chunk["m2"] = (chunk["var"] * (chunk["count"] - 1)).fillna(0)
+        self._combine(chunk[["count", "mean", "m2"]])
+
+    def merge(self, other: "GroupMoments"):
+        self._combine(other.moments)
+
+    def decay(self, factor: float):
+        # Scaling count and m2 alike keeps every group's mean, and its variance
+        # up to the n - 1 correction.
+        moments = self.moments.assign(
+            count=self.moments["count"] * factor, m2=self.moments["m2"] * factor
+        )
+        self.moments = moments[moments["count"] > 0]
+
+    def to_dict(self) -> dict:
+        return {
+            "kind": type(self).__name__,
+            "groups": self.moments.index.tolist(),
+            **{column: self.moments[column].tolist() for column in self.moments},
+        }
+
+    @classmethod
+    def from_dict(cls, state: dict) -> "GroupMoments":
+        moments = cls()
+        moments.moments = pd.DataFrame(
+            {column: state[column] for column in ["count", "mean", "m2"]},
+            index=pd.Index(state["groups"]),
+            dtype="float64",
+        )
+        return moments
+
+    def _combine(self, other: pd.DataFrame):
+        index = self.moments.index.union(other.index)
+        a = self.moments.reindex(index).fillna(0)
+        b = other.reindex(index).fillna(0)
+        count = a["count"] + b["count"]
+        delta = b["mean"] - a["mean"]
+        self.moments = pd.DataFrame(
+            {
+                "count": count,
+                "mean": a["mean"] + delta * b["count"] / count,
+                "m2": a["m2"] + b["m2"] + delta**2 * a["count"] * b["count"] / count,
+            },
+            index=index,
+        )
+
+    def mean(self) -> pd.Series:
+        return self.moments["mean"]
+
+    def std(self) -> pd.Series:
+        return np.sqrt(self.moments["m2"] / (self.moments["count"] - 1)).where(
+            self.moments["count"] > 1
+        )
+
+
+SKETCHES = {
+    sketch.__name__: sketch
+    for sketch in [QuantileSketch, MinMax, ModeCounter, GroupMoments]
+}
+
+
+def sketch_from_dict(state: dict):
+    """
+    Sketch saved by its ``to_dict``.
+    """
+    return SKETCHES[state["kind"]].from_dict(state)
+
+
+def _drop_nans(values) -> np.ndarray:
+    values = np.asarray(values, dtype="float64")
+    return values[~np.isnan(values)]
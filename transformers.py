@@ -1,4 +1,6 @@
+import os
 import pandas as pd
+from concurrent.futures import ThreadPoolExecutor
 from enums import DataProc
 from checks import check_nans, check_numeric
 import numpy as np
@@ -6,6 +8,75 @@ from read_write import read_fitted_data, write_fitted_data
 from logger import create_logger
 
 
+class GroupStatistics(object):
+    """
+    Per group statistics stored as arrays indexed by factorized group codes,
+    so looking up each row's group statistics is an array take, not a join.
+
+    Parameters
+    ----------
+    groups: pd.Index
+        Groups the statistics are computed for
+    statistics: dict
+        Arrays of statistics aligned with groups, e.g. {"mean": ..., "std": ...}
+
+    default: float
+        Statistic of unknown or missing groups
+
+    Notes
+    ----------
+    Every statistic array carries a trailing default, NaN unless given, so
+    rows of unknown or missing groups (code -1) take it, as NaN in a left
+    merge.
+    """
+
+    def __init__(self, groups: pd.Index, statistics: dict, default: float = np.nan):
+        self.groups = pd.Index(groups)
+        self.statistics = {
+            name: np.append(np.asarray(values, dtype="float64"), default)
+            for name, values in statistics.items()
+        }
+
+    @classmethod
+    def from_frame(cls, data: pd.DataFrame or "GroupStatistics") -> "GroupStatistics":
+        if isinstance(data, GroupStatistics):
+            return data
+        return cls(
+            groups=data[DataProc.GROUPBY.value].values,
+            statistics={
+                column: data[column].values
+                for column in data.columns
+                if column != DataProc.GROUPBY.value
+            },
+        )
+
+    @classmethod
+    def from_field_means(cls, data: dict or "GroupStatistics") -> "GroupStatistics":
+        """
+        Group means of a fitted target encoding lookup, unknown groups taking
+        its prior when one was fitted.
+        """
+        if isinstance(data, GroupStatistics):
+            return data
+        means = data[DataProc.FIELD_MEAN_TRANSFORMER.value]
+        return cls(
+            groups=list(means.keys()),
+            statistics={"mean": list(means.values())},
+            default=data.get(DataProc.PRIOR.value, np.nan),
+        )
+
+    def codes(self, groups) -> np.ndarray:
+        if isinstance(groups.dtype, pd.CategoricalDtype):
+            # Index the categories once, then take by the groups' codes.
+            return np.append(self.groups.get_indexer(groups.cat.categories), -1)[
+                groups.cat.codes.values
+            ]
+        return self.groups.get_indexer(groups)
+
+    def take(self, name: str, codes: np.ndarray) -> np.ndarray:
+        return self.statistics[name][codes]
+
+
 class Transformers(object):
     """
     Methods for transforming features according to json recipe
@@ -16,6 +87,20 @@ class Transformers(object):
         Transformation methods and attributes.
     data: pd.DataFrame
         Data to be transformed
+    fitted_values: pd.DataFrame, GroupStatistics or dict
+        Fitted lookup loaded up front, read from method path when None
+
+    Notes
+    ----------
+    The mean method target encodes the groupby field by the mean of
+    target_field per group. Optional method keys: ``smoothing`` (m) shrinks
+    each group mean toward the overall mean (prior) as
+    ``(sum + m * prior) / (count + m)``, and groups of fewer than
+    ``min_count`` rows take the prior. When either is set, the prior is
+    written to the lookup and also given to unknown groups, else these are
+    NaN. With ``folds`` > 1 the fit encodes every row by the other folds
+    only, so no row sees its own target, while the lookup written for
+    transform is fitted on all rows.
 
     Examples
     ----------
@@ -25,18 +110,24 @@ class Transformers(object):
     >>> my_transformer.run()
     """
 
-    def __init__(self, method: dict, data: pd.DataFrame):
+    def __init__(
+        self,
+        method: dict,
+        data: pd.DataFrame,
+        fitted_values: pd.DataFrame or GroupStatistics or dict = None,
+    ):
         self.method = method
         self.data = data
+        self.fitted_values = fitted_values
         self.feature_name = data.columns[0]
         self.results = pd.DataFrame()
         self.log = create_logger(name="Transformer")
 
     def run(self):
         self.log.info(
-            "Running {} transformation for feature {}...".format(
-                self.method[DataProc.METHOD.value], self.feature_name
-            )
+            "Running %s transformation for feature %s...",
+            self.method[DataProc.METHOD.value],
+            self.feature_name,
         )
         if self.method[DataProc.METHOD.value] == DataProc.Z_TRANSFORM.value:
             if self.method[DataProc.FIT.value] == 1:
@@ -44,14 +135,18 @@ class Transformers(object):
                 self.z_value_fit()
                 write_fitted_data(
                     data=self.transformed_values,
-                    data_path=DataProc.PATH.value,
+                    data_path=self.method[DataProc.PATH.value],
                     feature_name=self.feature_name,
                     file_type="csv",
                 )
             if self.method[DataProc.FIT.value] == 0:
-                self.transformed_values = read_fitted_data(
-                    DataProc.PATH.value, feature_name=self.feature_name, file_type="csv"
-                )
+                self.transformed_values = self.fitted_values
+                if self.transformed_values is None:
+                    self.transformed_values = read_fitted_data(
+                        self.method[DataProc.PATH.value],
+                        feature_name=self.feature_name,
+                        file_type="csv",
+                    )
                 self.z_value_transform()
 
         if self.method[DataProc.METHOD.value] == DataProc.MEAN.value:
@@ -60,16 +155,18 @@ class Transformers(object):
                 self.field_mean_fit()
                 write_fitted_data(
                     data=self.transformed_values,
-                    data_path=DataProc.PATH.value,
+                    data_path=self.method[DataProc.PATH.value],
                     feature_name=self.feature_name,
                     file_type="json",
                 )
             if self.method[DataProc.FIT.value] == 0:
-                self.transformed_values = read_fitted_data(
-                    DataProc.PATH.value,
-                    feature_name=self.feature_name,
-                    file_type="json",
-                )
+                self.transformed_values = self.fitted_values
+                if self.transformed_values is None:
+                    self.transformed_values = read_fitted_data(
+                        self.method[DataProc.PATH.value],
+                        feature_name=self.feature_name,
+                        file_type="json",
+                    )
                 self.field_mean_transform()
 
             check_nans(
@@ -85,76 +182,227 @@ class Transformers(object):
                 operation="Transform",
             )
             self.log.info(
-                "{} transformation for feature {} complete...".format(
-                    self.method[DataProc.METHOD.value], self.feature_name
-                )
+                "%s transformation for feature %s complete...",
+                self.method[DataProc.METHOD.value],
+                self.feature_name,
             )
 
     def z_value_fit(self):
         self.log.info(
-            "Performing z value fit_transform for feature {}...".format(
-                self.feature_name
-            )
+            "Performing z value fit_transform for feature %s...", self.feature_name
         )
+        # observed=True leaves out unseen categories of a categorical groupby,
+        # but does not sort its groups, hence sort_index.
         self.transformed_values = (
-            self.data.groupby([DataProc.GROUPBY.value])[self.feature_name]
+            self.data.groupby([DataProc.GROUPBY.value], observed=True)[
+                self.feature_name
+            ]
             .agg(["mean", "std"])
+            .sort_index()
             .reset_index()
         )
-        self.data = pd.merge(
-            self.data, self.transformed_values, on=DataProc.GROUPBY.value, how="left"
-        )
-        self.data.columns = [self.feature_name, DataProc.GROUPBY.value, "mean", "std"]
-        self.results[self.feature_name] = (
-            self.data[self.feature_name] - self.data["mean"]
-        ) / self.data["std"]
+        self.group_statistics = GroupStatistics.from_frame(self.transformed_values)
+        self.z_value_apply()
         self.log.info(
-            "Z value fit_transform for feature {} complete...".format(self.feature_name)
+            "Z value fit_transform for feature %s complete...", self.feature_name
         )
 
     def z_value_transform(self):
         self.log.info(
-            "Performing z value transform for feature {}...".format(self.feature_name)
-        )
-        self.data = pd.merge(
-            self.data, self.transformed_values, on=DataProc.GROUPBY.value, how="left"
+            "Performing z value transform for feature %s...", self.feature_name
         )
-        self.data.columns = [self.feature_name, DataProc.GROUPBY.value, "mean", "std"]
-        self.results[self.feature_name] = (
-            self.data[self.feature_name] - self.data["mean"]
-        ) / self.data["std"]
-        self.log.info(
-            "Z value transform for feature {} complete...".format(self.feature_name)
+        self.group_statistics = GroupStatistics.from_frame(self.transformed_values)
+        self.z_value_apply()
+        self.log.info("Z value transform for feature %s complete...", self.feature_name)
+
+    def z_value_apply(self):
+        codes = self.group_statistics.codes(self.data[DataProc.GROUPBY.value])
+        self.results = pd.DataFrame(
+            {
+                self.feature_name: (
+                    self.data[self.feature_name].values
+                    - self.group_statistics.take("mean", codes)
+                )
+                / self.group_statistics.take("std", codes)
+            },
+            index=self.data.index,
         )
 
     def field_mean_fit(self):
-        self.log.info(
-            "Performing field mean fit for feature {}...".format(self.feature_name)
-        )
-        self.transformed_values[DataProc.FIELD_MEAN_TRANSFORMER.value] = (
-            self.data.groupby([DataProc.GROUPBY.value])[DataProc.TARGET_FIELD.value]
-            .mean()
-            .to_dict()
+        self.log.info("Performing field mean fit for feature %s...", self.feature_name)
+        groups, codes = group_codes(self.data[DataProc.GROUPBY.value])
+        sums, counts = group_sums(
+            codes=codes,
+            target=self.data[DataProc.TARGET_FIELD.value],
+            n_groups=len(groups),
         )
-        self.data[self.feature_name] = (
-            self.data.groupby([DataProc.GROUPBY.value])[DataProc.TARGET_FIELD.value]
-            .mean()
-            .reset_index(drop=True)
+        self.transformed_values = field_mean_lookup(
+            groups=groups, sums=sums, counts=counts, method=self.method
         )
-        self.results[self.feature_name] = self.data[self.feature_name]
-        self.log.info(
-            "Field mean fit for feature {} complete...".format(self.feature_name)
+        # Every row takes the encoding of its own group, each group located in
+        # the lookup once.
+        self.group_statistics = GroupStatistics.from_field_means(
+            self.transformed_values
         )
+        if self.method.get(DataProc.FOLDS.value, 0) > 1:
+            self.log.info(
+                "Encoding feature %s out of %s folds...",
+                self.feature_name,
+                self.method[DataProc.FOLDS.value],
+            )
+            means = out_of_fold_means(
+                codes=codes,
+                target=self.data[DataProc.TARGET_FIELD.value],
+                n_groups=len(groups),
+                method=self.method,
+            )
+        else:
+            positions = np.append(self.group_statistics.groups.get_indexer(groups), -1)
+            means = self.group_statistics.take("mean", positions[codes])
+        self.results = pd.DataFrame({self.feature_name: means}, index=self.data.index)
+        self.log.info("Field mean fit for feature %s complete...", self.feature_name)
 
     def field_mean_transform(self):
         self.log.info(
-            "Performing field mean transform for feature {}...".format(
-                self.feature_name
-            )
+            "Performing field mean transform for feature %s...", self.feature_name
         )
-        self.results[self.feature_name] = self.data[self.feature_name].map(
-            self.transformed_values[DataProc.FIELD_MEAN_TRANSFORMER.value]
+        values = self.data[self.feature_name]
+        self.group_statistics = GroupStatistics.from_field_means(
+            self.transformed_values
+        )
+        self.results = pd.DataFrame(
+            {
+                self.feature_name: self.group_statistics.take(
+                    "mean", self.group_statistics.codes(values)
+                )
+            },
+            index=values.index,
         )
         self.log.info(
-            "Field mean transform for feature {} complete...".format(self.feature_name)
+            "Field mean transform for feature %s complete...", self.feature_name
+        )
+
+
+def group_codes(groups: pd.Series) -> tuple:
+    """
+    Groups seen and the code of every row's group, -1 for missing. Categorical
+    groups reuse their codes, others are factorized once.
+    """
+    if isinstance(groups.dtype, pd.CategoricalDtype):
+        return groups.cat.categories, groups.cat.codes.values
+    codes, uniques = pd.factorize(groups)
+    return pd.Index(uniques), codes
+
+
+def group_sums(codes: np.ndarray, target: pd.Series, n_groups: int) -> tuple:
+    """
+    Sum and count of the non-missing target values of every group code, by
+    np.bincount in one pass over the rows.
+    """
+    target = target.to_numpy(dtype="float64", na_value=np.nan)
+    valid = (codes >= 0) & ~np.isnan(target)
+    sums = np.bincount(codes[valid], weights=target[valid], minlength=n_groups)
+    counts = np.bincount(codes[valid], minlength=n_groups).astype("float64")
+    return sums, counts
+
+
+def target_encodings(sums: np.ndarray, counts: np.ndarray, method: dict) -> tuple:
+    """
+    Encoding of every group from its target sum and count, smoothed toward
+    the prior, and the default of unknown groups: the prior when smoothing or
+    min_count is set, else NaN. Groups without target values take the
+    default.
+    """
+    smoothing = method.get(DataProc.SMOOTHING.value, 0)
+    min_count = method.get(DataProc.MIN_COUNT.value, 1)
+    prior = sums.sum() / counts.sum() if counts.sum() > 0 else np.nan
+    default = prior if smoothing != 0 or min_count != 1 else np.nan
+    with np.errstate(invalid="ignore", divide="ignore"):
+        encodings = (sums + smoothing * prior) / (counts + smoothing)
+    encodings[counts < min_count] = prior
+    encodings[counts == 0] = default
+    return encodings, default
+
+
+def field_mean_lookup(
+    groups: pd.Index, sums: np.ndarray, counts: np.ndarray, method: dict
+) -> dict:
+    """
+    Target encoding lookup of groups with at least one target value, sorted
+    by group, from per group target sums and counts.
+    """
+    encodings, default = target_encodings(sums=sums, counts=counts, method=method)
+    seen = counts > 0
+    lookup = {
+        DataProc.FIELD_MEAN_TRANSFORMER.value: pd.Series(
+            encodings[seen], index=groups[seen]
+        )
+        .sort_index()
+        .to_dict()
+    }
+    if not np.isnan(default):
+        lookup[DataProc.PRIOR.value] = default
+    return lookup
+
+
+def out_of_fold_means(
+    codes: np.ndarray, target: pd.Series, n_groups: int, method: dict
+) -> np.ndarray:
+    """
+    Target encoding of every row by the rows of the other folds only.
+
+    Parameters
+    ----------
+    codes: np.ndarray
+        Group code of every row, -1 for missing
+    target: pd.Series
+        Target values
+    n_groups: int
+        Number of group codes
+    method: dict
+        Mean transformation methods: ``folds``, ``seed`` (default 0) and
+        ``n_jobs`` (default 1, -1 for all cores), besides the smoothing options
+
+    Notes
+    ----------
+    Rows are assigned to folds at random by seed. One bincount pass gives the
+    per fold and group target sums and counts; each fold is encoded by the
+    totals minus its own, and folds are encoded and written concurrently.
+    """
+    n_folds = method[DataProc.FOLDS.value]
+    folds = np.random.default_rng(method.get(DataProc.SEED.value, 0)).integers(
+        0, n_folds, len(codes), dtype="int16"
+    )
+    valid = codes >= 0
+    sums, counts = group_sums(
+        codes=np.where(valid, folds.astype("int64") * n_groups + codes, -1),
+        target=target,
+        n_groups=n_folds * n_groups,
+    )
+    sums, counts = sums.reshape(n_folds, n_groups), counts.reshape(n_folds, n_groups)
+    total_sums, total_counts = sums.sum(axis=0), counts.sum(axis=0)
+    # Rows of every fold, by one linear time (radix) sort of the fold ids.
+    order = np.argsort(folds, kind="stable")
+    bounds = np.searchsorted(folds[order], np.arange(n_folds + 1))
+    results = np.empty(len(codes), dtype="float64")
+
+    def encode_fold(fold: int):
+        encodings, default = target_encodings(
+            sums=total_sums - sums[fold],
+            counts=total_counts - counts[fold],
+            method=method,
         )
+        rows = order[bounds[fold] : bounds[fold + 1]]
+        results[rows] = np.append(encodings, default)[codes[rows]]
+
+    n_jobs = method.get(DataProc.N_JOBS.value, 1)
+    if n_jobs == -1:
+        n_jobs = os.cpu_count()
+    n_jobs = min(n_jobs, n_folds)
+    if n_jobs <= 1:
+        for fold in range(n_folds):
+            encode_fold(fold)
+    else:
+        with ThreadPoolExecutor(max_workers=n_jobs) as executor:
+            list(executor.map(encode_fold, range(n_folds)))
+    return results